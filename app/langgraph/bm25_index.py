@@ -0,0 +1,415 @@
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Any, Iterable
+
+import numpy as np
+
+from .vector_index import top_k_indices
+
+# MasterCaption 에서 BM25 색인에 사용하는 캡션 필드 (caption/image_caption.py::EmbeddingCaptions)
+BM25_CAPTION_FIELDS = (
+    "clip_text_front",
+    "design_details_description",
+    "style_vibe_description",
+    "tpo_context_description",
+    "comprehensive_description",
+)
+BM25_TAG_FIELDS = ("style_tags", "mood_tags", "tpo_tags")
+
+_TOKEN_PATTERN = re.compile(r"[0-9a-z가-힣]+")
+_HANGUL_PATTERN = re.compile(r"[가-힣]")
+
+
+def _token_terms(token: str) -> list[str]:
+    if len(token) <= 2 or not _HANGUL_PATTERN.search(token):
+        return [token]
+    return [token[i : i + 2] for i in range(len(token) - 1)]
+
+
+def _split_tokens(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    한국어 BM25 tokenizer
+
+    - NFKC 정규화 + 소문자 변환 후 영문/숫자/한글 연속 구간으로 분리
+    - 한글이 포함된 구간은 글자 bigram (e.g. "오버핏" → "오버", "버핏", "v넥" → "v넥")
+      형태소 분석기 없이도 조사가 붙은 어절("셔츠를")과 복합어("오버핏셔츠")가 같은 term 을 공유
+    - 영문/숫자만으로 된 구간(브랜드, 모델명)은 그대로 하나의 term
+    """
+    return [term for token in _split_tokens(text) for term in _token_terms(token)]
+
+
+def document_text(product: dict[str, Any]) -> str:
+    """상품 문서에서 BM25 색인 대상 텍스트(이름, 브랜드, 캡션, 스타일/무드/TPO 태그) 추출"""
+    captions = product.get("embedding_captions") or {}
+    subjective = (product.get("structured_attributes") or {}).get("subjective") or {}
+    parts = [product.get("name"), product.get("brand")]
+    parts += [captions.get(field) for field in BM25_CAPTION_FIELDS]
+    for field in BM25_TAG_FIELDS:
+        parts += subjective.get(field) or []
+    return " ".join(str(part) for part in parts if part)
+
+
+class BM25Index:
+    """
+    in-process BM25 역색인
+
+    - 대량 색인된 문서는 term 별 CSR(offsets / doc 번호 / BM25 tf 가중치) numpy 배열(main segment)에,
+      이후 add 된 문서는 작은 delta segment(term → array)에 쌓고 일정 크기가 되면 main 으로 병합
+      → 증분 색인이 가능하면서 검색은 term 당 numpy slice 한 번
+    - main segment 의 posting 에는 tf / 문서 길이 정규화까지 적용한 가중치를 병합 시점에 미리 계산
+      (쿼리 시점에는 idf 곱셈 + scatter-add 만 수행)
+    - 흔한 term("니트", "오버핏" 처럼 카탈로그의 10% 이상에 등장)은 uint8 로 양자화한 dense 열도 함께 저장
+      scatter-add 대신 연속 메모리 곱셈-덧셈이라 posting 이 긴 term 의 비용이 1/10 수준 (메모리는 CSR 보다 작음)
+      양자화 오차는 상위 후보를 CSR 가중치로 다시 계산해 보정
+    - 삭제 / 갱신: 문서 번호를 tombstone 처리 (갱신은 새 문서 번호로 다시 추가)
+    """
+
+    # main posting 이 전체 문서의 이 비율을 넘는 term 은 dense 열로도 저장
+    DENSE_TERM_RATIO = 0.1
+    # dense 점수 버퍼에서 후보 threshold 를 추정할 때의 표본 간격
+    SAMPLE_STRIDE = 64
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, merge_threshold: int = 50_000):
+        self.k1 = k1
+        self.b = b
+        self.merge_threshold = merge_threshold
+        self._lock = threading.Lock()
+        self._terms: dict[str, int] = {}
+        self._df: list[int] = []
+        # 어절 → term id 캐시 (캡션은 같은 어절이 반복되므로 bigram 분해 / vocabulary 조회를 한 번만)
+        self._token_cache: dict[str, tuple[int, ...]] = {}
+        # main segment (CSR): term t 의 posting = docs[offsets[t]:offsets[t + 1]] (doc 번호 오름차순)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.empty(0, dtype=np.int32)
+        self._tfs = np.empty(0, dtype=np.uint16)
+        self._weights = np.empty(0, dtype=np.float32)
+        # 흔한 term 의 dense 열: term id → uint8[main 문서 수] (가중치 / dense_scale, 없으면 0)
+        self._dense: dict[int, np.ndarray] = {}
+        self._dense_scale = (k1 + 1.0) / 255.0
+        # delta segment: term id → (doc 번호 array, tf array) — 대량 색인 시 메모리를 위해 list 대신 array
+        self._delta: dict[int, tuple[array, array]] = {}
+        self._delta_docs = 0
+        # delta posting 의 numpy 변환 캐시 (add / remove / merge 시 초기화)
+        self._delta_arrays: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        # 문서 정보 (문서 번호 = 추가된 순서)
+        self._doc_ids: list[str] = []
+        self._doc_len = np.zeros(1024, dtype=np.float32)
+        self._doc_terms: list[array] = []
+        self._deleted = np.zeros(1024, dtype=bool)
+        self._id_to_doc: dict[str, int] = {}
+        self._total_len = 0
+        # 검색 시 재사용하는 dense 점수 버퍼 (항상 0 으로 되돌려 둠)
+        self._scratch = np.zeros(1024, dtype=np.float32)
+        self._buffer = np.zeros(1024, dtype=np.float32)
+        self._accumulator = np.zeros(1024, dtype=np.uint16)
+        self._buffer16 = np.zeros(1024, dtype=np.uint16)
+
+    def __len__(self) -> int:
+        return len(self._id_to_doc)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._id_to_doc
+
+    @property
+    def ids(self) -> list[str]:
+        return list(self._id_to_doc)
+
+    @staticmethod
+    def _grow(values: np.ndarray, size: int) -> np.ndarray:
+        if size <= values.shape[0]:
+            return values
+        grown = np.zeros(max(size, values.shape[0] * 2), dtype=values.dtype)
+        grown[: values.shape[0]] = values
+        return grown
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._terms.get(term)
+        if term_id is None:
+            term_id = self._terms[term] = len(self._df)
+            self._df.append(0)
+        return term_id
+
+    def _text_terms(self, text: str) -> list[int]:
+        term_ids: list[int] = []
+        for token in _split_tokens(text):
+            cached = self._token_cache.get(token)
+            if cached is None:
+                cached = self._token_cache[token] = tuple(map(self._term_id, _token_terms(token)))
+            term_ids.extend(cached)
+        return term_ids
+
+    def _remove_doc(self, doc: int) -> None:
+        self._delta_arrays.clear()
+        self._deleted[doc] = True
+        for term in self._doc_terms[doc]:
+            self._df[term] -= 1
+            column = self._dense.get(term)
+            if column is not None and doc < len(column):
+                column[doc] = 0
+        self._total_len -= int(self._doc_len[doc])
+        self._doc_terms[doc] = array("i")
+
+    def add(self, product_ids: Iterable[str], texts: Iterable[str]) -> None:
+        """문서 추가. 이미 존재하는 product_id 는 기존 문서를 삭제하고 새로 색인"""
+        with self._lock:
+            for product_id, text in zip(product_ids, texts):
+                old = self._id_to_doc.get(product_id)
+                if old is not None:
+                    self._remove_doc(old)
+                term_ids = self._text_terms(text)
+                counts = Counter(term_ids)
+                doc = len(self._doc_ids)
+                self._doc_ids.append(product_id)
+                self._id_to_doc[product_id] = doc
+                if doc >= self._doc_len.shape[0]:
+                    self._doc_len = self._grow(self._doc_len, doc + 1)
+                    self._deleted = self._grow(self._deleted, doc + 1)
+                self._doc_len[doc] = len(term_ids)
+                self._total_len += len(term_ids)
+                self._doc_terms.append(array("i", counts))
+                for term, tf in counts.items():
+                    self._df[term] += 1
+                    posting = self._delta.get(term)
+                    if posting is None:
+                        posting = self._delta[term] = (array("i"), array("H"))
+                    posting[0].append(doc)
+                    posting[1].append(tf)
+                self._delta_docs += 1
+            self._delta_arrays.clear()
+            if self._delta_docs >= self.merge_threshold:
+                self._merge()
+
+    def remove(self, product_ids: Iterable[str]) -> int:
+        """문서 삭제 (tombstone). 삭제된 개수를 반환"""
+        removed = 0
+        with self._lock:
+            for product_id in product_ids:
+                doc = self._id_to_doc.pop(product_id, None)
+                if doc is not None:
+                    self._remove_doc(doc)
+                    removed += 1
+        return removed
+
+    def merge(self) -> None:
+        """delta segment 를 main segment 로 병합 (대량 색인 후 호출)"""
+        with self._lock:
+            self._merge()
+
+    def _tf_weights(self, docs: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+        """BM25 tf 항 tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)) (float32, 임시 배열 최소화)"""
+        avg_len = self._total_len / max(len(self._id_to_doc), 1)
+        tfs = tfs.astype(np.float32)
+        norm = self._doc_len[docs] * np.float32(self.k1 * self.b / avg_len)
+        norm += np.float32(self.k1 * (1.0 - self.b))
+        norm += tfs
+        tfs *= np.float32(self.k1 + 1.0)
+        tfs /= norm
+        return tfs
+
+    def _merge(self) -> None:
+        """
+        delta segment 를 main CSR 로 병합 (term 기준 정렬 한 번)
+        main posting 가중치는 현재 평균 문서 길이로 다시 계산하고 dense 열도 다시 생성
+        """
+        if not self._delta:
+            return
+        delta_terms = np.concatenate([np.full(len(docs), term, dtype=np.int32) for term, (docs, _) in self._delta.items()])
+        delta_docs = np.concatenate([np.frombuffer(docs, dtype=np.int32) for docs, _ in self._delta.values()])
+        delta_tfs = np.concatenate([np.frombuffer(tfs, dtype=np.uint16) for _, tfs in self._delta.values()])
+        self._delta.clear()
+        main_terms = np.repeat(np.arange(len(self._offsets) - 1, dtype=np.int32), np.diff(self._offsets))
+        terms = np.concatenate([main_terms, delta_terms])
+        del main_terms, delta_terms
+        # term 별로 main posting 뒤에 delta posting(doc 번호 오름차순)이 오므로 term 기준 stable 정렬이면 doc 순서 유지
+        order = np.argsort(terms, kind="stable")
+        self._docs = np.concatenate([self._docs, delta_docs])[order]
+        self._tfs = np.concatenate([self._tfs, delta_tfs])[order]
+        del order
+        # 삭제된 문서의 가중치는 0 (posting 은 다음 재색인까지 남겨 둠)
+        self._weights = self._tf_weights(self._docs, self._tfs)
+        self._weights[self._deleted[self._docs]] = 0.0
+        self._offsets = np.zeros(len(self._df) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self._df)), out=self._offsets[1:])
+        self._delta_arrays.clear()
+        self._delta_docs = 0
+
+        n_docs = len(self._doc_ids)
+        lengths = np.diff(self._offsets)
+        self._dense = {}
+        for term in np.flatnonzero(lengths > n_docs * self.DENSE_TERM_RATIO).tolist():
+            start, end = self._offsets[term], self._offsets[term + 1]
+            column = np.zeros(n_docs, dtype=np.uint8)
+            quantized = np.rint(self._weights[start:end] / self._dense_scale)
+            # 가중치가 있는 문서는 최소 1 (후보에서 빠지지 않도록)
+            column[self._docs[start:end]] = np.clip(quantized, self._weights[start:end] > 0, 255)
+            self._dense[term] = column
+
+    def _main_postings(self, term: int) -> tuple[np.ndarray, np.ndarray] | None:
+        if term + 1 >= len(self._offsets):
+            return None
+        start, end = self._offsets[term], self._offsets[term + 1]
+        return (self._docs[start:end], self._weights[start:end]) if end > start else None
+
+    def _delta_postings(self, term: int) -> tuple[np.ndarray, np.ndarray] | None:
+        cached = self._delta_arrays.get(term)
+        if cached is None:
+            delta = self._delta.get(term)
+            if delta is None:
+                return None
+            docs = np.frombuffer(delta[0], dtype=np.int32).copy()
+            cached = self._delta_arrays[term] = docs, self._tf_weights(docs, np.frombuffer(delta[1], dtype=np.uint16))
+        return cached
+
+    def _postings(self, term: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        """term 의 (doc 번호, BM25 tf 가중치) 목록 (main, delta 순). 각각 doc 번호 오름차순"""
+        return [postings for postings in (self._main_postings(term), self._delta_postings(term)) if postings is not None]
+
+    def _lookup(self, term: int, docs: np.ndarray) -> np.ndarray:
+        """docs 에 대한 term 의 BM25 tf 가중치 (posting 에 없으면 0)"""
+        found = np.zeros(len(docs), dtype=np.float32)
+        for term_docs, weights in self._postings(term):
+            positions = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+            matched = term_docs[positions] == docs
+            found[matched] = weights[positions[matched]]
+        return found
+
+    def _top_candidates(self, scores: np.ndarray, count: int) -> np.ndarray:
+        """
+        전체 문서 점수에서 상위 count 개 doc 번호
+        표본(1/SAMPLE_STRIDE)으로 count 번째 점수보다 낮은 threshold 를 추정해 비교 한 번으로 후보를 줄인 뒤 정렬
+        (전체 argpartition 대비 1/5 수준, 후보가 부족하면 전체 argpartition)
+        """
+        sample = scores[:: self.SAMPLE_STRIDE]
+        if len(sample) > count:
+            rank = min(len(sample), count * 4 // self.SAMPLE_STRIDE + 1)
+            threshold = np.partition(sample, -rank)[-rank]
+            candidates = np.flatnonzero(scores >= threshold) if threshold > 0 else np.flatnonzero(scores)
+            if len(candidates) >= count or threshold <= 0:
+                return candidates[top_k_indices(scores[candidates], count)]
+        return top_k_indices(scores, count)
+
+    def _score(self, terms: list[int], idf: dict[int, float], fetch: int) -> tuple[np.ndarray, np.ndarray]:
+        """전체 문서에 대한 BM25 점수를 dense 버퍼에 누적한 뒤 상위 후보의 (doc 번호, 점수) 반환"""
+        n_docs = len(self._doc_ids)
+        self._scratch = self._grow(self._scratch, n_docs)
+        scratch = self._scratch[:n_docs]
+        dense_terms = [term for term in terms if term in self._dense]
+        for term in terms:
+            # dense 열이 있는 term 은 delta posting 만 scatter
+            for docs, weights in self._postings(term)[1:] if term in self._dense else self._postings(term):
+                scratch[docs] += idf[term] * weights
+
+        if not dense_terms:
+            docs = np.flatnonzero(scratch)
+            scores = scratch[docs]
+            scratch[docs] = 0.0
+            alive = ~self._deleted[docs]
+            return docs[alive], scores[alive]
+
+        # dense 열은 uint16 정수 누적 (float32 대비 메모리 대역폭 절반)
+        # idf 를 unit 배수로 양자화하며 unit 은 최대 합(Σ 배수 * 255)이 uint16 범위를 넘지 않도록 결정
+        n_dense = len(self._dense[dense_terms[0]])
+        unit = sum(idf[term] for term in dense_terms) * 255 / (65535 - 255 * len(dense_terms))
+        self._accumulator = self._grow(self._accumulator, n_dense)
+        self._buffer16 = self._grow(self._buffer16, n_dense)
+        self._buffer = self._grow(self._buffer, n_dense)
+        accumulator, buffer16, buffer = self._accumulator[:n_dense], self._buffer16[:n_dense], self._buffer[:n_dense]
+        for term in dense_terms:
+            np.multiply(self._dense[term], np.uint16(max(round(idf[term] / unit), 1)), out=buffer16, dtype=np.uint16)
+            accumulator += buffer16
+        np.multiply(accumulator, np.float32(unit * self._dense_scale), out=buffer)
+        scratch[:n_dense] += buffer
+        accumulator.fill(0)
+
+        # 양자화 오차가 있으므로 여유 있게 후보를 뽑아 CSR 가중치로 정확한 점수를 다시 계산
+        docs = self._top_candidates(scratch, fetch * 4 + 256)
+        docs = docs[(scratch[docs] > 0) & ~self._deleted[docs]]
+        scratch.fill(0.0)
+        scores = np.zeros(len(docs), dtype=np.float32)
+        for term in terms:
+            scores += idf[term] * self._lookup(term, docs)
+        return docs, scores
+
+    def search(self, query: str, k: int = 10, allow_ids: set[str] | None = None) -> list[dict[str, Any]]:
+        """
+        BM25 top-k 검색. [{"product_id", "score"}] (score 내림차순)
+
+        Args:
+            allow_ids: 허용된 상품 ID (facet 필터). 상위 k * 10 개 안에서 걸러냄
+        """
+        with self._lock:
+            n_docs = len(self._id_to_doc)
+            terms = sorted({self._terms[term] for term in tokenize(query) if term in self._terms})
+            terms = [term for term in terms if self._df[term] > 0]
+            if n_docs == 0 or not terms:
+                return []
+            fetch = k if allow_ids is None else k * 10
+            idf = {term: math.log(1.0 + (n_docs - self._df[term] + 0.5) / (self._df[term] + 0.5)) for term in terms}
+            docs, scores = self._score(terms, idf, fetch)
+            top = top_k_indices(scores, fetch)
+            results = [
+                {"product_id": self._doc_ids[doc], "score": score}
+                for doc, score in zip(docs[top].tolist(), scores[top].tolist())
+            ]
+        if allow_ids is not None:
+            results = [item for item in results if item["product_id"] in allow_ids]
+        return results[:k]
+
+
+# --- 증분 색인 / 검색 latency 측정 (PYTHONPATH=. python -m app.langgraph.bm25_index 1000000) ---
+if __name__ == "__main__":
+    import statistics
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = np.random.default_rng(0)
+    brands = [f"brand{i}" for i in range(500)]
+    categories = ["셔츠", "블라우스", "티셔츠", "니트", "후드", "원피스", "슬랙스", "청바지"]
+    fits = ["오버핏", "슬림핏", "레귤러핏", "릴렉스핏"]
+    necklines = ["V넥", "라운드넥", "셔츠 칼라", "하이넥", "스퀘어넥"]
+    tags = ["캐주얼", "미니멀", "스트릿", "페미닌", "데일리룩", "오피스룩", "데이트룩", "여행룩", "산뜻한", "차분한"]
+    colors = ["블랙", "화이트", "네이비", "핑크", "베이지", "그레이"]
+
+    # 캡션 문장: 긴 꼬리(Zipf) 분포의 어휘에서 뽑은 단어들
+    syllables = [chr(0xAC00 + int(c)) for c in rng.choice(11_172, 400, replace=False)]
+    vocabulary = ["".join(rng.choice(syllables, rng.integers(2, 5))) for _ in range(50_000)]
+    zipf = 1.0 / np.arange(1, len(vocabulary) + 1)
+    word_ids = rng.choice(len(vocabulary), (n + 1000, 25), p=zipf / zipf.sum())
+    attributes = rng.integers(0, 60, (n + 1000, 5))
+
+    def make_text(i: int) -> str:
+        color, fit, neckline, category, tag = attributes[i].tolist()
+        picked = [tags[(tag + j * 3) % len(tags)] for j in range(3)]
+        return (
+            f"{brands[i % 500]} {colors[color % 6]} {fits[fit % 4]} {necklines[neckline % 5]} {categories[category % 8]}. "
+            f"{' '.join(picked)} 스타일로 연출하기 좋은 아이템입니다. {' '.join(vocabulary[w] for w in word_ids[i].tolist())}"
+        )
+
+    texts = [make_text(i) for i in range(n)]
+    index = BM25Index(merge_threshold=n)
+    start = time.perf_counter()
+    index.add([f"sku_{i}" for i in range(n)], texts)
+    print(
+        f"index {n} docs: {time.perf_counter() - start:.1f}s, {len(index._terms)} terms, "
+        f"{len(index._docs)} postings, {len(index._dense)} dense terms"
+    )
+
+    # 증분 추가 (delta segment) 이후에도 검색 가능
+    index.add([f"new_{i}" for i in range(1000)], [make_text(i) for i in range(1000)])
+    queries = ["오버핏 V넥 니트", "brand42 셔츠", "핑크 데이트룩 원피스", "미니멀한 오피스룩 슬랙스", "청바지", "블랙 슬림핏 하이넥 블라우스"]
+    for query in queries:
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter()
+            results = index.search(query, k=50)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"  {query:<16} median {statistics.median(timings):6.2f}ms, top: {results[0]['product_id']} ({results[0]['score']:.3f})")
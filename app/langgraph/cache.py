@@ -0,0 +1,70 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    크기 제한(LRU) + 만료 시간(TTL)을 가진 in-memory 캐시
+
+    - maxsize 초과 시 가장 오래 사용되지 않은 항목부터 제거
+    - ttl(초)이 지난 항목은 조회 시점에 만료 처리 (ttl=None 이면 만료 없음)
+    - hits / misses 통계 제공
+    - 여러 스레드(executor)에서 접근할 수 있도록 lock 으로 보호
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, _count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, _count: bool = True) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl is not None and self._timer() - entry[0] > self.ttl):
+                if entry is not None:
+                    del self._data[key]
+                if _count:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if _count:
+                self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (self._timer(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> bool:
+        """항목 삭제. 삭제된 경우 True"""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
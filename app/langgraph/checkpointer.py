@@ -0,0 +1,638 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import AsyncIterator, Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from .executor import run_blocking
+
+# 이 크기 이상의 직렬화 결과는 zlib 압축 (임베딩 / 후보 리스트 / LLM 출력)
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_SUFFIX = "+zlib"
+
+# (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata)
+CheckpointRow = tuple[str, str, str, Optional[str], str, bytes, str, bytes]
+# (task_id, channel, type, value, task_path, idx)
+WriteRow = tuple[str, str, str, bytes, str, int]
+
+
+class BoundedCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    thread 만료(TTL)와 thread 별 최근 N 개 checkpoint 보존을 지원하는 checkpointer 공통 구현
+
+    MemorySaver 는 모든 thread 의 checkpoint 이력을 프로세스 메모리에 영구 보관하므로
+    장기 실행 서버에서는 메모리가 계속 증가하고 재시작 시 세션이 사라진다.
+
+    - 각 checkpoint 는 channel 값을 포함한 하나의 레코드로 저장 (blob 공유가 없으므로 pruning 이 단순)
+    - serde 결과가 COMPRESS_MIN_BYTES 이상이면 zlib 압축
+    - put() 마다 해당 thread 의 오래된 checkpoint 를 keep_last 개만 남기고 삭제
+    - ttl(초) 동안 갱신되지 않은 thread 는 조회되지 않으며 주기적으로 삭제
+
+    하위 클래스는 저장소별 _save_checkpoint / _load_checkpoint / _list_checkpoints /
+    _save_writes / _load_writes / _prune / _expire / delete_thread 를 구현한다.
+    """
+
+    def __init__(
+        self,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        ttl: Optional[float] = 24 * 3600,
+        keep_last: int = 2,
+        expire_interval: float = 60.0,
+    ) -> None:
+        super().__init__(serde=serde)
+        if keep_last < 2:
+            # 최신 checkpoint 의 pending_sends 는 부모 checkpoint 의 write 에서 복원하므로 최소 2개 유지
+            raise ValueError("keep_last 는 2 이상이어야 합니다.")
+        self.ttl = ttl
+        self.keep_last = keep_last
+        self.expire_interval = expire_interval
+        self._last_expire = 0.0
+
+    # --- 직렬화 ---
+
+    def _dumps(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return type_ + COMPRESS_SUFFIX, zlib.compress(data, 1)
+        return type_, data
+
+    def _loads(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(COMPRESS_SUFFIX):
+            type_, data = type_[: -len(COMPRESS_SUFFIX)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    def _expired_before(self) -> Optional[float]:
+        return None if self.ttl is None else time.time() - self.ttl
+
+    def _maybe_expire(self) -> None:
+        now = time.monotonic()
+        if self.ttl is not None and now - self._last_expire >= self.expire_interval:
+            self._last_expire = now
+            self._expire(time.time() - self.ttl)
+
+    # --- 저장소별 구현 ---
+
+    def _save_checkpoint(self, row: CheckpointRow) -> None:
+        raise NotImplementedError
+
+    def _load_checkpoint(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[CheckpointRow]:
+        raise NotImplementedError
+
+    def _list_checkpoints(
+        self, thread_id: Optional[str], checkpoint_ns: Optional[str], checkpoint_id: Optional[str], before_id: Optional[str]
+    ) -> Iterator[CheckpointRow]:
+        raise NotImplementedError
+
+    def _save_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: list[WriteRow]) -> None:
+        raise NotImplementedError
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list[WriteRow]:
+        raise NotImplementedError
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        raise NotImplementedError
+
+    def _expire(self, expired_before: float) -> None:
+        raise NotImplementedError
+
+    # --- BaseCheckpointSaver ---
+
+    def _to_tuple(self, row: CheckpointRow) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, data, metadata_type, metadata = row
+        checkpoint: Checkpoint = self._loads(type_, data)
+        writes = self._load_writes(thread_id, checkpoint_ns, checkpoint_id)
+        sends = []
+        if parent_checkpoint_id:
+            parent_writes = self._load_writes(thread_id, checkpoint_ns, parent_checkpoint_id)
+            sends = sorted(
+                (w for w in parent_writes if w[1] == TASKS),
+                key=lambda w: (w[4], w[0], w[5]),
+            )
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "pending_sends": [self._loads(w[2], w[3]) for w in sends]},
+            metadata=self._loads(metadata_type, metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[(w[0], w[1], self._loads(w[2], w[3])) for w in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id: str = config["configurable"]["thread_id"]
+        checkpoint_ns: str = config["configurable"].get("checkpoint_ns", "")
+        row = self._load_checkpoint(thread_id, checkpoint_ns, get_checkpoint_id(config))
+        return None if row is None else self._to_tuple(row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        rows = self._list_checkpoints(
+            config["configurable"]["thread_id"] if config else None,
+            config["configurable"].get("checkpoint_ns") if config else None,
+            get_checkpoint_id(config) if config else None,
+            get_checkpoint_id(before) if before else None,
+        )
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self._loads(row[6], row[7])
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield self._to_tuple(row)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)  # type: ignore[misc]
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, data = self._dumps(c)
+        metadata_type, metadata_data = self._dumps(get_checkpoint_metadata(config, metadata))
+        self._save_checkpoint(
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint["id"],
+                config["configurable"].get("checkpoint_id"),
+                type_,
+                data,
+                metadata_type,
+                metadata_data,
+            )
+        )
+        self._prune(thread_id, checkpoint_ns)
+        self._maybe_expire()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dumps(value)
+            rows.append((task_id, channel, type_, data, task_path, WRITES_IDX_MAP.get(channel, idx)))
+        self._save_writes(
+            config["configurable"]["thread_id"],
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+            rows,
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await run_blocking(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await run_blocking(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await run_blocking(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await run_blocking(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await run_blocking(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        next_v = current_v + 1
+        next_h = random.random()
+        return f"{next_v:032}.{next_h:016}"
+
+
+class SqliteCheckpointSaver(BoundedCheckpointSaver):
+    """
+    로컬 SQLite 파일 기반 checkpointer (서버 재시작 후에도 세션 유지)
+    WAL 모드 + 하나의 connection 을 lock 으로 보호하여 여러 thread 에서 사용
+    """
+
+    def __init__(self, path: str = "checkpoints.sqlite", **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS threads_updated_at ON threads(updated_at);
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT NOT NULL,
+                    checkpoint BLOB NOT NULL,
+                    metadata_type TEXT NOT NULL,
+                    metadata BLOB NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+                """
+            )
+
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """lock + BEGIN / COMMIT. 실패하면 ROLLBACK 하여 공유 connection 이 트랜잭션 안에 남지 않게 한다"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # COMMIT 자체가 실패한 경우(디스크 부족, lock)도 포함
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+    def _save_checkpoint(self, row: CheckpointRow) -> None:
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO threads VALUES (?, ?)", (row[0], time.time())
+            )
+
+    def _alive_clause(self) -> tuple[str, list[Any]]:
+        expired_before = self._expired_before()
+        if expired_before is None:
+            return "", []
+        return " AND thread_id IN (SELECT thread_id FROM threads WHERE updated_at >= ?)", [expired_before]
+
+    def _load_checkpoint(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[CheckpointRow]:
+        alive, alive_params = self._alive_clause()
+        if checkpoint_id:
+            rows = self._execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?" + alive,
+                [thread_id, checkpoint_ns, checkpoint_id, *alive_params],
+            )
+        else:
+            rows = self._execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?" + alive
+                + " ORDER BY checkpoint_id DESC LIMIT 1",
+                [thread_id, checkpoint_ns, *alive_params],
+            )
+        return rows[0] if rows else None
+
+    def _list_checkpoints(
+        self, thread_id: Optional[str], checkpoint_ns: Optional[str], checkpoint_id: Optional[str], before_id: Optional[str]
+    ) -> Iterator[CheckpointRow]:
+        alive, params = self._alive_clause()
+        sql = "SELECT * FROM checkpoints WHERE 1 = 1" + alive
+        for column, op, value in (
+            ("thread_id", "=", thread_id),
+            ("checkpoint_ns", "=", checkpoint_ns),
+            ("checkpoint_id", "=", checkpoint_id),
+            ("checkpoint_id", "<", before_id),
+        ):
+            if value is not None:
+                sql += f" AND {column} {op} ?"
+                params.append(value)
+        yield from self._execute(sql + " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC", params)
+
+    def _save_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: list[WriteRow]) -> None:
+        with self._transaction():
+            for task_id, channel, type_, value, task_path, idx in rows:
+                # 특수 channel(idx < 0)은 덮어쓰고, 일반 write 는 재실행 시 중복 저장하지 않음
+                verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+                self._conn.execute(
+                    f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type_, value, task_path),
+                )
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list[WriteRow]:
+        return self._execute(
+            "SELECT task_id, channel, type, value, task_path, idx FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        with self._transaction():
+            stale = self._conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.keep_last),
+            ).fetchall()
+            for (checkpoint_id,) in stale:
+                for table in ("checkpoints", "writes"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (thread_id, checkpoint_ns, checkpoint_id),
+                    )
+
+    def _expire(self, expired_before: float) -> None:
+        with self._transaction():
+            expired = "SELECT thread_id FROM threads WHERE updated_at < ?"
+            self._conn.execute(f"DELETE FROM checkpoints WHERE thread_id IN ({expired})", (expired_before,))
+            self._conn.execute(f"DELETE FROM writes WHERE thread_id IN ({expired})", (expired_before,))
+            self._conn.execute("DELETE FROM threads WHERE updated_at < ?", (expired_before,))
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._transaction():
+            for table in ("checkpoints", "writes", "threads"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class MongoCheckpointSaver(BoundedCheckpointSaver):
+    """
+    MongoDB 기반 checkpointer (여러 서버 인스턴스가 세션을 공유해야 하는 경우)
+    thread 만료는 updated_at 필드의 TTL index 로 MongoDB 가 직접 처리
+    """
+
+    def __init__(self, database: Any, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.checkpoints = database["checkpoints"]
+        self.writes = database["checkpoint_writes"]
+        self.checkpoints.create_index([("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", -1)], unique=True)
+        self.writes.create_index(
+            [("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", 1), ("task_id", 1), ("idx", 1)], unique=True
+        )
+        if self.ttl is not None:
+            for collection in (self.checkpoints, self.writes):
+                collection.create_index("updated_at", expireAfterSeconds=int(self.ttl))
+
+    @staticmethod
+    def _row(doc: dict[str, Any]) -> CheckpointRow:
+        return (
+            doc["thread_id"], doc["checkpoint_ns"], doc["checkpoint_id"], doc.get("parent_checkpoint_id"),
+            doc["type"], doc["checkpoint"], doc["metadata_type"], doc["metadata"],
+        )
+
+    def _save_checkpoint(self, row: CheckpointRow) -> None:
+        from datetime import datetime, timezone
+
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, data, metadata_type, metadata = row
+        key = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}
+        now = datetime.now(timezone.utc)
+        self.checkpoints.replace_one(
+            key,
+            {
+                **key,
+                "parent_checkpoint_id": parent_checkpoint_id,
+                "type": type_,
+                "checkpoint": data,
+                "metadata_type": metadata_type,
+                "metadata": metadata,
+                "updated_at": now,
+            },
+            upsert=True,
+        )
+        # 대화가 이어지는 동안 thread 전체가 만료되지 않도록 갱신
+        self.checkpoints.update_many({"thread_id": thread_id}, {"$set": {"updated_at": now}})
+        self.writes.update_many({"thread_id": thread_id}, {"$set": {"updated_at": now}})
+
+    def _load_checkpoint(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[CheckpointRow]:
+        query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        if checkpoint_id:
+            query["checkpoint_id"] = checkpoint_id
+        doc = self.checkpoints.find_one(query, sort=[("checkpoint_id", -1)])
+        return None if doc is None else self._row(doc)
+
+    def _list_checkpoints(
+        self, thread_id: Optional[str], checkpoint_ns: Optional[str], checkpoint_id: Optional[str], before_id: Optional[str]
+    ) -> Iterator[CheckpointRow]:
+        query: dict[str, Any] = {}
+        if thread_id is not None:
+            query["thread_id"] = thread_id
+        if checkpoint_ns is not None:
+            query["checkpoint_ns"] = checkpoint_ns
+        id_query: dict[str, str] = {}
+        if checkpoint_id is not None:
+            id_query["$eq"] = checkpoint_id
+        if before_id is not None:
+            id_query["$lt"] = before_id
+        if id_query:
+            query["checkpoint_id"] = id_query
+        for doc in self.checkpoints.find(query).sort([("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", -1)]):
+            yield self._row(doc)
+
+    def _save_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: list[WriteRow]) -> None:
+        from datetime import datetime, timezone
+
+        now = datetime.now(timezone.utc)
+        for task_id, channel, type_, value, task_path, idx in rows:
+            key = {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+                "task_id": task_id, "idx": idx,
+            }
+            doc = {"channel": channel, "type": type_, "value": value, "task_path": task_path, "updated_at": now}
+            if idx < 0:
+                self.writes.update_one(key, {"$set": doc}, upsert=True)
+            else:
+                self.writes.update_one(key, {"$setOnInsert": doc}, upsert=True)
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list[WriteRow]:
+        docs = self.writes.find(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}
+        ).sort([("task_id", 1), ("idx", 1)])
+        return [(d["task_id"], d["channel"], d["type"], d["value"], d["task_path"], d["idx"]) for d in docs]
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        stale = [
+            doc["checkpoint_id"]
+            for doc in self.checkpoints.find(
+                {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}, {"checkpoint_id": 1}
+            ).sort("checkpoint_id", -1).skip(self.keep_last)
+        ]
+        if stale:
+            query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": {"$in": stale}}
+            self.checkpoints.delete_many(query)
+            self.writes.delete_many(query)
+
+    def _expire(self, expired_before: float) -> None:
+        # TTL index 가 만료 처리
+        pass
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.checkpoints.delete_many({"thread_id": thread_id})
+        self.writes.delete_many({"thread_id": thread_id})
+
+
+def create_checkpointer() -> BaseCheckpointSaver:
+    """
+    CHECKPOINTER 환경변수('sqlite' | 'mongo' | 'memory')에 맞는 checkpointer 생성
+
+    - CHECKPOINT_TTL_SECONDS : 마지막 갱신 이후 thread 보존 시간 (기본 24시간)
+    - CHECKPOINT_KEEP_LAST   : thread 별로 보존할 최근 checkpoint 수 (기본 2)
+    """
+    backend = os.getenv("CHECKPOINTER", "sqlite").lower()
+    options = {
+        "ttl": float(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600))),
+        "keep_last": int(os.getenv("CHECKPOINT_KEEP_LAST", "2")),
+    }
+    if backend == "sqlite":
+        return SqliteCheckpointSaver(os.getenv("CHECKPOINT_DB_PATH", "checkpoints.sqlite"), **options)
+    if backend == "mongo":
+        from .product_repository import MONGODB_DB, get_mongo_client
+
+        return MongoCheckpointSaver(get_mongo_client()[MONGODB_DB], **options)
+    if backend == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+
+        return MemorySaver()
+    raise ValueError(f"지원하지 않는 checkpointer 입니다: {backend}")
+
+
+# --- 턴당 checkpoint 저장 / 로드 비용 벤치마크 ---
+if __name__ == "__main__":
+    import statistics
+    import tempfile
+    import uuid
+
+    from langgraph.checkpoint.base import empty_checkpoint
+    from langgraph.checkpoint.base.id import uuid6
+    from langgraph.checkpoint.memory import MemorySaver
+
+    def make_state(turn: int) -> dict[str, Any]:
+        # 실제 턴과 비슷한 크기의 state (임베딩 1024차원, 후보 20개, LLM 출력 약 2KB)
+        candidates = [
+            {"product_id": f"sku_{i}", "name": f"상품 {i}", "price": 10000 + i, "description": "린넨 셔츠 " * 40}
+            for i in range(20)
+        ]
+        return {
+            "user_query": f"여름 데이트룩 추천 {turn}",
+            "embedded_query": [random.random() for _ in range(1024)],
+            "candidate_items": candidates,
+            "candidate_items_with_metadata": candidates,
+            "ranked_candidates": candidates,
+            "llm_output": "추천 드리는 상품은 " * 150,
+        }
+
+    def bench(saver: BaseCheckpointSaver, turns: int = 200) -> tuple[float, float]:
+        config = {"configurable": {"thread_id": str(uuid.uuid4()), "checkpoint_ns": ""}}
+        put_ms, get_ms = [], []
+        versions: dict[str, str] = {}
+        for turn in range(turns):
+            checkpoint = empty_checkpoint()
+            checkpoint["id"] = str(uuid6(clock_seq=turn))
+            state = make_state(turn)
+            versions = {k: saver.get_next_version(versions.get(k), None) for k in state}
+            checkpoint["channel_values"] = state
+            checkpoint["channel_versions"] = versions
+            start = time.perf_counter()
+            config = saver.put(config, checkpoint, {"step": turn}, versions)
+            put_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            saver.get_tuple({"configurable": {"thread_id": config["configurable"]["thread_id"]}})
+            get_ms.append((time.perf_counter() - start) * 1000)
+        return statistics.median(put_ms), statistics.median(get_ms)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_saver = SqliteCheckpointSaver(os.path.join(tmp, "bench.sqlite"))
+        for name, saver in (("memory", MemorySaver()), ("sqlite", sqlite_saver)):
+            put, get = bench(saver)
+            print(f"{name:>6}: put {put:.2f}ms / get {get:.2f}ms (median per turn)")
+        size = os.path.getsize(os.path.join(tmp, "bench.sqlite")) + os.path.getsize(os.path.join(tmp, "bench.sqlite-wal"))
+        rows = sqlite_saver._execute("SELECT COUNT(*), SUM(LENGTH(checkpoint)) FROM checkpoints")[0]
+        print(f"sqlite: {rows[0]} checkpoints retained (keep_last={sqlite_saver.keep_last}), "
+              f"{rows[1] / rows[0] / 1024:.1f}KB per checkpoint, file {size / 1024:.0f}KB")
+        sqlite_saver.close()
@@ -7,18 +7,24 @@ from .states import ClothingRAGState
 # Nodes
 from .nodes import embed_query_node , select_candidates_node , gather_information_node , rerank_candidates_node , select_final_item_node , wait_for_user_feedback_node
 
+# Utils
+from .utils import classify_feedback
+
 
 
 def router_function(state: ClothingRAGState) -> str:
     '''
     client 측에서 종료 버튼을 누른경우에는 바로 end로 이동
-    
+    재정렬만 필요한 피드백(e.g. "rerank_cheaper")은 임베딩 / 검색 / 상세 조회를 건너뛰고
+    checkpoint 에 남아있는 후보로 바로 rerank
+    그 외 피드백은 쿼리를 수정하여 처음부터 다시 실행
     '''
-    user_feedback = state.get("user_feedback")
-    if user_feedback == "accept":
+    feedback_type = classify_feedback(state.get("user_feedback"))
+    if feedback_type == "accept":
         return END
-    else:
-        return user_feedback 
+    if feedback_type == "rerank" and state.get("candidate_items_with_metadata"):
+        return "rerank_candidates_node"
+    return "embed_query_node"
     
 def build_graph():
     builder = StateGraph(ClothingRAGState)
@@ -45,7 +51,7 @@ def build_graph():
         {
             END: END,
             "embed_query_node": "embed_query_node",
-            
+            "rerank_candidates_node": "rerank_candidates_node",
         }
     )
     return builder
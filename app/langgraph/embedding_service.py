@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import os
+import re
+import unicodedata
+import numpy as np
+
+from .cache import TTLCache
+
+
+def normalize_query_text(text: str) -> str:
+    """캐시 key 용 쿼리 정규화 (NFKC + 소문자 + 공백 정리). 임베딩은 원래 텍스트로 계산"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# --- 1. Backend ---
+
+class EmbeddingBackend:
+    """
+    텍스트 임베딩 provider 인터페이스
+    하위 클래스는 aembed() 에서 여러 텍스트를 한 번의 provider 호출로 임베딩해야 함
+    """
+
+    name: str = "base"
+    max_batch_size: int = 64
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    """
+    API 호출 없이 텍스트 해시로 결정적인 단위 벡터를 만드는 테스트/로컬 개발용 backend
+    """
+
+    name = "fake"
+
+    def __init__(self, dim: int = 1024, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        embeddings = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            embeddings.append((vector / np.linalg.norm(vector)).tolist())
+        return embeddings
+
+
+class JinaClipBackend(EmbeddingBackend):
+    """
+    Jina CLIP (jina-clip-v2) 텍스트 임베딩 backend (example/Jina-embedding-api.py 참고)
+    이미지 임베딩과 같은 공간이므로 CLIP 캡션 / 이미지 검색에 사용
+    """
+
+    name = "jina"
+    url = "https://api.jina.ai/v1/embeddings"
+
+    def __init__(self, model: str = "jina-clip-v2", dim: int = 1024, api_key: str | None = None, timeout: float = 10.0):
+        import httpx
+
+        self.model = model
+        self.dim = dim
+        api_key = api_key or os.getenv("JINA_API_KEY")
+        if not api_key:
+            raise ValueError("JINA_API_KEY 환경변수가 설정되지 않았습니다.")
+        # 연결을 재사용하도록 backend 당 하나의 client 유지
+        self._client = httpx.AsyncClient(
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"},
+            timeout=timeout,
+        )
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        response = await self._client.post(
+            self.url,
+            json={
+                "model": self.model,
+                "dimensions": self.dim,
+                "normalized": True,
+                "input": [{"text": text} for text in texts],
+            },
+        )
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """Gemini text-embedding-004 backend"""
+
+    name = "gemini"
+    max_batch_size = 100  # batchEmbedContents 요청당 최대 개수
+
+    def __init__(self, model: str = "models/text-embedding-004"):
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        self.model = model
+        self._embeddings = GoogleGenerativeAIEmbeddings(model=model, task_type="retrieval_query")
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        return await self._embeddings.aembed_documents(texts)
+
+
+# --- 2. Micro-batcher ---
+
+class MicroBatcher:
+    """
+    여러 websocket 세션에서 동시에 들어오는 임베딩 요청을 모아 한 번의 provider 호출로 처리
+
+    첫 요청이 들어온 뒤 max_wait 초 동안(또는 max_batch_size 에 도달할 때까지) 요청을 모은 후 flush
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_wait: float = 0.005, max_batch_size: int | None = None):
+        self.backend = backend
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size or backend.max_batch_size
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # 실행 중인 flush task 참조 (참조가 없으면 완료 전에 GC 될 수 있음)
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+
+    def submit(self, text: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.batches += 1
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = await self.backend.aembed(texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+        if len(embeddings) != len(batch):
+            # 결과 수가 입력 수와 다르면 남은 요청이 영원히 대기하지 않도록 실패 처리
+            error = RuntimeError(
+                f"{self.backend.name} backend 가 {len(batch)}개 입력에 {len(embeddings)}개 임베딩을 반환했습니다."
+            )
+            for _, future in batch[len(embeddings):]:
+                if not future.done():
+                    future.set_exception(error)
+
+
+# --- 3. Service ---
+
+class EmbeddingService:
+    """
+    쿼리 임베딩 서비스 = LRU+TTL 캐시 + in-flight 중복 제거 + micro-batcher + pluggable backend
+    """
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        cache_size: int = 10_000,
+        cache_ttl: float | None = 3600.0,
+        max_wait: float = 0.005,
+        max_batch_size: int | None = None,
+    ):
+        self.backend = backend
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._max_wait = max_wait
+        self._max_batch_size = max_batch_size
+        self._batcher: MicroBatcher | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _get_batcher(self) -> MicroBatcher:
+        # asyncio 객체는 event loop 에 묶이므로 loop 가 바뀌면 batcher 를 새로 생성
+        loop = asyncio.get_running_loop()
+        if self._batcher is None or self._loop is not loop:
+            self._batcher = MicroBatcher(self.backend, self._max_wait, self._max_batch_size)
+            self._loop = loop
+            self._inflight = {}
+        return self._batcher
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = normalize_query_text(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        batcher = self._get_batcher()
+        future = self._inflight.get(key)
+        if future is None:
+            # 같은 쿼리가 동시에 들어오면 provider 호출은 한 번만
+            future = batcher.submit(text)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        embedding = await asyncio.shield(future)
+        self.cache.set(key, embedding)
+        return embedding
+
+
+def create_embedding_backend(name: str | None = None) -> EmbeddingBackend:
+    """
+    EMBEDDING_BACKEND 환경변수('jina' | 'gemini' | 'fake')에 맞는 backend 생성
+    """
+    name = (name or os.getenv("EMBEDDING_BACKEND", "fake")).lower()
+    if name == "jina":
+        return JinaClipBackend()
+    if name == "gemini":
+        return GeminiEmbeddingBackend()
+    if name == "fake":
+        return FakeEmbeddingBackend(dim=int(os.getenv("EMBEDDING_DIM", "1024")))
+    raise ValueError(f"지원하지 않는 임베딩 backend 입니다: {name}")
+
+
+_embedding_service: EmbeddingService | None = None
+
+
+def get_embedding_service() -> EmbeddingService:
+    """프로세스 전역 임베딩 서비스 (모든 websocket 세션이 캐시와 batcher 를 공유)"""
+    global _embedding_service
+    if _embedding_service is None:
+        _embedding_service = EmbeddingService(create_embedding_backend())
+    return _embedding_service
+
+
+def set_embedding_service(service: EmbeddingService | None) -> None:
+    """프로세스 전역 임베딩 서비스 교체 (테스트용)"""
+    global _embedding_service
+    _embedding_service = service
@@ -0,0 +1,195 @@
+"""
+카탈로그 임베딩 + 상품 메타데이터를 하나의 파일로 저장하고 mmap 으로 여는 read-only 저장소
+
+uvicorn worker 가 여러 개여도 같은 파일을 mmap 하면 OS page cache 의 동일한 페이지를 공유하므로
+카탈로그 메모리는 worker 수와 무관하게 한 벌만 사용되고, JSON 역직렬화 없이 즉시 기동된다.
+
+파일 레이아웃 (little endian, 각 block 은 64 bytes 정렬)
+    [header 128B]
+        magic(8s) version(u32) dtype(u32) count(u64) dim(u32) reserved(u32)
+        vectors_offset(u64) ids_index_offset(u64) ids_data_offset(u64)
+        meta_index_offset(u64) meta_data_offset(u64)
+    [vectors]     count x dim (float32 | float16), 행 단위 L2 정규화
+    [ids index]   u64[count + 1]  ids data 내 각 product_id 의 시작 offset
+    [ids data]    utf-8 product_id 를 이어붙인 bytes
+    [meta index]  u64[count + 1]  meta data 내 각 문서의 시작 offset
+    [meta data]   utf-8 JSON 문서를 이어붙인 bytes
+"""
+import json
+import mmap
+import os
+import struct
+import numpy as np
+from typing import Any, Iterable
+
+from .vector_index import normalize_rows
+
+MAGIC = b"SWEMB\x00\x00\x01"
+FORMAT_VERSION = 1
+HEADER_FORMAT = "<8sIIQIIQQQQQ"
+HEADER_SIZE = 128
+ALIGNMENT = 64
+
+_DTYPE_CODES = {np.dtype(np.float32): 0, np.dtype(np.float16): 1}
+_CODE_DTYPES = {code: dtype for dtype, code in _DTYPE_CODES.items()}
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _pack_strings(values: list[bytes]) -> tuple[np.ndarray, bytes]:
+    offsets = np.zeros(len(values) + 1, dtype="<u8")
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    return offsets, b"".join(values)
+
+
+def write_embedding_store(
+    path: str,
+    product_ids: Iterable[str],
+    vectors: np.ndarray,
+    metadata: Iterable[dict[str, Any]],
+    dtype: str = "float32",
+) -> None:
+    """
+    임베딩 저장소 파일 생성
+
+    임시 파일에 쓴 뒤 os.replace 로 교체하므로, 기존 파일을 mmap 하고 있는 worker 는
+    이전 버전을 그대로 사용하다가 다시 열 때 새 버전을 보게 된다.
+
+    Args:
+        path: 저장할 파일 경로
+        product_ids: 상품 ID 리스트
+        vectors: (count, dim) 임베딩 행렬
+        metadata: 상품별 메타데이터 (JSON 직렬화 가능해야 함)
+        dtype: 'float32' 또는 'float16'
+            (float16 은 파일/page cache 크기 절반 대신 검색 시 float32 변환 비용 발생)
+    """
+    np_dtype = np.dtype(dtype)
+    if np_dtype not in _DTYPE_CODES:
+        raise ValueError("dtype은 'float32' 또는 'float16' 이어야 합니다.")
+    product_ids = list(product_ids)
+    vectors = normalize_rows(vectors).astype(np_dtype)
+    count, dim = vectors.shape
+    if count != len(product_ids):
+        raise ValueError("vectors 행 수와 product_ids 개수가 일치하지 않습니다.")
+
+    id_offsets, id_data = _pack_strings([pid.encode("utf-8") for pid in product_ids])
+    meta_offsets, meta_data = _pack_strings(
+        [json.dumps(meta, ensure_ascii=False).encode("utf-8") for meta in metadata]
+    )
+    if len(meta_offsets) != count + 1:
+        raise ValueError("metadata 개수와 product_ids 개수가 일치하지 않습니다.")
+
+    vectors_offset = _align(HEADER_SIZE)
+    ids_index_offset = _align(vectors_offset + vectors.nbytes)
+    ids_data_offset = _align(ids_index_offset + id_offsets.nbytes)
+    meta_index_offset = _align(ids_data_offset + len(id_data))
+    meta_data_offset = _align(meta_index_offset + meta_offsets.nbytes)
+
+    header = struct.pack(
+        HEADER_FORMAT, MAGIC, FORMAT_VERSION, _DTYPE_CODES[np_dtype], count, dim, 0,
+        vectors_offset, ids_index_offset, ids_data_offset, meta_index_offset, meta_data_offset,
+    )
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        for offset, block in (
+            (0, header),
+            (vectors_offset, vectors.tobytes()),
+            (ids_index_offset, id_offsets.tobytes()),
+            (ids_data_offset, id_data),
+            (meta_index_offset, meta_offsets.tobytes()),
+            (meta_data_offset, meta_data),
+        ):
+            f.write(b"\x00" * (offset - f.tell()))
+            f.write(block)
+    os.replace(tmp_path, path)
+
+
+class EmbeddingStore:
+    """
+    write_embedding_store() 로 만든 파일을 read-only mmap 으로 여는 저장소
+
+    - vectors : mmap 위의 zero-copy NumPy view (프로세스 간 공유)
+    - get_metadata : 요청된 문서의 bytes 만 JSON 디코딩
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, dtype_code, count, dim, _, vectors_offset, ids_index_offset,
+         ids_data_offset, meta_index_offset, meta_data_offset) = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"임베딩 저장소 파일이 아닙니다: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 저장소 버전입니다: {version}")
+
+        self.count = count
+        self.dim = dim
+        self.vectors = np.frombuffer(
+            self._mmap, dtype=_CODE_DTYPES[dtype_code], count=count * dim, offset=vectors_offset
+        ).reshape(count, dim)
+        self._meta_offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=meta_index_offset)
+        self._meta_data_offset = meta_data_offset
+
+        id_offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=ids_index_offset).tolist()
+        id_data = self._mmap[ids_data_offset : ids_data_offset + id_offsets[-1]]
+        self.ids = [id_data[id_offsets[i] : id_offsets[i + 1]].decode("utf-8") for i in range(count)]
+        self._id_to_row = {product_id: row for row, product_id in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._id_to_row
+
+    @property
+    def id_to_row(self) -> dict[str, int]:
+        """product_id → row 표 (VectorIndex.from_store 가 복사 없이 공유하므로 수정하지 않음)"""
+        return self._id_to_row
+
+    def row_of(self, product_id: str) -> int | None:
+        return self._id_to_row.get(product_id)
+
+    def get_metadata_by_row(self, row: int) -> dict[str, Any]:
+        start = self._meta_data_offset + int(self._meta_offsets[row])
+        end = self._meta_data_offset + int(self._meta_offsets[row + 1])
+        return json.loads(self._mmap[start:end])
+
+    def get_metadata(self, product_id: str) -> dict[str, Any] | None:
+        row = self._id_to_row.get(product_id)
+        return None if row is None else self.get_metadata_by_row(row)
+
+    def close(self) -> None:
+        # numpy view 가 mmap 을 참조하고 있으므로 view 를 먼저 해제
+        self.vectors = None
+        self._meta_offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 외부에서 vectors view 를 아직 참조 중이면 GC 시점에 해제
+            pass
+        self._file.close()
+
+
+# --- .npz 인덱스 → 임베딩 저장소 변환 ---
+if __name__ == "__main__":
+    import argparse
+    import time
+    from .vector_index import VectorIndex
+
+    arg_parser = argparse.ArgumentParser(description="VectorIndex(.npz) 를 mmap 임베딩 저장소로 변환")
+    arg_parser.add_argument("src", help="VectorIndex.save() 로 저장한 .npz 경로")
+    arg_parser.add_argument("dst", help="생성할 저장소 파일 경로")
+    arg_parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = arg_parser.parse_args()
+
+    index = VectorIndex.load(args.src)
+    write_embedding_store(
+        args.dst, index.ids, index.vectors, [index.get_metadata(pid) for pid in index.ids], dtype=args.dtype
+    )
+    start = time.perf_counter()
+    store = EmbeddingStore(args.dst)
+    print(f"{len(store)}개 상품 저장 완료: {args.dst} (open {(time.perf_counter() - start) * 1000:.1f}ms)")
@@ -0,0 +1,40 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# 노드의 blocking 작업(벡터 검색, MongoDB 조회, rerank 등)을 실행할 worker 수
+NODE_EXECUTOR_WORKERS = int(os.getenv("NODE_EXECUTOR_WORKERS", str(min(8, (os.cpu_count() or 1) + 4))))
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_node_executor() -> ThreadPoolExecutor:
+    """
+    그래프 노드 전용 bounded thread pool
+    asyncio 기본 executor 와 분리하여 다른 라이브러리의 to_thread 작업과 경쟁하지 않도록 함
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=NODE_EXECUTOR_WORKERS, thread_name_prefix="graph-node")
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    blocking 함수를 노드 전용 thread pool 에서 실행하고 결과를 await
+    NumPy 행렬 연산과 pymongo I/O 는 GIL 을 해제하므로 event loop 와 다른 세션이 멈추지 않음
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_node_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_node_executor() -> None:
+    """서버 종료 시 thread pool 정리"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
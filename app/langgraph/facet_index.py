@@ -0,0 +1,328 @@
+import re
+import numpy as np
+from typing import Any, Iterable, TypeVar
+
+# StructuredAttributes 에서 필터링에 사용하는 facet (caption/image_caption.py)
+FACETS = (
+    "category_l1",
+    "category_l2",
+    "color",
+    "sleeve_length",
+    "body_length",
+    "neckline",
+    "pattern",
+    "fit",
+    "silhouette",
+    "style_tags",
+    "mood_tags",
+    "tpo_tags",
+)
+
+# 쿼리 문자열에서 facet 을 자동 추출할 때 사용하는 facet (태그는 자유 텍스트라 제외)
+QUERY_FACETS = ("category_l2", "color", "sleeve_length", "neckline", "pattern", "fit", "silhouette", "tpo_tags")
+
+# 값 바로 뒤에 오면 그 값을 원하지 않는다는 뜻 (e.g. "블랙 말고 다른 색 니트")
+NEGATION_WORDS = ("말고", "빼고", "제외", "아닌", "아니고", "아니면", "없는", "싫어", "싫은", "별로")
+# 값 뒤에 붙은 조사 (e.g. "셔츠로", "블랙이랑") — 떼고 남은 부분이 facet 값일 때만 인정
+_PARTICLES = ("이랑", "으로", "랑", "로", "을", "를", "이", "가", "은", "는", "에", "의", "도", "과", "와")
+_QUERY_TOKEN_RE = re.compile(r"[^\s,.!?/()\[\]~|]+")
+
+T = TypeVar("T")
+
+
+def facet_keys(structured_attributes: dict[str, Any] | None) -> list[tuple[str, str]]:
+    """StructuredAttributes → [(facet, 값), ...] (중복 제거)"""
+    if not structured_attributes:
+        return []
+    common = structured_attributes.get("common") or {}
+    front = structured_attributes.get("front") or {}
+    subjective = structured_attributes.get("subjective") or {}
+    pairs = [
+        ("category_l1", common.get("category_l1")),
+        ("category_l2", common.get("category_l2")),
+        ("sleeve_length", common.get("sleeve_length")),
+        ("body_length", common.get("body_length")),
+        ("neckline", front.get("neckline") or common.get("neckline")),
+        ("pattern", (front.get("pattern") or {}).get("type")),
+        ("fit", subjective.get("fit")),
+        ("silhouette", subjective.get("silhouette")),
+    ]
+    for color in (common.get("color") or {}).values():
+        for detail in color if isinstance(color, list) else [color]:
+            pairs.append(("color", (detail or {}).get("name")))
+    for facet in ("style_tags", "mood_tags", "tpo_tags"):
+        pairs += [(facet, tag) for tag in subjective.get(facet) or []]
+    return list(dict.fromkeys((facet, str(value)) for facet, value in pairs if value))
+
+
+def _match_phrase(phrases: dict[tuple[str, ...], list[T]], words: list[str]) -> list[T]:
+    """토큰 열과 정확히 같은 값 (없으면 마지막 토큰의 조사를 뗀 값)"""
+    matches = phrases.get(tuple(words))
+    if matches:
+        return matches
+    *head, last = words
+    for particle in _PARTICLES:
+        if last.endswith(particle) and len(last) > len(particle):
+            matches = phrases.get((*head, last[: -len(particle)]))
+            if matches:
+                return matches
+    return []
+
+
+def match_query(query: str, phrases: dict[tuple[str, ...], list[T]]) -> list[T]:
+    """
+    쿼리에 등장하는 값 (phrases: 소문자 값의 토큰 열 → 값 목록)
+
+    - 부분 문자열이 아닌 토큰 단위로, 여러 토큰 / 긴 값부터 맞춘다 ("티셔츠" 는 셔츠가 아니고 "셔츠 칼라" 는 넥라인)
+    - 값 뒤에 부정 표현(NEGATION_WORDS)이 오면 제외한다 ("블랙 말고")
+    """
+    lengths = sorted({len(phrase) for phrase in phrases}, reverse=True)
+    tokens = _QUERY_TOKEN_RE.findall(query.lower())
+    matched: list[T] = []
+    position = 0
+    while position < len(tokens):
+        for length in lengths:
+            if position + length > len(tokens):
+                continue
+            matches = _match_phrase(phrases, tokens[position:position + length])
+            if not matches:
+                continue
+            negated = any(
+                token.startswith(NEGATION_WORDS) for token in tokens[position + length:position + length + 2]
+            )
+            if not negated:
+                matched += [match for match in matches if match not in matched]
+            position += length
+            break
+        else:
+            position += 1
+    return matched
+
+
+class FacetIndex:
+    """
+    facet 값별 bitmap 인덱스 (벡터 인덱스 row 순서와 동일한 row 공간)
+
+    - (facet, 값) 마다 row 수 만큼의 bit 를 np.packbits 형식(uint8, big-endian bit order)으로 보관
+      → bool 배열 대비 1/8 크기, AND / OR / NOT 은 byte 단위 numpy 연산
+    - 필터 표현식
+        {"sleeve_length": "긴소매", "color": ["핑크", "분홍"]}  facet 간 AND, 리스트는 OR
+        {"and": [...]}, {"or": [...]}, {"not": expr}           조합
+    - allow_mask() 결과를 벡터 인덱스 검색에 넘겨 허용된 row 만 점수 계산 (post-filter 없음)
+    - add / remove 는 VectorIndex 와 같은 규칙(append, 기존 ID 덮어쓰기, swap-remove)을 따르므로
+      벡터 인덱스와 같은 순서로 호출하면 row 가 항상 일치
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._nbytes = max((initial_capacity + 7) // 8, 1)
+        self._bitmaps: dict[tuple[str, str], np.ndarray] = {}
+        self._all = np.zeros(self._nbytes, dtype=np.uint8)
+        self._ids: list[str] = []
+        self._id_to_row: dict[str, int] = {}
+        self._row_keys: list[list[tuple[str, str]]] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def ids(self) -> list[str]:
+        return self._ids
+
+    def _ensure_capacity(self, rows: int) -> None:
+        required = (rows + 7) // 8
+        if required <= self._nbytes:
+            return
+        new_nbytes = max(required, self._nbytes * 2)
+        for key, bitmap in self._bitmaps.items():
+            grown = np.zeros(new_nbytes, dtype=np.uint8)
+            grown[: self._nbytes] = bitmap
+            self._bitmaps[key] = grown
+        all_rows = np.zeros(new_nbytes, dtype=np.uint8)
+        all_rows[: self._nbytes] = self._all
+        self._all = all_rows
+        self._nbytes = new_nbytes
+
+    def _set_bits(self, row: int, keys: list[tuple[str, str]], on: bool) -> None:
+        byte, bit = row >> 3, np.uint8(0x80 >> (row & 7))
+        for key in keys:
+            bitmap = self._bitmaps.get(key)
+            if bitmap is None:
+                if not on:
+                    continue
+                bitmap = self._bitmaps[key] = np.zeros(self._nbytes, dtype=np.uint8)
+            if on:
+                bitmap[byte] |= bit
+            else:
+                bitmap[byte] &= ~bit
+        if on:
+            self._all[byte] |= bit
+        else:
+            self._all[byte] &= ~bit
+
+    def add(self, product_ids: Iterable[str], structured_attributes: Iterable[dict[str, Any] | None]) -> None:
+        """상품 facet 추가. 이미 존재하는 product_id 는 덮어씀"""
+        product_ids = list(product_ids)
+        structured_attributes = list(structured_attributes)
+        if len(structured_attributes) != len(product_ids):
+            raise ValueError("structured_attributes 개수가 product_ids 개수와 일치하지 않습니다.")
+        self._ensure_capacity(len(self._ids) + len(product_ids))
+        # 새 row 는 (facet, 값) 별 row 목록을 모아 bool 배열 → packbits 로 한 번에 OR
+        new_rows: dict[tuple[str, str], list[int]] = {}
+        for product_id, attributes in zip(product_ids, structured_attributes):
+            keys = facet_keys(attributes)
+            row = self._id_to_row.get(product_id)
+            if row is not None:
+                self._set_bits(row, self._row_keys[row], on=False)
+                self._row_keys[row] = keys
+                self._set_bits(row, keys, on=True)
+                continue
+            row = len(self._ids)
+            self._ids.append(product_id)
+            self._row_keys.append(keys)
+            self._id_to_row[product_id] = row
+            for key in keys:
+                new_rows.setdefault(key, []).append(row)
+            new_rows.setdefault(("", ""), []).append(row)  # 전체 row bitmap
+        for key, rows in new_rows.items():
+            bits = np.zeros(self._nbytes * 8, dtype=bool)
+            bits[rows] = True
+            target = self._all if key == ("", "") else self._bitmaps.setdefault(key, np.zeros(self._nbytes, dtype=np.uint8))
+            np.bitwise_or(target, np.packbits(bits), out=target)
+
+    def remove(self, product_ids: Iterable[str]) -> int:
+        """facet 삭제 (swap-remove). 삭제된 개수를 반환"""
+        removed = 0
+        for product_id in product_ids:
+            row = self._id_to_row.pop(product_id, None)
+            if row is None:
+                continue
+            last = len(self._ids) - 1
+            self._set_bits(row, self._row_keys[row], on=False)
+            if row != last:
+                last_id, last_keys = self._ids[last], self._row_keys[last]
+                self._set_bits(last, last_keys, on=False)
+                self._set_bits(row, last_keys, on=True)
+                self._ids[row], self._row_keys[row] = last_id, last_keys
+                self._id_to_row[last_id] = row
+            self._ids.pop()
+            self._row_keys.pop()
+            removed += 1
+        return removed
+
+    def values(self, facet: str) -> list[str]:
+        """facet 에 존재하는 값 목록"""
+        return sorted(value for key_facet, value in self._bitmaps if key_facet == facet)
+
+    def bitmap(self, facet: str, value: str) -> np.ndarray:
+        bitmap = self._bitmaps.get((facet, value))
+        return bitmap if bitmap is not None else np.zeros(self._nbytes, dtype=np.uint8)
+
+    def evaluate(self, expression: dict[str, Any]) -> np.ndarray:
+        """필터 표현식을 packed bitmap 으로 계산"""
+        if "and" in expression:
+            result = self._all.copy()
+            for sub in expression["and"]:
+                np.bitwise_and(result, self.evaluate(sub), out=result)
+            return result
+        if "or" in expression:
+            result = np.zeros(self._nbytes, dtype=np.uint8)
+            for sub in expression["or"]:
+                np.bitwise_or(result, self.evaluate(sub), out=result)
+            return result
+        if "not" in expression:
+            # 존재하지 않는 row(padding bit)는 NOT 결과에서도 제외
+            return np.bitwise_and(np.invert(self.evaluate(expression["not"])), self._all)
+        result = self._all.copy()
+        for facet, values in expression.items():
+            if facet not in FACETS:
+                raise ValueError(f"지원하지 않는 facet 입니다: {facet}")
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            matched = np.zeros(self._nbytes, dtype=np.uint8)
+            for value in values:
+                np.bitwise_or(matched, self.bitmap(facet, value), out=matched)
+            np.bitwise_and(result, matched, out=result)
+        return result
+
+    def allow_mask(self, expression: dict[str, Any]) -> np.ndarray:
+        """필터 표현식을 만족하는 row 의 bool mask (길이 = 상품 수)"""
+        return np.unpackbits(self.evaluate(expression), count=len(self._ids)).view(bool)
+
+    def count(self, expression: dict[str, Any]) -> int:
+        return int(np.unpackbits(self.evaluate(expression), count=len(self._ids)).sum())
+
+    def filters_from_query(self, query: str, facets: Iterable[str] = QUERY_FACETS) -> dict[str, list[str]]:
+        """
+        쿼리 문자열에 등장하는 facet 값으로 필터 표현식 생성 (e.g. "핑크 오피스룩 셔츠")
+        같은 facet 의 여러 값은 OR, facet 간에는 AND (값 매칭 규칙은 match_query, "블랙 말고" 는 필터를 만들지 않음)
+        """
+        facets = set(facets)
+        # 값의 토큰 열 → [(facet, 값)]
+        phrases: dict[tuple[str, ...], list[tuple[str, str]]] = {}
+        for facet, value in self._bitmaps:
+            if facet in facets:
+                phrases.setdefault(tuple(value.lower().split()), []).append((facet, value))
+        filters: dict[str, list[str]] = {}
+        for facet, value in match_query(query, phrases):
+            filters.setdefault(facet, []).append(value)
+        return filters
+
+    @classmethod
+    def build(cls, product_ids: list[str], structured_attributes: Iterable[dict[str, Any] | None]) -> "FacetIndex":
+        index = cls(initial_capacity=len(product_ids))
+        index.add(product_ids, structured_attributes)
+        return index
+
+
+# --- 필터 선택도별 검색 latency (pre-filter vs over-fetch 후 post-filter) ---
+if __name__ == "__main__":
+    import statistics
+    import time
+
+    from .vector_index import VectorIndex
+
+    n, dim, k = 100_000, 256, 20
+    rng = np.random.default_rng(0)
+    ids = [f"sku_{i}" for i in range(n)]
+    categories = np.array(["셔츠", "블라우스", "티셔츠", "니트", "후드"])
+    colors = np.array(["블랙", "화이트", "네이비", "핑크", "베이지", "그레이", "레드", "그린", "옐로우", "퍼플"])
+    sleeves = np.array(["민소매", "반소매", "5부", "7부", "긴소매"])
+    attributes = [
+        {
+            "common": {"category_l2": c, "color": {"primary": {"name": color}}, "sleeve_length": s},
+            "subjective": {"tpo_tags": ["오피스룩"] if i % 20 == 0 else ["데일리룩"]},
+        }
+        for i, (c, color, s) in enumerate(
+            zip(rng.choice(categories, n), rng.choice(colors, n), rng.choice(sleeves, n))
+        )
+    ]
+    index = VectorIndex(dim, initial_capacity=n)
+    index.add(ids, rng.standard_normal((n, dim)).astype(np.float32))
+    start = time.perf_counter()
+    facets = FacetIndex.build(ids, attributes)
+    print(f"build {n} rows: {(time.perf_counter() - start) * 1000:.0f}ms, {len(facets._bitmaps)} bitmaps x {facets._nbytes}B")
+
+    queries = rng.standard_normal((30, dim)).astype(np.float32)
+    expressions = {
+        "unfiltered": None,
+        "셔츠": {"category_l2": "셔츠"},
+        "핑크 셔츠": {"category_l2": "셔츠", "color": "핑크"},
+        "핑크 긴소매 오피스룩 셔츠": {"category_l2": "셔츠", "color": "핑크", "sleeve_length": "긴소매", "tpo_tags": "오피스룩"},
+    }
+    for name, expression in expressions.items():
+        timings, post_filter_timings = [], []
+        for query in queries:
+            start = time.perf_counter()
+            mask = facets.allow_mask(expression) if expression else None
+            rows, _ = index.search_rows(query, k, allow_mask=mask)
+            timings.append((time.perf_counter() - start) * 1000)
+            if expression:
+                # 비교용: 10배 over-fetch 후 post-filter (선택도가 낮으면 k 개를 채우지 못함)
+                start = time.perf_counter()
+                fetched, _ = index.search_rows(query, k * 10)
+                kept = fetched[mask[fetched]][:k]
+                post_filter_timings.append((time.perf_counter() - start) * 1000)
+        selected = facets.count(expression) if expression else n
+        line = f"{name:>16}: {selected:>6} rows, pre-filter {statistics.median(timings):.2f}ms ({len(rows)} results)"
+        if post_filter_timings:
+            line += f", post-filter {statistics.median(post_filter_timings):.2f}ms ({len(kept)} results)"
+        print(line)
@@ -3,14 +3,15 @@ from typing import Annotated , Any
 
 
 from langgraph.graph import StateGraph , END , START
-from langgraph.checkpoint.memory import MemorySaver
 
 from .edges import build_graph
+from .checkpointer import create_checkpointer
 # import uuid # No longer needed here
 
 
 builder = build_graph()
-checkpointer = MemorySaver()
+# CHECKPOINTER 환경변수로 sqlite(기본) / mongo / memory 선택 (checkpointer.py 참고)
+checkpointer = create_checkpointer()
 graph = builder.compile(checkpointer=checkpointer)
 
 
@@ -0,0 +1,401 @@
+import time
+import numpy as np
+from typing import Any, Iterable
+
+from .vector_index import ChangeLog, VectorIndex, normalize_rows, top_k_indices
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    seed: int = 0,
+    chunk_size: int = 65536,
+) -> np.ndarray:
+    """
+    NumPy k-means (Lloyd). 중심점 행렬 (n_clusters, d) 반환
+    할당 단계는 ||x||^2 - 2 x·c + ||c||^2 를 chunk 단위 행렬곱으로 계산
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    if n < n_clusters:
+        raise ValueError(f"학습 벡터 수({n})가 클러스터 수({n_clusters})보다 적습니다.")
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(n, n_clusters, replace=False)].copy()
+    assign = np.zeros(n, dtype=np.int64)
+
+    for _ in range(n_iter):
+        assign = assign_nearest(vectors, centroids, chunk_size)
+        counts = np.bincount(assign, minlength=n_clusters)
+        # 할당 순으로 정렬 후 reduceat 으로 클러스터별 합 계산 (np.add.at 보다 수십 배 빠름)
+        order = np.argsort(assign, kind="stable")
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums[~empty] = np.add.reduceat(vectors[order], starts[~empty], axis=0)
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # 빈 클러스터는 임의의 학습 벡터로 재초기화
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(n, int(empty.sum()), replace=False)]
+    return centroids
+
+
+def assign_nearest(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """각 벡터에 대해 L2 거리가 가장 가까운 중심점 index 반환"""
+    c_norm = (centroids ** 2).sum(axis=1)
+    assign = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk_size):
+        chunk = vectors[start : start + chunk_size]
+        dist = c_norm[None, :] - 2.0 * (chunk @ centroids.T)
+        assign[start : start + chunk_size] = dist.argmin(axis=1)
+    return assign
+
+
+class IVFPQIndex:
+    """
+    대규모 카탈로그용 근사 최근접 이웃(ANN) 인덱스 (IVF + Product Quantization)
+
+    - coarse quantizer : nlist 개의 k-means 중심점으로 벡터를 inverted list 에 분배
+    - residual PQ      : (벡터 - 중심점) residual 을 m 개의 부분공간으로 나눠 각각 256 개 codeword 로 양자화
+                         → 벡터 하나당 m bytes (768차원 float32 3072 bytes 대비 m=64 기준 48배 압축)
+    - 검색             : 쿼리와 가까운 nprobe 개 list 만 탐색.
+                         list 는 학습 / add 와 같은 L2 기준(2 q·c - ||c||², 중심점은 정규화되어 있지 않음)으로 고르고
+                         inner product = q·c + Σ_m LUT[m, code_m] (LUT 는 쿼리당 한 번 계산)
+    - list 의 상품은 정수 key 배열로 보관 → allow_ids 필터는 key 별 bool 배열 조회 한 번 (list 안의 ID 를 하나씩 확인하지 않음)
+
+    모든 벡터는 정규화되어 저장되므로 inner product = cosine 유사도
+    """
+
+    def __init__(self, dim: int, nlist: int = 1024, m: int = 64, nbits: int = 8, nprobe: int = 16):
+        if dim % m != 0:
+            raise ValueError(f"dim({dim})은 m({m})으로 나누어 떨어져야 합니다.")
+        if nbits != 8:
+            raise ValueError("현재는 nbits=8 (uint8 code) 만 지원합니다.")
+        self.dim = dim
+        self.nlist = nlist
+        self.m = m
+        self.ksub = 2 ** nbits
+        self.dsub = dim // m
+        self.nprobe = nprobe
+
+        self.coarse_centroids: np.ndarray | None = None  # (nlist, dim)
+        self.pq_codebooks: np.ndarray | None = None  # (m, ksub, dsub)
+        self._coarse_norms: np.ndarray | None = None  # ||c||² (nlist,)
+
+        self._list_codes: list[np.ndarray] = [np.empty((0, m), dtype=np.uint8) for _ in range(nlist)]
+        self._list_keys: list[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        # 상품 ID ↔ 정수 key (삭제된 key 는 재사용)
+        self._keys: list[str | None] = []
+        self._key_of: dict[str, int] = {}
+        self._free_keys: list[int] = []
+        self._locations: dict[str, tuple[int, int]] = {}
+        self._metadata: dict[str, dict[str, Any]] = {}
+        self.changes = ChangeLog()
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._locations
+
+    @property
+    def is_trained(self) -> bool:
+        return self.coarse_centroids is not None and self.pq_codebooks is not None
+
+    def train(self, vectors: np.ndarray, max_train_points: int = 100_000, n_iter: int = 20, seed: int = 0) -> None:
+        """
+        coarse 중심점과 PQ codebook 학습 (최대 max_train_points 개 샘플 사용)
+        """
+        vectors = normalize_rows(vectors)
+        if vectors.shape[0] > max_train_points:
+            rng = np.random.default_rng(seed)
+            vectors = vectors[rng.choice(vectors.shape[0], max_train_points, replace=False)]
+
+        self.coarse_centroids = kmeans(vectors, self.nlist, n_iter=n_iter, seed=seed)
+        self._coarse_norms = None
+        residuals = vectors - self.coarse_centroids[assign_nearest(vectors, self.coarse_centroids)]
+        self.pq_codebooks = np.stack(
+            [
+                kmeans(residuals[:, i * self.dsub : (i + 1) * self.dsub], self.ksub, n_iter=n_iter, seed=seed + i)
+                for i in range(self.m)
+            ]
+        )
+
+    def _probe_scores(self, query: np.ndarray, coarse_scores: np.ndarray) -> np.ndarray:
+        """nprobe 개 list 선택 점수: -||q - c||² + ||q||² = 2 q·c - ||c||² (학습 / add 의 assign_nearest 와 같은 기준)"""
+        if self._coarse_norms is None:
+            self._coarse_norms = (self.coarse_centroids ** 2).sum(axis=1)
+        return 2.0 * coarse_scores - self._coarse_norms
+
+    def _key(self, product_id: str) -> int:
+        key = self._key_of.get(product_id)
+        if key is None:
+            if self._free_keys:
+                key = self._free_keys.pop()
+                self._keys[key] = product_id
+            else:
+                key = len(self._keys)
+                self._keys.append(product_id)
+            self._key_of[product_id] = key
+        return key
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        codes = np.empty((residuals.shape[0], self.m), dtype=np.uint8)
+        for i in range(self.m):
+            sub = residuals[:, i * self.dsub : (i + 1) * self.dsub]
+            codes[:, i] = assign_nearest(sub, self.pq_codebooks[i])
+        return codes
+
+    def add(
+        self,
+        product_ids: Iterable[str],
+        vectors: np.ndarray,
+        metadata: Iterable[dict[str, Any]] | None = None,
+    ) -> None:
+        """
+        벡터 추가 (학습 이후에만 가능). 이미 존재하는 product_id 는 교체
+        """
+        if not self.is_trained:
+            raise RuntimeError("add() 전에 train() 을 먼저 호출해야 합니다.")
+        product_ids = list(product_ids)
+        vectors = normalize_rows(vectors)
+        metadata = list(metadata) if metadata is not None else [{} for _ in product_ids]
+        self.remove([pid for pid in product_ids if pid in self._locations])
+
+        lists = assign_nearest(vectors, self.coarse_centroids)
+        codes = self._encode(vectors - self.coarse_centroids[lists])
+        keys = np.asarray([self._key(pid) for pid in product_ids], dtype=np.int64)
+        for list_no in np.unique(lists).tolist():
+            rows = np.flatnonzero(lists == list_no)
+            offset = len(self._list_keys[list_no])
+            self._list_codes[list_no] = np.concatenate([self._list_codes[list_no], codes[rows]])
+            self._list_keys[list_no] = np.concatenate([self._list_keys[list_no], keys[rows]])
+            for j, row in enumerate(rows.tolist()):
+                self._locations[product_ids[row]] = (list_no, offset + j)
+        for product_id, meta in zip(product_ids, metadata):
+            self._metadata[product_id] = meta
+        self.changes.record(product_ids)
+
+    def remove(self, product_ids: Iterable[str]) -> int:
+        """
+        벡터 삭제 (inverted list 내부 swap-remove). 삭제된 개수를 반환
+        """
+        removed = 0
+        for product_id in product_ids:
+            location = self._locations.pop(product_id, None)
+            if location is None:
+                continue
+            list_no, pos = location
+            keys = self._list_keys[list_no]
+            codes = self._list_codes[list_no]
+            last = len(keys) - 1
+            if pos != last:
+                keys[pos] = keys[last]
+                codes[pos] = codes[last]
+                self._locations[self._keys[keys[pos]]] = (list_no, pos)
+            self._list_keys[list_no] = keys[:last]
+            self._list_codes[list_no] = codes[:last]
+            key = self._key_of.pop(product_id)
+            self._keys[key] = None
+            self._free_keys.append(key)
+            self._metadata.pop(product_id, None)
+            self.changes.record([product_id], removed=True)
+            removed += 1
+        return removed
+
+    @property
+    def ids(self) -> list[str]:
+        return list(self._locations)
+
+    def get_metadata(self, product_id: str) -> dict[str, Any] | None:
+        return self._metadata.get(product_id)
+
+    def keys_of(self, product_ids: Iterable[str]) -> np.ndarray:
+        """상품 ID → 정수 key 배열 (없는 ID 는 -1). add / remove 전까지 유효 (search 의 allow_keys 용)"""
+        return np.fromiter((self._key_of.get(pid, -1) for pid in product_ids), dtype=np.int64)
+
+    def search(
+        self,
+        query: np.ndarray | list[float],
+        k: int = 3,
+        nprobe: int | None = None,
+        allow_ids: set[str] | None = None,
+        allow_keys: np.ndarray | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        근사 cosine top-k 검색. nprobe 가 클수록 recall 증가 / latency 증가
+
+        Args:
+            allow_ids: 검색 대상 상품 ID (facet_index.py). 허용된 상품 수가 nprobe 개 list 에 들어있을
+                예상 개수보다 적으면 list 를 탐색하지 않고 허용된 상품의 PQ code 만 직접 점수 계산
+            allow_keys: allow_ids 대신 keys_of() 로 미리 변환한 key 배열 (쿼리마다 ID 를 변환하지 않음)
+        """
+        if len(self) == 0:
+            return []
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        query = normalize_rows(query)[0]
+
+        coarse_scores = self.coarse_centroids @ query
+        # LUT[i, j] = q_i · codebook[i, j]  (m, ksub)
+        lut = np.einsum("mkd,md->mk", self.pq_codebooks, query.reshape(self.m, self.dsub))
+        sub_index = np.arange(self.m)
+
+        probes = top_k_indices(self._probe_scores(query, coarse_scores), nprobe).tolist()
+        expected = len(self) * nprobe / self.nlist
+        if allow_ids is not None:
+            if len(allow_ids) <= max(expected, sum(len(self._list_keys[list_no]) for list_no in probes)):
+                allow_keys = self.keys_of(allow_ids)
+            else:
+                # 허용된 ID 가 탐색할 상품보다 많으면 탐색할 상품 쪽을 ID 로 바꿔 확인하는 편이 싸다
+                probed_keys = np.concatenate([self._list_keys[list_no] for list_no in probes])
+                keep = np.fromiter((self._keys[key] in allow_ids for key in probed_keys.tolist()), dtype=bool)
+                allow_keys = probed_keys[keep]
+        if allow_keys is not None:
+            allow_keys = allow_keys[allow_keys >= 0]
+        selective = allow_keys is not None and len(allow_ids if allow_ids is not None else allow_keys) <= expected
+        if selective:
+            if len(allow_keys) == 0:
+                return []
+            keys = np.unique(allow_keys)
+            locations = [self._locations[self._keys[key]] for key in keys.tolist()]
+            list_nos = np.array([list_no for list_no, _ in locations])
+            codes = np.stack([self._list_codes[list_no][pos] for list_no, pos in locations])
+            scores = coarse_scores[list_nos] + lut[sub_index, codes].sum(axis=1)
+        else:
+            allowed = None
+            if allow_keys is not None:
+                # 허용된 상품의 key 에만 True 인 bool 배열 → list 별 필터는 배열 indexing 한 번
+                allowed = np.zeros(len(self._keys), dtype=bool)
+                allowed[allow_keys] = True
+            list_scores, list_keys = [], []
+            for list_no in probes:
+                codes = self._list_codes[list_no]
+                keys = self._list_keys[list_no]
+                if allowed is not None:
+                    keep = allowed[keys]
+                    codes, keys = codes[keep], keys[keep]
+                if codes.shape[0] == 0:
+                    continue
+                list_scores.append(coarse_scores[list_no] + lut[sub_index, codes].sum(axis=1))
+                list_keys.append(keys)
+            if not list_scores:
+                return []
+            scores, keys = np.concatenate(list_scores), np.concatenate(list_keys)
+        rows = top_k_indices(scores, k)
+        results = []
+        for row in rows.tolist():
+            product_id = self._keys[keys[row]]
+            results.append({**self._metadata.get(product_id, {}), "product_id": product_id, "score": float(scores[row])})
+        return results
+
+    def save(self, path: str) -> None:
+        """인덱스를 .npz 파일로 저장"""
+        list_sizes = np.asarray([len(keys) for keys in self._list_keys], dtype=np.int64)
+        all_ids = [self._keys[key] for keys in self._list_keys for key in keys.tolist()]
+        np.savez(
+            path,
+            params=np.asarray([self.dim, self.nlist, self.m, self.nprobe], dtype=np.int64),
+            coarse_centroids=self.coarse_centroids,
+            pq_codebooks=self.pq_codebooks,
+            list_sizes=list_sizes,
+            codes=np.concatenate(self._list_codes),
+            ids=np.asarray(all_ids, dtype=object),
+            metadata=np.asarray([self._metadata.get(pid, {}) for pid in all_ids], dtype=object),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IVFPQIndex":
+        """save() 로 저장한 .npz 파일에서 인덱스 로드"""
+        data = np.load(path, allow_pickle=True)
+        dim, nlist, m, nprobe = data["params"].tolist()
+        index = cls(dim=dim, nlist=nlist, m=m, nprobe=nprobe)
+        index.coarse_centroids = data["coarse_centroids"]
+        index.pq_codebooks = data["pq_codebooks"]
+        ids = data["ids"].tolist()
+        metadata = data["metadata"].tolist()
+        codes = data["codes"]
+        index._keys = list(ids)
+        index._key_of = {product_id: key for key, product_id in enumerate(ids)}
+        start = 0
+        for list_no, size in enumerate(data["list_sizes"].tolist()):
+            index._list_codes[list_no] = codes[start : start + size].copy()
+            index._list_keys[list_no] = np.arange(start, start + size, dtype=np.int64)
+            for pos, product_id in enumerate(ids[start : start + size]):
+                index._locations[product_id] = (list_no, pos)
+                index._metadata[product_id] = metadata[start + pos]
+            start += size
+        return index
+
+
+def recall_latency_report(
+    exact_index: VectorIndex,
+    ann_index: IVFPQIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobes: Iterable[int] = (1, 4, 8, 16, 32, 64),
+) -> list[dict[str, float]]:
+    """
+    exact 인덱스 대비 ANN 인덱스의 nprobe 별 recall@k 와 평균 검색 latency 측정
+
+    Returns:
+        [{"nprobe", "recall_at_k", "ann_ms", "exact_ms"}]
+    """
+    start = time.perf_counter()
+    ground_truth = [{item["product_id"] for item in exact_index.search(q, k)} for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = []
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        results = [ann_index.search(q, k, nprobe=nprobe) for q in queries]
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        hits = sum(
+            len(truth & {item["product_id"] for item in result})
+            for truth, result in zip(ground_truth, results)
+        )
+        report.append(
+            {
+                "nprobe": nprobe,
+                "recall_at_k": hits / (k * len(queries)),
+                "ann_ms": ann_ms,
+                "exact_ms": exact_ms,
+            }
+        )
+    return report
+
+
+# --- recall@k vs latency 리포트 ---
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="IVF-PQ recall@k vs latency report")
+    arg_parser.add_argument("--n", type=int, default=200_000, help="카탈로그 벡터 수")
+    arg_parser.add_argument("--dim", type=int, default=768)
+    arg_parser.add_argument("--nlist", type=int, default=1024)
+    arg_parser.add_argument("--m", type=int, default=64)
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    # 실제 캡션 임베딩처럼 계층적 군집 구조(카테고리 → 상품 그룹 → SKU)를 가진 합성 데이터
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((args.nlist // 4, args.dim)).astype(np.float32)
+    groups = topics[rng.integers(0, len(topics), args.n // 10)]
+    groups += 0.7 * rng.standard_normal(groups.shape).astype(np.float32)
+    data = groups[rng.integers(0, len(groups), args.n)] + 0.3 * rng.standard_normal((args.n, args.dim)).astype(np.float32)
+    ids = [f"sku_{i}" for i in range(args.n)]
+    queries = data[rng.choice(args.n, args.queries, replace=False)] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    exact = VectorIndex(args.dim, initial_capacity=args.n)
+    exact.add(ids, data)
+
+    start = time.perf_counter()
+    ann = IVFPQIndex(args.dim, nlist=args.nlist, m=args.m)
+    ann.train(data)
+    ann.add(ids, data)
+    print(f"IVF-PQ build: {time.perf_counter() - start:.1f}s "
+          f"(codes {args.n * args.m / 1e6:.1f}MB vs float32 {args.n * args.dim * 4 / 1e6:.1f}MB)")
+
+    print(f"{'nprobe':>6} | {'recall@' + str(args.k):>9} | {'ann ms':>7} | {'exact ms':>8}")
+    for row in recall_latency_report(exact, ann, queries, k=args.k):
+        print(f"{row['nprobe']:>6} | {row['recall_at_k']:>9.3f} | {row['ann_ms']:>7.2f} | {row['exact_ms']:>8.2f}")
@@ -0,0 +1,143 @@
+import os
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_openai import ChatOpenAI
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from .cache import TTLCache
+from .llm_router import ROUTED_MODEL, get_llm_router, routed
+from .llm_scheduler import Priority, get_llm_scheduler, scheduled
+
+# 동시에 유지할 chat client / chain 수 (초과 시 가장 오래 사용되지 않은 모델부터 제거)
+# chain 은 client 를 직접 잡지 않으므로 살아 있는 client 수는 LLM_CLIENT_CACHE_SIZE 로 제한된다
+LLM_CLIENT_CACHE_SIZE = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "16"))
+LLM_CHAIN_CACHE_SIZE = int(os.getenv("LLM_CHAIN_CACHE_SIZE", "64"))
+
+_clients = TTLCache(maxsize=LLM_CLIENT_CACHE_SIZE)
+_chains = TTLCache(maxsize=LLM_CHAIN_CACHE_SIZE)
+
+
+def get_provider(model: str) -> str:
+    """모델 이름으로 provider 판별"""
+    if model.startswith(("gpt", "o1", "o3", "o4")):
+        return "openai"
+    if model.startswith(("gemini", "gemma", "learnlm")):
+        return "google"
+    raise ValueError(f"지원하지 않는 모델입니다: {model}")
+
+
+def _create_chat_model(provider: str, model: str, temperature: float, **kwargs: Any) -> BaseChatModel:
+    if provider == "openai":
+        return ChatOpenAI(model=model, temperature=temperature, **kwargs)
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, **kwargs)
+
+
+def get_chat_model(model: str, temperature: float = 0) -> BaseChatModel:
+    """
+    (provider, model, temperature) 별로 공유되는 chat client 반환
+
+    chat client 는 내부에 HTTP connection pool 을 가지므로 턴마다 새로 만들면
+    매번 TCP/TLS 연결을 새로 맺어야 한다. 모든 websocket 세션이 같은 client 를 재사용한다.
+    """
+    provider = get_provider(model)
+    key = (provider, model, temperature)
+    chat_model = _clients.get(key)
+    if chat_model is None:
+        chat_model = _create_chat_model(provider, model, temperature)
+        _clients.set(key, chat_model)
+    return chat_model
+
+
+class CachedChatModel(Runnable):
+    """
+    호출할 때마다 client cache 에서 (model, temperature) 의 chat client 를 찾아 위임하는 chat model 자리의 Runnable
+    chain 이 client 참조를 들고 있지 않으므로 client 가 LRU 에서 밀려나면 실제로 해제되고, 다음 호출에서 다시 만든다
+    """
+
+    def __init__(self, model: str, temperature: float = 0):
+        self.model = model
+        self.temperature = temperature
+
+    @property
+    def client(self) -> BaseChatModel:
+        return get_chat_model(self.model, self.temperature)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.client.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.client.ainvoke(input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self.client.stream(input, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async for chunk in self.client.astream(input, config, **kwargs):
+            yield chunk
+
+
+def get_chat_chain(
+    model: str,
+    prompt_template: str,
+    temperature: float = 0,
+    priority: Priority = Priority.INTERACTIVE,
+) -> Runnable:
+    """
+    (provider, model, temperature, prompt_template, priority) 별로 공유되는 `prompt | llm` chain 반환
+    llm 호출은 공유 scheduler(llm_scheduler) 의 모델별 RPM / TPM 한도와 우선순위를 따른다
+    model 이 "auto" 이면 llm_router 가 요청마다 chat_recommendation 조건에 맞는 모델을 고르고 실패 시 다음 모델로 넘긴다
+    """
+    provider = "router" if model == ROUTED_MODEL else get_provider(model)
+    key = (provider, model, temperature, prompt_template, priority)
+    chain = _chains.get(key)
+    if chain is None:
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", prompt_template),
+                ("user", "{user_query}")
+            ]
+        )
+        if model == ROUTED_MODEL:
+            llm = routed("chat_recommendation", lambda name: get_chat_model(name, temperature), priority)
+        else:
+            llm = scheduled(CachedChatModel(model, temperature), model, priority)
+        chain = prompt | llm
+        _chains.set(key, chain)
+    return chain
+
+
+def register_chat_model(model: str, chat_model: BaseChatModel, temperature: float = 0) -> None:
+    """(provider, model, temperature) 의 chat client 를 직접 지정 (로컬 실행 / 부하 측정용 fake model 등)"""
+    _clients.set((get_provider(model), model, temperature), chat_model)
+
+
+def warm_up(models: Optional[list[str]] = None, temperature: float = 0) -> list[str]:
+    """
+    서버 시작 시 자주 쓰는 모델의 client 를 미리 생성 (첫 요청에서 client 생성 / 연결 비용을 내지 않도록)
+    models 가 없으면 환경 변수 LLM_WARM_UP_MODELS(쉼표 구분, .env 로드 후 읽음), 그것도 비어 있으면 llm_router 가 chat_recommendation 에 고르는 모델들
+    client 를 만들지 못한 모델(API key 없음 등)은 건너뛰고, 만든 모델 목록 반환
+    """
+    if models is None:
+        models = [m.strip() for m in os.getenv("LLM_WARM_UP_MODELS", "").split(",") if m.strip()]
+        models = models or get_llm_router().plan("chat_recommendation")
+    warmed = []
+    for model in models[:LLM_CLIENT_CACHE_SIZE]:
+        try:
+            get_chat_model(model, temperature)
+        except Exception as e:
+            print(f"LLM client warm-up 실패 ({model}): {e}")
+            continue
+        warmed.append(model)
+    return warmed
+
+
+def registry_stats() -> dict[str, Any]:
+    return {
+        "clients": _clients.stats(),
+        "chains": _chains.stats(),
+        "scheduler": get_llm_scheduler().stats(),
+        "router": get_llm_router().stats(),
+    }
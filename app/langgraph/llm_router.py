@@ -0,0 +1,507 @@
+"""
+요청 종류(task)별로 조건을 만족하는 가장 싼 / 빠른 Gemini 모델을 고르는 model router
+
+- 모델 표: gemini_models.json(example/get_gemini_model.py 로 갱신) 의 모델 목록 + 입력 / 출력 토큰 한도에
+  모델 family 별 품질 등급 / 가격 / latency 초기값(MODEL_FAMILIES) 을 붙인다
+- task 마다 입력 종류(text / image), 최소 품질, 출력 토큰, 목표(cost / latency) 가 정해져 있고(TASK_PROFILES)
+  요청 토큰이 한도 안에 드는 후보 중 목표 값이 가장 작은 모델부터 시도한다
+- 호출 결과로 모델별 latency(EWMA) / 오류율을 갱신하고, 429 나 연속 오류가 난 모델은 잠시 후보에서 빼고 다음 모델로 넘긴다
+- 실제 호출은 llm_scheduler 를 거치므로 모델별 RPM / TPM 한도는 그대로 지켜진다
+
+    chain = prompt | routed("chat_recommendation", lambda model: get_chat_model(model), Priority.INTERACTIVE)
+    model = get_llm_router().select("deep_caption", input_tokens=3000).name
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from .llm_scheduler import (
+    BACKOFF_CAP, LLMScheduler, Priority, backoff_delay, base_model_name, estimate_tokens, get_llm_scheduler,
+    is_rate_limit_error, normalize_model_name, usage_tokens,
+)
+
+T = TypeVar("T")
+
+GEMINI_MODELS_PATH = Path(__file__).resolve().parents[2] / "gemini_models.json"
+# websocket config 등에서 model 대신 쓰면 router 가 고른다
+ROUTED_MODEL = "auto"
+
+# 모델 family: (이름 prefix, 품질 등급, 이미지 입력, 입력 / 출력 1M 토큰당 USD, latency 초기값 ms)
+# 가격 / latency 는 공개 가격표 기준 대략치 (순위를 정하는 용도, 실제 latency 는 호출하면서 갱신)
+MODEL_FAMILIES: list[tuple[str, int, bool, float, float, float]] = [
+    ("gemini-2.5-pro", 5, True, 1.25, 10.0, 2500),
+    ("gemini-2.5-flash-lite", 3, True, 0.10, 0.40, 350),
+    ("gemini-2.5-flash", 4, True, 0.30, 2.50, 900),
+    ("gemini-2.0-pro", 4, True, 1.25, 10.0, 2000),
+    ("gemini-2.0-flash-lite", 2, True, 0.075, 0.30, 350),
+    ("gemini-2.0-flash", 3, True, 0.10, 0.40, 450),
+    ("gemini-1.5-pro", 3, True, 1.25, 5.0, 1500),
+    ("gemini-1.5-flash-8b", 1, True, 0.0375, 0.15, 350),
+    ("gemini-1.5-flash", 2, True, 0.075, 0.30, 500),
+    ("gemma-3", 0, False, 0.0, 0.0, 800),
+]
+# 생성(generateContent) 은 되지만 채팅 / 캡셔닝 용도가 아닌 모델
+EXCLUDED_NAME_PATTERN = re.compile(r"embedding|tts|image-generation|aqa|thinking|vision")
+# preview / experimental 모델은 allow_preview 인 경우에만 후보
+PREVIEW_NAME_PATTERN = re.compile(r"preview|exp|latest")
+
+# 연속 오류가 이만큼 나면 ERROR_COOLDOWN 초 동안 후보에서 제외
+MAX_CONSECUTIVE_ERRORS = 3
+ERROR_COOLDOWN = 30.0
+LATENCY_EWMA_ALPHA = 0.2
+
+
+@dataclass(frozen=True)
+class ModelCapability:
+    name: str
+    input_token_limit: int
+    output_token_limit: int
+    quality: int
+    vision: bool
+    input_price: float   # 1M 토큰당 USD
+    output_price: float
+    latency_prior_ms: float
+    preview: bool = False
+
+    @property
+    def pinned(self) -> bool:
+        """"-001" 처럼 버전이 고정된 이름 (alias 보다 우선, 캐시 key / 재현성)"""
+        return re.search(r"-\d{3}$", self.name) is not None
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        return (input_tokens * self.input_price + output_tokens * self.output_price) / 1_000_000
+
+
+@dataclass(frozen=True)
+class TaskProfile:
+    """요청 종류별 조건 (objective 'cost' 는 요청당 가격, 'latency' 는 관측 latency 가 작은 순)"""
+
+    vision: bool = False
+    min_quality: int = 2
+    output_tokens: int = 1024
+    objective: str = "cost"
+    priority: Priority = Priority.BATCH
+    allow_preview: bool = False
+
+
+TASK_PROFILES: dict[str, TaskProfile] = {
+    # websocket 추천 응답: 사용자가 기다리므로 latency 우선
+    "chat_recommendation": TaskProfile(min_quality=2, output_tokens=1024, objective="latency", priority=Priority.INTERACTIVE),
+    # MasterCaption 구조화 캡션: 세부 속성 품질이 필요
+    "deep_caption": TaskProfile(vision=True, min_quality=3, output_tokens=2048),
+    "ocr": TaskProfile(vision=True, min_quality=2, output_tokens=512),
+    # 색상 옵션명 batch 표준화 (요청당 라벨 100개 내외)
+    "color_normalization": TaskProfile(min_quality=1, output_tokens=1024),
+}
+
+
+def _family(name: str) -> Optional[tuple[str, int, bool, float, float, float]]:
+    for family in MODEL_FAMILIES:
+        if name.startswith(family[0]):
+            return family
+    return None
+
+
+def load_capabilities(models_path: Optional[os.PathLike] = GEMINI_MODELS_PATH) -> dict[str, ModelCapability]:
+    """gemini_models.json 의 생성 모델 중 MODEL_FAMILIES 에 있는 모델의 capability 표"""
+    if not models_path or not os.path.exists(models_path):
+        return {}
+    with open(models_path, encoding="utf-8") as f:
+        models = json.load(f).get("full_response", {}).get("models", [])
+    capabilities = {}
+    for model in models:
+        name = normalize_model_name(model["name"])
+        family = _family(name)
+        if (
+            family is None
+            or "generateContent" not in model.get("supportedGenerationMethods", [])
+            or EXCLUDED_NAME_PATTERN.search(name)
+        ):
+            continue
+        _, quality, vision, input_price, output_price, latency = family
+        capabilities[name] = ModelCapability(
+            name=name,
+            input_token_limit=model.get("inputTokenLimit") or 0,
+            output_token_limit=model.get("outputTokenLimit") or 0,
+            quality=quality,
+            vision=vision,
+            input_price=input_price,
+            output_price=output_price,
+            latency_prior_ms=latency,
+            preview=PREVIEW_NAME_PATTERN.search(name) is not None,
+        )
+    return collapse_aliases(capabilities)
+
+
+def collapse_aliases(capabilities: dict[str, ModelCapability]) -> dict[str, ModelCapability]:
+    """
+    같은 기본 모델(alias / 고정 버전)은 quota 를 공유하므로 하나만 남긴다
+    고정 버전(가장 최신 "-00N") > alias 순으로 선택
+    """
+    chosen: dict[str, ModelCapability] = {}
+    for capability in capabilities.values():
+        base = base_model_name(capability.name)
+        current = chosen.get(base)
+        if current is None or (capability.pinned, capability.name) > (current.pinned, current.name):
+            chosen[base] = capability
+    return {capability.name: capability for capability in chosen.values()}
+
+
+@dataclass
+class ModelHealth:
+    """모델별 관측 통계 (latency EWMA, 오류율 EWMA, 연속 오류, 제외 기한)"""
+
+    latency_ms: Optional[float] = None
+    error_rate: float = 0.0
+    calls: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    consecutive_errors: int = 0
+    cooldown_until: float = 0.0
+
+
+class NoModelAvailable(RuntimeError):
+    pass
+
+
+class LLMRouter:
+    """task → 후보 모델 순위 + 호출 결과 기록 + 실패 시 다음 후보로 failover"""
+
+    def __init__(
+        self,
+        capabilities: Optional[dict[str, ModelCapability]] = None,
+        profiles: Optional[dict[str, TaskProfile]] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capabilities = load_capabilities() if capabilities is None else capabilities
+        self.profiles = dict(TASK_PROFILES if profiles is None else profiles)
+        self._scheduler = scheduler
+        self._clock = clock
+        self._health: dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def scheduler(self) -> LLMScheduler:
+        return self._scheduler or get_llm_scheduler()
+
+    def health(self, model: str) -> ModelHealth:
+        with self._lock:
+            return self._health.setdefault(model, ModelHealth())
+
+    def profile(self, task: str) -> TaskProfile:
+        try:
+            return self.profiles[task]
+        except KeyError:
+            raise ValueError(f"알 수 없는 task 입니다: {task}") from None
+
+    def _latency(self, capability: ModelCapability) -> float:
+        health = self._health.get(capability.name)
+        if health is None or health.latency_ms is None:
+            return capability.latency_prior_ms
+        # 오류가 잦은 모델은 재시도 비용만큼 느린 것으로 본다
+        return health.latency_ms / max(0.1, 1 - health.error_rate)
+
+    def candidates(
+        self,
+        task: str,
+        input_tokens: int = 0,
+        output_tokens: Optional[int] = None,
+        vision: Optional[bool] = None,
+        include_cooling: bool = False,
+    ) -> list[ModelCapability]:
+        """조건(입력 종류, 토큰 한도, 최소 품질)을 만족하는 모델을 목표 값 순으로"""
+        profile = self.profile(task)
+        output_tokens = profile.output_tokens if output_tokens is None else output_tokens
+        vision = profile.vision if vision is None else vision
+        now = self._clock()
+        eligible = []
+        for capability in self.capabilities.values():
+            if (
+                capability.quality < profile.min_quality
+                or (vision and not capability.vision)
+                or (capability.preview and not profile.allow_preview)
+                or input_tokens > capability.input_token_limit
+                or output_tokens > capability.output_token_limit
+            ):
+                continue
+            health = self._health.get(capability.name)
+            if not include_cooling and health is not None and health.cooldown_until > now:
+                continue
+            eligible.append(capability)
+
+        def key(capability: ModelCapability) -> tuple:
+            cost = round(capability.cost(input_tokens, output_tokens), 9)
+            latency = round(self._latency(capability))
+            primary = (latency, cost) if profile.objective == "latency" else (cost, latency)
+            return (*primary, -capability.quality, not capability.pinned, capability.name)
+
+        return sorted(eligible, key=key)
+
+    def select(self, task: str, input_tokens: int = 0, **kwargs: Any) -> ModelCapability:
+        candidates = self.candidates(task, input_tokens, **kwargs)
+        if not candidates:
+            # 모두 제외 중이면 제외 기한과 무관하게 가장 나은 모델
+            candidates = self.candidates(task, input_tokens, include_cooling=True, **kwargs)
+        if not candidates:
+            raise NoModelAvailable(f"{task}: 조건을 만족하는 모델이 없습니다 (입력 {input_tokens} tokens).")
+        return candidates[0]
+
+    def plan(self, task: str, input_tokens: int = 0, max_models: int = 3, **kwargs: Any) -> list[str]:
+        """failover 순서 (제외 중인 모델은 뒤로, 같은 기본 모델의 alias 는 quota 를 공유하므로 한 번만)"""
+        ordered = [c.name for c in self.candidates(task, input_tokens, **kwargs)]
+        cooling = [c.name for c in self.candidates(task, input_tokens, include_cooling=True, **kwargs) if c.name not in ordered]
+        models, bases = [], set()
+        for model in ordered + cooling:
+            if base_model_name(model) not in bases and len(models) < max_models:
+                bases.add(base_model_name(model))
+                models.append(model)
+        if not models:
+            raise NoModelAvailable(f"{task}: 조건을 만족하는 모델이 없습니다 (입력 {input_tokens} tokens).")
+        return models
+
+    def record_success(self, model: str, latency_ms: float) -> None:
+        health = self.health(model)
+        with self._lock:
+            health.calls += 1
+            health.consecutive_errors = 0
+            health.error_rate *= 1 - LATENCY_EWMA_ALPHA
+            if health.latency_ms is None:
+                health.latency_ms = latency_ms
+            else:
+                health.latency_ms += LATENCY_EWMA_ALPHA * (latency_ms - health.latency_ms)
+
+    def record_error(self, model: str, error: BaseException) -> None:
+        health = self.health(model)
+        with self._lock:
+            health.calls += 1
+            health.errors += 1
+            health.consecutive_errors += 1
+            health.error_rate += LATENCY_EWMA_ALPHA * (1 - health.error_rate)
+            if is_rate_limit_error(error):
+                health.rate_limited += 1
+                cooldown = backoff_delay(min(health.rate_limited, 6) - 1, cap=BACKOFF_CAP)
+            elif health.consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+                cooldown = ERROR_COOLDOWN
+            else:
+                return
+            health.cooldown_until = max(health.cooldown_until, self._clock() + cooldown)
+
+    async def run(
+        self,
+        task: str,
+        call: Callable[[str], Awaitable[T]],
+        input_tokens: int,
+        priority: Optional[Priority] = None,
+        max_models: int = 3,
+        **kwargs: Any,
+    ) -> T:
+        """
+        call(model) 을 후보 순서대로 실행, 실패하면 다음 모델로 failover (모두 실패하면 마지막 오류 raise)
+        각 모델 호출은 scheduler 한도를 따르고 재시도 대신 다음 모델로 넘긴다
+        """
+        profile = self.profile(task)
+        priority = profile.priority if priority is None else priority
+        tokens = input_tokens + (kwargs.get("output_tokens") or profile.output_tokens)
+        error: Optional[BaseException] = None
+        for model in self.plan(task, input_tokens, max_models, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await self.scheduler.run(model, lambda: call(model), tokens, priority, max_retries=0)
+            except Exception as e:
+                self.record_error(model, e)
+                error = e
+                continue
+            self.record_success(model, (time.perf_counter() - start) * 1000)
+            return result
+        raise error
+
+    def run_sync(
+        self,
+        task: str,
+        call: Callable[[str], T],
+        input_tokens: int,
+        priority: Optional[Priority] = None,
+        max_models: int = 3,
+        **kwargs: Any,
+    ) -> T:
+        profile = self.profile(task)
+        priority = profile.priority if priority is None else priority
+        tokens = input_tokens + (kwargs.get("output_tokens") or profile.output_tokens)
+        error: Optional[BaseException] = None
+        for model in self.plan(task, input_tokens, max_models, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = self.scheduler.run_sync(model, lambda: call(model), tokens, priority, max_retries=0)
+            except Exception as e:
+                self.record_error(model, e)
+                error = e
+                continue
+            self.record_success(model, (time.perf_counter() - start) * 1000)
+            return result
+        raise error
+
+    def stats(self) -> dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            return {
+                model: {
+                    "latency_ms": None if h.latency_ms is None else round(h.latency_ms, 1),
+                    "error_rate": round(h.error_rate, 3),
+                    "calls": h.calls,
+                    "errors": h.errors,
+                    "rate_limited": h.rate_limited,
+                    "cooling": h.cooldown_until > now,
+                }
+                for model, h in self._health.items()
+            }
+
+
+_router: Optional[LLMRouter] = None
+
+
+def get_llm_router() -> LLMRouter:
+    global _router
+    if _router is None:
+        _router = LLMRouter()
+    return _router
+
+
+def set_llm_router(router: Optional[LLMRouter]) -> None:
+    global _router
+    _router = router
+
+
+# --- chain 에 끼우는 Runnable ---
+
+class RoutedRunnable(Runnable):
+    """
+    task 에 맞는 모델을 골라 호출하는 chat model 자리의 Runnable (model_factory(model 이름) → chat model)
+    invoke / ainvoke 는 실패 시 다음 모델로 failover, astream 은 첫 chunk 전 실패만 failover 하고 첫 chunk 까지 시간을 latency 로 기록
+    """
+
+    def __init__(
+        self,
+        task: str,
+        model_factory: Callable[[str], Runnable],
+        priority: Optional[Priority] = None,
+        max_models: int = 3,
+        router: Optional[LLMRouter] = None,
+    ):
+        self.task = task
+        self.model_factory = model_factory
+        self.priority = priority
+        self.max_models = max_models
+        self._router = router
+
+    @property
+    def router(self) -> LLMRouter:
+        return self._router or get_llm_router()
+
+    def _input_tokens(self, input: Any) -> int:
+        return estimate_tokens(input, output_tokens=0)
+
+    def _vision(self, input: Any) -> bool:
+        # 이미지가 없는 요청이면 텍스트 전용 모델도 후보 (profile 이 vision 이어도)
+        return _has_image(input)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.router.run_sync(
+            self.task, lambda model: self.model_factory(model).invoke(input, config, **kwargs),
+            self._input_tokens(input), self.priority, self.max_models, vision=self._vision(input),
+        )
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.router.run(
+            self.task, lambda model: self.model_factory(model).ainvoke(input, config, **kwargs),
+            self._input_tokens(input), self.priority, self.max_models, vision=self._vision(input),
+        )
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield self.invoke(input, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        router = self.router
+        profile = router.profile(self.task)
+        priority = profile.priority if self.priority is None else self.priority
+        input_tokens = self._input_tokens(input)
+        tokens = input_tokens + profile.output_tokens
+        models = router.plan(self.task, input_tokens, self.max_models, vision=self._vision(input))
+        scheduler = router.scheduler
+        for i, model in enumerate(models):
+            reserved = await scheduler.acquire(model, tokens, priority)
+            start, used, started = time.perf_counter(), 0, False
+            try:
+                async for chunk in self.model_factory(model).astream(input, config, **kwargs):
+                    if not started:
+                        started = True
+                        router.record_success(model, (time.perf_counter() - start) * 1000)
+                    used += usage_tokens(chunk) or 0
+                    yield chunk
+            except Exception as e:
+                scheduler.settle(model, reserved, used or (reserved if started else 0))
+                if started:
+                    raise
+                router.record_error(model, e)
+                if i == len(models) - 1:
+                    raise
+                continue
+            scheduler.settle(model, reserved, used or reserved)
+            return
+
+
+def _has_image(value: Any) -> bool:
+    """프롬프트(PromptValue / 메시지 리스트)에 image_url part 가 있는지"""
+    if hasattr(value, "to_messages"):
+        value = value.to_messages()
+    for message in value if isinstance(value, (list, tuple)) else [value]:
+        content = getattr(message, "content", None)
+        if isinstance(content, list) and any(isinstance(p, dict) and p.get("type") == "image_url" for p in content):
+            return True
+    return False
+
+
+def routed(
+    task: str,
+    model_factory: Callable[[str], Runnable],
+    priority: Optional[Priority] = None,
+    **kwargs: Any,
+) -> RoutedRunnable:
+    return RoutedRunnable(task, model_factory, priority, **kwargs)
+
+
+if __name__ == "__main__":
+    # 현재 gemini_models.json 기준 task 별 failover 순서 + 첫 모델이 429 를 낼 때의 전환 확인
+    from .llm_scheduler import FakeRateLimitError
+
+    router = LLMRouter(scheduler=LLMScheduler())
+    print(f"생성 모델 {len(router.capabilities)}개 (gemini_models.json)\n")
+    print(f"{'task':>20} {'objective':>9}  failover 순서 (요청당 USD)")
+    for task, profile in router.profiles.items():
+        input_tokens = 3000 if profile.vision else 800
+        models = router.candidates(task, input_tokens)[:3]
+        plan = ", ".join(f"{m.name} (${m.cost(input_tokens, profile.output_tokens):.5f})" for m in models)
+        print(f"{task:>20} {profile.objective:>9}  {plan}")
+
+    async def demo() -> None:
+        throttled = router.select("ocr", 3000).name
+
+        async def call(model: str) -> str:
+            await asyncio.sleep(0.01)
+            if model == throttled:
+                raise FakeRateLimitError("429 Resource has been exhausted")
+            return model
+
+        served = [await router.run("ocr", call, 3000) for _ in range(5)]
+        print(f"\n{throttled} 가 429 → 처리한 모델 {served}")
+        print(json.dumps(router.stats(), ensure_ascii=False, indent=2))
+
+    asyncio.run(demo())
@@ -0,0 +1,576 @@
+"""
+모든 LLM 호출 지점(select_final_item_node, caption 배치, OCR / 색상 표준화 스크립트)이 공유하는 rate limit scheduler
+
+- 모델별 RPM / TPM token bucket. 한도는 config(LLM_RATE_LIMITS_PATH) 에서, 모델 목록과 요청당 토큰 한도는 gemini_models.json 에서 읽는다
+- 우선순위: INTERACTIVE(websocket 응답) 요청이 대기 중이면 BATCH(카탈로그 캡셔닝 등) 요청은 기다리고,
+  BATCH 는 버킷 용량의 일부(interactive_reserve)를 남겨 두어 interactive 요청이 바로 통과할 수 있게 한다
+- 429 를 받으면 해당 모델 버킷 전체를 잠시 멈추고(jitter 포함 backoff) 재시도하므로 재시도가 한꺼번에 몰리지 않는다
+- 재시도는 429 / timeout / 5xx 같은 일시적 오류만. 400 / 검증 / 인증 오류는 바로 raise 하고,
+  INTERACTIVE 요청은 사용자가 기다리므로 재시도 횟수와 backoff 를 짧게 잡는다
+- 한도는 프로세스 단위이므로 웹 서버와 배치 작업이 같은 quota 를 쓰면 config 에서 나눠 준다
+
+    chain = prompt | scheduled(get_chat_model(model), model, Priority.INTERACTIVE)
+    message = await get_llm_scheduler().run(model, lambda: chain.ainvoke(inputs), tokens, Priority.BATCH)
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from enum import IntEnum
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+T = TypeVar("T")
+
+GEMINI_MODELS_PATH = Path(__file__).resolve().parents[2] / "gemini_models.json"
+# {"default": {"rpm": 1000, "tpm": 1000000}, "models": {"gemini-2.0-flash-001": {"rpm": 2000, "tpm": 4000000}}}
+LLM_RATE_LIMITS_PATH = os.getenv("LLM_RATE_LIMITS_PATH")
+LLM_DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "1000"))
+LLM_DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "1000000"))
+
+# 토큰 추정 (한/영 혼합 기준 대략치, 응답 후 usage_metadata 로 정산)
+CHARS_PER_TOKEN = 3
+IMAGE_TOKEN_ESTIMATE = 1032
+OUTPUT_TOKEN_ESTIMATE = 1024
+
+# 대기 중인 앞 순서 요청이 있을 때 다시 확인하는 간격 (초)
+POLL_INTERVAL = 0.05
+BACKOFF_CAP = 60.0
+# INTERACTIVE 요청의 재시도 한도 (max_retries 보다 작으면 이 값 사용) 와 backoff (초)
+INTERACTIVE_MAX_RETRIES = 1
+INTERACTIVE_BACKOFF_BASE = 0.25
+INTERACTIVE_BACKOFF_CAP = 2.0
+
+# 재시도하면 성공할 수 있는 provider 오류 (OpenAI / Google api_core / httpx 의 timeout, 연결, 5xx 예외 이름)
+TRANSIENT_ERROR_NAMES = (
+    "APITimeoutError", "APIConnectionError", "InternalServerError", "ServiceUnavailable",
+    "BadGateway", "GatewayTimeout", "DeadlineExceeded", "ServerError",
+    "TimeoutException", "ReadTimeout", "ConnectTimeout", "ConnectError", "RemoteProtocolError",
+)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # websocket 사용자 응답
+    BATCH = 1        # 카탈로그 캡셔닝, 색상 표준화 등 오프라인 작업
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    rpm: int
+    tpm: int
+    # gemini_models.json 의 요청당 한도 (선점 토큰 상한)
+    input_token_limit: Optional[int] = None
+    output_token_limit: Optional[int] = None
+
+    @property
+    def max_request_tokens(self) -> Optional[int]:
+        if self.input_token_limit is None:
+            return None
+        return self.input_token_limit + (self.output_token_limit or 0)
+
+
+def normalize_model_name(model: str) -> str:
+    """"models/gemini-2.0-flash-001" → "gemini-2.0-flash-001\""""
+    return model.split("/")[-1]
+
+
+def base_model_name(model: str) -> str:
+    """
+    버전 고정 / alias 이름을 뗀 기본 모델 ("gemini-2.0-flash-001", "gemini-2.0-flash" → "gemini-2.0-flash")
+    alias 와 고정 버전은 같은 quota 를 쓰므로 rate limit bucket / failover 는 이 이름 단위
+    """
+    return re.sub(r"-(\d{3}|latest)$", "", normalize_model_name(model))
+
+
+def load_model_limits(
+    models_path: Optional[os.PathLike] = GEMINI_MODELS_PATH,
+    config_path: Optional[os.PathLike] = LLM_RATE_LIMITS_PATH,
+) -> tuple[ModelLimits, dict[str, ModelLimits]]:
+    """
+    (기본 한도, 모델별 한도)
+    gemini_models.json 의 모델마다 요청당 토큰 한도를 채우고, RPM / TPM 은 config 의 모델별 값 → 기본값 순으로 사용
+    """
+    config: dict[str, Any] = {}
+    if config_path and os.path.exists(config_path):
+        with open(config_path, encoding="utf-8") as f:
+            config = json.load(f)
+    default_config = config.get("default", {})
+    default = ModelLimits(
+        rpm=int(default_config.get("rpm", LLM_DEFAULT_RPM)),
+        tpm=int(default_config.get("tpm", LLM_DEFAULT_TPM)),
+    )
+
+    limits: dict[str, ModelLimits] = {}
+    if models_path and os.path.exists(models_path):
+        with open(models_path, encoding="utf-8") as f:
+            models = json.load(f).get("full_response", {}).get("models", [])
+        for model in models:
+            limits[normalize_model_name(model["name"])] = replace(
+                default,
+                input_token_limit=model.get("inputTokenLimit"),
+                output_token_limit=model.get("outputTokenLimit"),
+            )
+    for name, values in config.get("models", {}).items():
+        name = normalize_model_name(name)
+        base = limits.get(name, default)
+        limits[name] = replace(base, rpm=int(values.get("rpm", base.rpm)), tpm=int(values.get("tpm", base.tpm)))
+    return default, limits
+
+
+# --- 1. Token bucket ---
+
+class TokenBucket:
+    """
+    요청 수(RPM) / 토큰 수(TPM) token bucket + 우선순위 대기열 (thread-safe, sync / async 호출 모두 지원)
+    요청 전 추정 토큰을 선점하고, 응답 후 실제 usage 로 차액을 정산한다
+    burst 는 burst_seconds 분량으로 제한하여 임의의 60초 구간에서도 한도를 거의 넘지 않게 한다
+    """
+
+    def __init__(
+        self,
+        limits: ModelLimits,
+        burst_seconds: float = 1.0,
+        interactive_reserve: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.burst_seconds = burst_seconds
+        self.interactive_reserve = interactive_reserve
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._set_limits(limits)
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        # 우선순위별 대기 순서 (같은 우선순위에서는 먼저 온 요청이 먼저 통과, 큰 요청이 계속 밀리지 않게)
+        self._waiting = [deque() for _ in Priority]
+        self._tickets = 0
+        self.rate_limited = 0
+
+    def _set_limits(self, limits: ModelLimits) -> None:
+        self.limits = limits
+        self._request_capacity = max(1.0, limits.rpm * self.burst_seconds / 60)
+        self._token_capacity = limits.tpm * self.burst_seconds / 60
+
+    def set_limits(self, limits: ModelLimits) -> None:
+        with self._lock:
+            self._refill(self._clock())
+            self._set_limits(limits)
+            self._requests = min(self._requests, self._request_capacity)
+            self._tokens = min(self._tokens, self._token_capacity)
+
+    def _refill(self, now: float) -> None:
+        elapsed, self._updated = max(0.0, now - self._updated), now
+        self._requests = min(self._request_capacity, self._requests + elapsed * self.limits.rpm / 60)
+        self._tokens = min(self._token_capacity, self._tokens + elapsed * self.limits.tpm / 60)
+
+    def _enqueue(self, priority: Priority) -> int:
+        with self._lock:
+            self._tickets += 1
+            self._waiting[priority].append(self._tickets)
+            return self._tickets
+
+    def _cancel(self, ticket: int, priority: Priority) -> None:
+        with self._lock:
+            try:
+                self._waiting[priority].remove(ticket)
+            except ValueError:
+                pass
+
+    def _try_acquire(self, ticket: int, priority: Priority, tokens: int) -> float:
+        """통과하면 0, 아니면 다시 시도할 때까지 기다릴 시간(초)"""
+        with self._lock:
+            if any(self._waiting[p] for p in range(priority)) or self._waiting[priority][0] != ticket:
+                return POLL_INTERVAL
+            now = self._clock()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            # 버킷 용량보다 큰 요청은 버킷이 (예약분 제외하고) 가득 찼을 때 통과시키고 잔량을 음수(부채)로 남긴다
+            reserve = 0.0 if priority == Priority.INTERACTIVE else self.interactive_reserve
+            need_requests = min(self._request_capacity, 1 + reserve * self._request_capacity)
+            need_tokens = min(self._token_capacity, tokens + reserve * self._token_capacity)
+            if self._requests >= need_requests and self._tokens >= need_tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                self._waiting[priority].popleft()
+                return 0.0
+            return max(
+                (need_requests - self._requests) * 60 / self.limits.rpm,
+                (need_tokens - self._tokens) * 60 / self.limits.tpm,
+                0.001,
+            )
+
+    async def acquire(self, tokens: int, priority: Priority = Priority.BATCH) -> None:
+        ticket = self._enqueue(priority)
+        try:
+            while (wait := self._try_acquire(ticket, priority, tokens)) > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._cancel(ticket, priority)
+            raise
+
+    def acquire_sync(self, tokens: int, priority: Priority = Priority.BATCH) -> None:
+        ticket = self._enqueue(priority)
+        try:
+            while (wait := self._try_acquire(ticket, priority, tokens)) > 0:
+                time.sleep(wait)
+        except BaseException:
+            self._cancel(ticket, priority)
+            raise
+
+    def settle(self, reserved: int, actual: int) -> None:
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self._token_capacity, self._tokens + reserved - actual)
+
+    def pause(self, seconds: float) -> None:
+        """provider 가 429 를 돌려주면 버킷 전체를 잠시 멈춤 (다른 요청도 같이 물러남)"""
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            self._refill(self._clock())
+            return {
+                "rpm": self.limits.rpm,
+                "tpm": self.limits.tpm,
+                "requests_available": round(self._requests, 2),
+                "tokens_available": round(self._tokens),
+                "waiting": {p.name.lower(): len(self._waiting[p]) for p in Priority},
+                "rate_limited": self.rate_limited,
+            }
+
+
+# --- 2. Scheduler ---
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """provider 의 429 / quota 초과 오류 (OpenAI RateLimitError, Google ResourceExhausted 등)"""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    name = type(error).__name__
+    return name in ("RateLimitError", "ResourceExhausted", "TooManyRequests", "FakeRateLimitError") or "429" in str(error)
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """재시도할 만한 오류: 429, timeout, 연결 끊김, 5xx (400 / 검증 / 인증 오류는 다시 보내도 같은 결과)"""
+    if is_rate_limit_error(error) or isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    for status in (getattr(error, "status_code", None), getattr(error, "code", None), getattr(response, "status_code", None)):
+        if isinstance(status, int) and 500 <= status < 600:
+            return True
+    return type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = BACKOFF_CAP) -> float:
+    """지수 backoff + jitter (동시에 실패한 요청들이 같은 시점에 다시 몰리지 않게)"""
+    return min(cap, base * 2 ** attempt) * (1 + random.random())
+
+
+def usage_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    if isinstance(usage, dict) and "total_tokens" in usage:
+        return int(usage["total_tokens"])
+    return None
+
+
+def estimate_tokens(value: Any, output_tokens: int = OUTPUT_TOKEN_ESTIMATE) -> int:
+    """프롬프트(PromptValue / 메시지 리스트 / 문자열) 토큰 추정 + 출력 토큰 추정치"""
+    if hasattr(value, "to_messages"):
+        value = value.to_messages()
+    if isinstance(value, BaseMessage):
+        value = [value]
+    if isinstance(value, str):
+        value = [value]
+    chars, images = 0, 0
+    for message in value if isinstance(value, (list, tuple)) else [value]:
+        content = message.content if isinstance(message, BaseMessage) else message
+        for part in content if isinstance(content, list) else [content]:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                images += 1
+            elif isinstance(part, dict):
+                chars += len(str(part.get("text", "")))
+            else:
+                chars += len(str(part))
+    return math.ceil(chars / CHARS_PER_TOKEN) + images * IMAGE_TOKEN_ESTIMATE + output_tokens
+
+
+class LLMScheduler:
+    """모델별 TokenBucket 묶음 + 재시도 / 정산을 포함한 호출 helper"""
+
+    def __init__(
+        self,
+        default_limits: Optional[ModelLimits] = None,
+        limits: Optional[dict[str, ModelLimits]] = None,
+        burst_seconds: float = 1.0,
+        interactive_reserve: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if default_limits is None and limits is None:
+            default_limits, limits = load_model_limits()
+        self.default_limits = default_limits or ModelLimits(LLM_DEFAULT_RPM, LLM_DEFAULT_TPM)
+        self._limits = dict(limits or {})
+        self._burst_seconds = burst_seconds
+        self._interactive_reserve = interactive_reserve
+        self._clock = clock
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def limits_for(self, model: str) -> ModelLimits:
+        name = normalize_model_name(model)
+        return self._limits.get(name) or self._limits.get(base_model_name(name)) or self.default_limits
+
+    def bucket(self, model: str) -> TokenBucket:
+        """기본 모델(base_model_name) 별 bucket — alias 와 고정 버전이 같은 quota 를 나눠 쓴다"""
+        name = base_model_name(model)
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(name)
+                if bucket is None:
+                    bucket = self._buckets[name] = TokenBucket(
+                        self.limits_for(model), self._burst_seconds, self._interactive_reserve, self._clock,
+                    )
+        return bucket
+
+    def set_limits(self, model: str, rpm: Optional[int] = None, tpm: Optional[int] = None) -> ModelLimits:
+        """실행 중 한도 변경 (CLI 옵션 등, 같은 기본 모델의 alias 에도 적용)"""
+        limits = self.limits_for(model)
+        limits = replace(limits, rpm=rpm or limits.rpm, tpm=tpm or limits.tpm)
+        self._limits[normalize_model_name(model)] = self._limits[base_model_name(model)] = limits
+        self.bucket(model).set_limits(limits)
+        return limits
+
+    def _reserve(self, model: str, tokens: int) -> int:
+        max_tokens = self.limits_for(model).max_request_tokens
+        return min(tokens, max_tokens) if max_tokens else tokens
+
+    async def acquire(self, model: str, tokens: int, priority: Priority = Priority.BATCH) -> int:
+        """선점한 토큰 수 반환 (응답 후 settle 로 정산)"""
+        tokens = self._reserve(model, tokens)
+        await self.bucket(model).acquire(tokens, priority)
+        return tokens
+
+    def acquire_sync(self, model: str, tokens: int, priority: Priority = Priority.BATCH) -> int:
+        tokens = self._reserve(model, tokens)
+        self.bucket(model).acquire_sync(tokens, priority)
+        return tokens
+
+    def settle(self, model: str, reserved: int, actual: int) -> None:
+        self.bucket(model).settle(reserved, actual)
+
+    def _failed(
+        self,
+        model: str,
+        reserved: int,
+        error: BaseException,
+        attempt: int,
+        max_retries: int,
+        priority: Priority = Priority.BATCH,
+    ) -> float:
+        """
+        실패한 요청은 토큰을 소비하지 않은 것으로 보고 반환, 재시도할 경우 기다릴 시간
+        일시적 오류가 아니거나 재시도 한도(INTERACTIVE 는 INTERACTIVE_MAX_RETRIES)를 넘으면 그대로 raise
+        """
+        self.settle(model, reserved, 0)
+        if priority == Priority.INTERACTIVE:
+            max_retries = min(max_retries, INTERACTIVE_MAX_RETRIES)
+        if attempt >= max_retries or not is_transient_error(error):
+            raise error
+        if priority == Priority.INTERACTIVE:
+            delay = backoff_delay(attempt, INTERACTIVE_BACKOFF_BASE, INTERACTIVE_BACKOFF_CAP)
+        else:
+            delay = backoff_delay(attempt)
+        if is_rate_limit_error(error):
+            self.bucket(model).pause(delay)
+        return delay
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        tokens: int,
+        priority: Priority = Priority.BATCH,
+        max_retries: int = 3,
+    ) -> T:
+        """한도 안에서 call 실행 (일시적 오류는 jitter backoff 후 재시도, 그 밖의 오류와 마지막 실패는 그대로 raise)"""
+        for attempt in range(max_retries + 1):
+            reserved = await self.acquire(model, tokens, priority)
+            try:
+                result = await call()
+            except Exception as e:
+                await asyncio.sleep(self._failed(model, reserved, e, attempt, max_retries, priority))
+                continue
+            actual = usage_tokens(result)
+            self.settle(model, reserved, reserved if actual is None else actual)
+            return result
+        raise AssertionError("unreachable")
+
+    def run_sync(
+        self,
+        model: str,
+        call: Callable[[], T],
+        tokens: int,
+        priority: Priority = Priority.BATCH,
+        max_retries: int = 3,
+    ) -> T:
+        for attempt in range(max_retries + 1):
+            reserved = self.acquire_sync(model, tokens, priority)
+            try:
+                result = call()
+            except Exception as e:
+                time.sleep(self._failed(model, reserved, e, attempt, max_retries, priority))
+                continue
+            actual = usage_tokens(result)
+            self.settle(model, reserved, reserved if actual is None else actual)
+            return result
+        raise AssertionError("unreachable")
+
+    def stats(self) -> dict[str, Any]:
+        return {name: bucket.stats() for name, bucket in list(self._buckets.items())}
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def set_llm_scheduler(scheduler: Optional[LLMScheduler]) -> None:
+    global _scheduler
+    _scheduler = scheduler
+
+
+# --- 3. chain 에 끼우는 Runnable ---
+
+class ScheduledRunnable(Runnable):
+    """
+    chat model(또는 임의의 Runnable) 호출을 scheduler 를 거치게 하는 wrapper
+    invoke / ainvoke 는 재시도까지, astream 은 첫 chunk 전 실패만 재시도하고 스트림 usage 로 정산
+    """
+
+    def __init__(
+        self,
+        bound: Runnable,
+        model: str,
+        priority: Priority = Priority.BATCH,
+        output_tokens: int = OUTPUT_TOKEN_ESTIMATE,
+        max_retries: int = 3,
+        scheduler: Optional[LLMScheduler] = None,
+    ):
+        self.bound = bound
+        self.model = normalize_model_name(model)
+        self.priority = priority
+        self.output_tokens = output_tokens
+        self.max_retries = max_retries
+        self._scheduler = scheduler
+
+    @property
+    def scheduler(self) -> LLMScheduler:
+        return self._scheduler or get_llm_scheduler()
+
+    @property
+    def InputType(self) -> Any:
+        return self.bound.InputType
+
+    @property
+    def OutputType(self) -> Any:
+        return self.bound.OutputType
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.scheduler.run_sync(
+            self.model, lambda: self.bound.invoke(input, config, **kwargs),
+            estimate_tokens(input, self.output_tokens), self.priority, self.max_retries,
+        )
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.scheduler.run(
+            self.model, lambda: self.bound.ainvoke(input, config, **kwargs),
+            estimate_tokens(input, self.output_tokens), self.priority, self.max_retries,
+        )
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield self.invoke(input, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        scheduler = self.scheduler
+        tokens = estimate_tokens(input, self.output_tokens)
+        for attempt in range(self.max_retries + 1):
+            reserved = await scheduler.acquire(self.model, tokens, self.priority)
+            used, started = 0, False
+            try:
+                async for chunk in self.bound.astream(input, config, **kwargs):
+                    started = True
+                    used += usage_tokens(chunk) or 0
+                    yield chunk
+            except Exception as e:
+                if started:
+                    scheduler.settle(self.model, reserved, used or reserved)
+                    raise
+                await asyncio.sleep(scheduler._failed(self.model, reserved, e, attempt, self.max_retries, self.priority))
+                continue
+            scheduler.settle(self.model, reserved, used or reserved)
+            return
+
+
+def scheduled(bound: Runnable, model: str, priority: Priority = Priority.BATCH, **kwargs: Any) -> ScheduledRunnable:
+    return ScheduledRunnable(bound, model, priority, **kwargs)
+
+
+# --- 4. 로컬 fake provider (포화 / 429 동작 확인용) ---
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+@dataclass
+class FakeProvider:
+    """
+    provider 쪽 RPM / TPM 한도를 sliding window 로 흉내 내는 fake chat provider
+    한도를 넘는 요청은 FakeRateLimitError(429) 로 거절 (거절된 요청도 RPM 에는 포함)
+    """
+
+    rpm: int
+    tpm: int
+    latency: float = 0.2
+    window: float = 60.0
+    clock: Callable[[], float] = time.monotonic
+    accepted: int = 0
+    rejected: int = 0
+    _log: deque = field(default_factory=deque)
+
+    def _admit(self, tokens: int) -> bool:
+        now = self.clock()
+        while self._log and now - self._log[0][0] > self.window:
+            self._log.popleft()
+        scale = self.window / 60
+        requests = len(self._log) + 1
+        used = sum(t for _, t, ok in self._log if ok) + tokens
+        self._log.append((now, tokens, requests <= self.rpm * scale and used <= self.tpm * scale))
+        return self._log[-1][2]
+
+    async def call(self, tokens: int, output_tokens: int = 200) -> AIMessage:
+        if not self._admit(tokens):
+            self.rejected += 1
+            raise FakeRateLimitError("429 Resource has been exhausted (fake provider)")
+        self.accepted += 1
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        return AIMessage(
+            content="ok",
+            usage_metadata={"input_tokens": tokens - output_tokens, "output_tokens": output_tokens, "total_tokens": tokens},
+        )
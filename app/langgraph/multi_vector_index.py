@@ -0,0 +1,325 @@
+import numpy as np
+from typing import Any, Iterable
+
+from .vector_index import ChangeLog, normalize_rows, top_k_indices
+
+# caption/image_caption.py::EmbeddingCaptions 의 필드 (상품당 필드별 벡터 1개)
+EMBEDDING_CAPTION_FIELDS = (
+    "clip_text_front",
+    "design_details_description",
+    "style_vibe_description",
+    "tpo_context_description",
+    "comprehensive_description",
+)
+
+DEFAULT_FIELD_WEIGHTS = {
+    "clip_text_front": 0.5,
+    "design_details_description": 1.0,
+    "style_vibe_description": 1.0,
+    "tpo_context_description": 1.0,
+    "comprehensive_description": 1.5,
+}
+
+# reciprocal rank fusion 상수 (score = Σ w / (RRF_K + rank))
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    ranked_rows: list[np.ndarray],
+    weights: list[float] | None = None,
+    rrf_k: int = RRF_K,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    여러 순위 리스트(row index 배열, 1위부터)를 RRF 로 결합
+
+    Returns:
+        (row index 배열, fused score 배열) — 전체 row 의 합집합, 순서 없음
+    """
+    weights = weights if weights is not None else [1.0] * len(ranked_rows)
+    rows = np.concatenate(ranked_rows)
+    contributions = np.concatenate(
+        [weight / (rrf_k + 1 + np.arange(len(ranked), dtype=np.float32)) for ranked, weight in zip(ranked_rows, weights)]
+    )
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    return unique_rows, np.bincount(inverse, weights=contributions).astype(np.float32)
+
+
+class MultiVectorIndex:
+    """
+    상품당 캡션 필드별 벡터를 하나의 (N x F x d) float32 행렬에 보관하는 multi-vector 인덱스
+
+    - 필드별로 인덱스를 따로 두지 않고 한 행렬에 모아, 쿼리 1개에 대한 모든 필드 점수를
+      (N*F x d) @ (d) 행렬-벡터 곱 한 번으로 계산
+    - 필드 점수 결합
+        - "weighted": 필드 가중치 가중합 (캡션이 없는 필드는 제외하고 가중치 재정규화)
+        - "rrf": 필드별 상위 후보의 순위로 reciprocal rank fusion
+    - 검색 결과에 필드별 점수("field_scores")를 포함하여 reranker 가 다시 계산하지 않도록 함
+    - add / remove 는 VectorIndex 와 동일하게 capacity 2배 확장 / swap-remove
+    """
+
+    def __init__(self, dim: int, fields: Iterable[str] = EMBEDDING_CAPTION_FIELDS, initial_capacity: int = 1024):
+        self.dim = dim
+        self.fields = tuple(fields)
+        capacity = max(initial_capacity, 1)
+        self._vectors = np.zeros((capacity, len(self.fields), dim), dtype=np.float32)
+        # 필드별 캡션 존재 여부 (없는 필드는 0 벡터)
+        self._present = np.zeros((capacity, len(self.fields)), dtype=bool)
+        self._ids: list[str] = []
+        self._metadata: list[dict[str, Any]] = []
+        self._id_to_row: dict[str, int] = {}
+        self.changes = ChangeLog()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._id_to_row
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """현재 유효한 (N x F x d) 벡터 view"""
+        return self._vectors[: len(self._ids)]
+
+    @property
+    def ids(self) -> list[str]:
+        return self._ids
+
+    def _ensure_capacity(self, required: int) -> None:
+        capacity = self._vectors.shape[0]
+        if required <= capacity:
+            return
+        new_capacity = max(required, capacity * 2)
+        vectors = np.zeros((new_capacity, len(self.fields), self.dim), dtype=np.float32)
+        present = np.zeros((new_capacity, len(self.fields)), dtype=bool)
+        vectors[: len(self._ids)] = self._vectors[: len(self._ids)]
+        present[: len(self._ids)] = self._present[: len(self._ids)]
+        self._vectors, self._present = vectors, present
+
+    def add(
+        self,
+        product_ids: Iterable[str],
+        field_vectors: dict[str, np.ndarray],
+        metadata: Iterable[dict[str, Any]] | None = None,
+    ) -> None:
+        """
+        필드별 벡터 추가. 이미 존재하는 product_id 는 덮어씀
+
+        Args:
+            field_vectors: {필드 이름: (n x d) 벡터}. 일부 필드만 있어도 되며, 행이 모두 0 이면 해당 필드 없음으로 처리
+        """
+        product_ids = list(product_ids)
+        unknown = set(field_vectors) - set(self.fields)
+        if unknown:
+            raise ValueError(f"인덱스에 없는 필드입니다: {sorted(unknown)}")
+        stacked = np.zeros((len(product_ids), len(self.fields), self.dim), dtype=np.float32)
+        for j, field in enumerate(self.fields):
+            if field not in field_vectors:
+                continue
+            vectors = np.asarray(field_vectors[field], dtype=np.float32)
+            if vectors.shape != (len(product_ids), self.dim):
+                raise ValueError(
+                    f"{field} vectors shape {vectors.shape} 이 ({len(product_ids)}, {self.dim}) 와 일치하지 않습니다."
+                )
+            stacked[:, j] = normalize_rows(vectors)
+        present = np.any(stacked != 0, axis=2)
+        metadata = list(metadata) if metadata is not None else [{} for _ in product_ids]
+        if len(metadata) != len(product_ids):
+            raise ValueError("metadata 개수가 product_ids 개수와 일치하지 않습니다.")
+
+        self._ensure_capacity(len(self._ids) + len(product_ids))
+        for i, (product_id, meta) in enumerate(zip(product_ids, metadata)):
+            row = self._id_to_row.get(product_id)
+            if row is None:
+                row = len(self._ids)
+                self._ids.append(product_id)
+                self._metadata.append(meta)
+                self._id_to_row[product_id] = row
+            else:
+                self._metadata[row] = meta
+            self._vectors[row] = stacked[i]
+            self._present[row] = present[i]
+        self.changes.record(product_ids)
+
+    def remove(self, product_ids: Iterable[str]) -> int:
+        """벡터 삭제 (swap-remove). 삭제된 개수를 반환"""
+        removed = 0
+        for product_id in product_ids:
+            row = self._id_to_row.pop(product_id, None)
+            if row is None:
+                continue
+            last = len(self._ids) - 1
+            if row != last:
+                last_id = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._present[row] = self._present[last]
+                self._ids[row] = last_id
+                self._metadata[row] = self._metadata[last]
+                self._id_to_row[last_id] = row
+            self._ids.pop()
+            self._metadata.pop()
+            self.changes.record([product_id], removed=True)
+            removed += 1
+        return removed
+
+    def get_metadata(self, product_id: str) -> dict[str, Any] | None:
+        row = self._id_to_row.get(product_id)
+        return None if row is None else self._metadata[row]
+
+    def field_scores(self, query: np.ndarray | list[float], rows: np.ndarray | None = None) -> np.ndarray:
+        """
+        상품의 필드별 cosine 점수 (N x F). rows 가 주어지면 해당 row 만 계산 (len(rows) x F)
+
+        Args:
+            query: (d) 하나의 쿼리 벡터 또는 (F x d) 필드별 쿼리 벡터
+        """
+        query = np.asarray(query, dtype=np.float32)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        n = vectors.shape[0]
+        if query.ndim == 1:
+            query = normalize_rows(query)[0]
+            if query.shape[0] != self.dim:
+                raise ValueError(f"query 차원 {query.shape[0]} 이 인덱스 차원 {self.dim} 과 다릅니다.")
+            return (vectors.reshape(n * len(self.fields), self.dim) @ query).reshape(n, len(self.fields))
+        query = normalize_rows(query)
+        if query.shape != (len(self.fields), self.dim):
+            raise ValueError(f"query shape {query.shape} 이 ({len(self.fields)}, {self.dim}) 와 일치하지 않습니다.")
+        return np.einsum("nfd,fd->nf", vectors, query)
+
+    def _weight_vector(self, weights: dict[str, float] | None) -> np.ndarray:
+        weights = {**DEFAULT_FIELD_WEIGHTS, **(weights or {})}
+        return np.array([weights.get(field, 1.0) for field in self.fields], dtype=np.float32)
+
+    def search_rows(
+        self,
+        query: np.ndarray | list[float],
+        k: int = 3,
+        fusion: str = "weighted",
+        weights: dict[str, float] | None = None,
+        rrf_depth: int | None = None,
+        allow_mask: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        모든 필드를 한 번에 검색하고 점수를 결합하여 top-k 반환
+
+        Args:
+            fusion: "weighted" | "rrf"
+            weights: 필드별 가중치 (지정하지 않은 필드는 DEFAULT_FIELD_WEIGHTS)
+            rrf_depth: rrf 에서 필드별로 순위를 매길 상위 후보 수 (기본 max(4k, 100))
+            allow_mask: 검색 대상 row 의 bool mask (facet_index.py). 허용된 row 만 모아서 점수 계산
+
+        Returns:
+            (row index 배열, fused score 배열, 필드별 점수 (k x F))
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty((0, len(self.fields)), dtype=np.float32)
+        if len(self._ids) == 0:
+            return empty
+        # allowed: 점수를 계산할 row (None 이면 전체). 이후 row 번호는 allowed 내 위치이며 반환 시 전체 row 로 변환
+        allowed = None
+        if allow_mask is not None:
+            allowed = np.flatnonzero(allow_mask[: len(self._ids)])
+            if allowed.shape[0] == 0:
+                return empty
+        scores = self.field_scores(query, allowed)
+        present = self._present[: len(self._ids)] if allowed is None else self._present[allowed]
+        weight_vector = self._weight_vector(weights)
+
+        if fusion == "weighted":
+            # 캡션이 없는 필드는 점수 0 이므로 분모에서도 해당 필드 가중치를 제외
+            denominator = present @ weight_vector
+            fused = (scores @ weight_vector) / np.maximum(denominator, 1e-6)
+            rows = top_k_indices(fused, k)
+            fused = fused[rows]
+        elif fusion == "rrf":
+            depth = min(rrf_depth or max(4 * k, 100), scores.shape[0])
+            masked = np.where(present, scores, -np.inf)
+            ranked = [top_k_indices(masked[:, j], depth) for j in range(len(self.fields))]
+            ranked = [rows[present[rows, j]] for j, rows in enumerate(ranked)]
+            candidate_rows, fused = reciprocal_rank_fusion(ranked, weight_vector.tolist())
+            order = top_k_indices(fused, k)
+            rows, fused = candidate_rows[order], fused[order]
+        else:
+            raise ValueError(f"지원하지 않는 fusion 방식입니다: {fusion}")
+        return (rows if allowed is None else allowed[rows]), fused, scores[rows]
+
+    def search(
+        self,
+        query: np.ndarray | list[float],
+        k: int = 3,
+        fusion: str = "weighted",
+        weights: dict[str, float] | None = None,
+        allow_mask: np.ndarray | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        {"product_id", "score", "field_scores": {필드: 점수}, **metadata} 형태로 top-k 반환
+        """
+        rows, fused, field_scores = self.search_rows(query, k, fusion=fusion, weights=weights, allow_mask=allow_mask)
+        return [
+            {
+                **self._metadata[row],
+                "product_id": self._ids[row],
+                "score": score,
+                "field_scores": dict(zip(self.fields, row_scores)),
+            }
+            for row, score, row_scores in zip(rows.tolist(), fused.tolist(), field_scores.tolist())
+        ]
+
+    def save(self, path: str) -> None:
+        """인덱스를 .npz 파일로 저장"""
+        np.savez(
+            path,
+            field_vectors=self.vectors,
+            fields=np.asarray(self.fields, dtype=object),
+            ids=np.asarray(self._ids, dtype=object),
+            metadata=np.asarray(self._metadata, dtype=object),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "MultiVectorIndex":
+        """save() 로 저장한 .npz 파일에서 인덱스 로드"""
+        data = np.load(path, allow_pickle=True)
+        vectors = data["field_vectors"]
+        fields = data["fields"].tolist()
+        index = cls(dim=vectors.shape[2], fields=fields, initial_capacity=vectors.shape[0])
+        index.add(data["ids"].tolist(), {field: vectors[:, j] for j, field in enumerate(fields)}, data["metadata"].tolist())
+        return index
+
+
+# --- 필드별 단일 인덱스 5개 vs multi-vector 인덱스 1개 검색 latency 비교 ---
+if __name__ == "__main__":
+    import statistics
+    import time
+
+    from .vector_index import VectorIndex
+
+    n, dim = 20_000, 256
+    rng = np.random.default_rng(0)
+    ids = [f"sku_{i}" for i in range(n)]
+    field_vectors = {field: rng.standard_normal((n, dim)).astype(np.float32) for field in EMBEDDING_CAPTION_FIELDS}
+    # 일부 상품은 clip_text_front 캡션이 없는 경우
+    field_vectors["clip_text_front"][: n // 10] = 0
+
+    multi_index = MultiVectorIndex(dim, initial_capacity=n)
+    multi_index.add(ids, field_vectors)
+    single_indexes = {}
+    for field, vectors in field_vectors.items():
+        single_indexes[field] = VectorIndex(dim, initial_capacity=n)
+        single_indexes[field].add(ids, vectors)
+
+    queries = rng.standard_normal((50, dim)).astype(np.float32)
+
+    def bench(search) -> float:
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def separate_indexes(query: np.ndarray) -> None:
+        for index in single_indexes.values():
+            index.search_rows(query, k=100)
+
+    print(f"catalog {n} x {len(EMBEDDING_CAPTION_FIELDS)} fields, dim {dim}")
+    print(f"  separate field indexes : {bench(separate_indexes):.2f}ms")
+    print(f"  multi-vector weighted  : {bench(lambda q: multi_index.search(q, k=20)):.2f}ms")
+    print(f"  multi-vector rrf       : {bench(lambda q: multi_index.search(q, k=20, fusion='rrf')):.2f}ms")
@@ -1,14 +1,15 @@
+import asyncio
 from langchain_core.runnables import RunnableConfig
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # State
 from .states import ClothingRAGState
 
 # Utils
-from .utils import embedding_query , search_vector_db , get_product_details, rerank_items  , modify_query
+from .utils import embedding_query , search_vector_db , search_bm25 , fuse_search_results , get_product_details, rerank_items  , modify_query , classify_feedback , caption_scores_of , search_query_text , AUTO_FACET_FILTERS
+from .executor import run_blocking
+from .llm_registry import get_chat_chain
+from .payload_store import store_payload, load_payload
+from .semantic_cache import get_semantic_cache, replay_model, semantic_cache_bucket
 
 # Annotations
 from typing import Any
@@ -22,56 +23,113 @@ from langgraph.graph import END
 
 #TODO : user_feedback이 있는 경우에는 llm을 이용해서 쿼리 수정 해야함.
 # 임베딩 노드
-def embed_query_node(state: ClothingRAGState) -> dict[str, Any]:
+async def embed_query_node(state: ClothingRAGState, config: RunnableConfig) -> dict[str, Any]:
     print("--- Node: embed_query_node ---")
     user_query = state["user_query"]
     user_feedback = state.get("user_feedback", None)
-    if user_feedback:
+    if user_feedback and classify_feedback(user_feedback) == "requery":
         # llm을 이용해서 쿼리 수정
         user_new_query = modify_query(user_query, user_feedback)
         print("user_feedback 존재하여 새로운 쿼리 생성! : ", user_new_query)
-        return {"embedded_query": embedding_query(user_new_query)}
+        embedded_query = await embedding_query(user_new_query)
     else:
-        return {"embedded_query": embedding_query(user_query) }
+        embedded_query = await embedding_query(user_query)
+    # by-reference 모드이면 checkpoint 에는 벡터 대신 content hash 참조만 저장
+    return {"embedded_query": await run_blocking(store_payload, embedded_query, config)}
 
-def select_candidates_node(state: ClothingRAGState , config:RunnableConfig) -> dict[str, Any]:
+async def select_candidates_node(state: ClothingRAGState , config:RunnableConfig) -> dict[str, Any]:
     print("--- Node: select_candidates_node ---")
-    embedded_query = state["embedded_query"]
+    embedded_query = await run_blocking(load_payload, state["embedded_query"])
     # if not embedded_query:
     #     print("Error: No embedded query found.")
     #     return {"error_message": "Embedding failed or not provided."}
     k = config.get("configurable", {}).get("k", 3)
-    candidates = search_vector_db(embedded_query , k = k)
-    # Simulate some relevance based on the mock embedding and query
-    print(f"Selected {len(candidates)} candidates (mock): {[c['name'] for c in candidates]}")
-    return {"candidate_items": candidates}
+    nprobe = config.get("configurable", {}).get("nprobe") # ANN 인덱스 사용 시 recall / latency 조절
+    query_text = search_query_text(state)
+    auto_filters = config.get("configurable", {}).get("auto_filters", AUTO_FACET_FILTERS)
+    # 벡터 검색(CPU)은 event loop 를 막지 않도록 노드 전용 thread pool 에서 실행
+    vector_search = run_blocking(
+        search_vector_db,
+        embedded_query,
+        k = k,
+        nprobe = nprobe,
+        # multi-vector 인덱스 사용 시 캡션 필드(디자인 / 스타일 / TPO / 종합) 점수 결합 방식
+        fusion = config.get("configurable", {}).get("fusion", "weighted"),
+        field_weights = config.get("configurable", {}).get("field_weights"),
+        # facet pre-filter: 명시적인 filters 가 없고 auto_filters 이면 쿼리에 등장하는 속성 값(e.g. "핑크 셔츠")으로 자동 생성
+        filters = config.get("configurable", {}).get("filters"),
+        query_text = query_text if auto_filters else None,
+    )
+    if config.get("configurable", {}).get("hybrid", True):
+        # hybrid 검색: 캡션 / 태그 BM25 를 벡터 검색과 동시에 실행하고 RRF 로 결합
+        vector_candidates, bm25_candidates = await asyncio.gather(
+            vector_search,
+            run_blocking(
+                search_bm25,
+                query_text,
+                k = k,
+                filters = config.get("configurable", {}).get("filters"),
+                auto_filters = auto_filters,
+            ),
+        )
+        candidates = fuse_search_results(
+            {"vector": vector_candidates, "bm25": bm25_candidates},
+            k = k,
+            weights = {"bm25": config.get("configurable", {}).get("bm25_weight", 1.0)},
+        )
+    else:
+        candidates = await vector_search
+    print(f"Selected {len(candidates)} candidates: {[c['product_id'] for c in candidates]}")
+    return {"candidate_items": await run_blocking(store_payload, candidates, config)}
 
-def gather_information_node(state: ClothingRAGState) -> dict[str, Any]:
+async def gather_information_node(state: ClothingRAGState, config: RunnableConfig) -> dict[str, Any]:
     print("--- Node: gather_information_node ---")
-    candidate_items = state.get("candidate_items")
+    candidate_items = await run_blocking(load_payload, state.get("candidate_items"))
     # if not candidate_items:
     #     print("Error: No candidate items to gather information for.")
     #     return {"error_message": "No candidates found to gather info."}
     product_ids = [item["product_id"] for item in candidate_items]
-    product_details = get_product_details(product_ids) 
+    product_details = await run_blocking(get_product_details, product_ids)
     
-    return {"candidate_items_with_metadata": product_details, "external_info": []}
+    return {
+        "candidate_items_with_metadata": await run_blocking(store_payload, product_details, config),
+        "external_info": [],
+    }
 
-def rerank_candidates_node(state: ClothingRAGState) -> dict[str, Any]:
+async def rerank_candidates_node(state: ClothingRAGState, config: RunnableConfig) -> dict[str, Any]:
     print("--- Node: rerank_candidates_node ---")
-    items_with_metadata = state.get("candidate_items_with_metadata")
+    items_with_metadata, candidate_items, embedded_query = await run_blocking(
+        lambda: [load_payload(state.get(key)) for key in ("candidate_items_with_metadata", "candidate_items", "embedded_query")]
+    )
     external_info = state.get("external_info", {})
-    
+    # rerank 피드백(e.g. "rerank_cheaper")으로 바로 이 노드에 온 경우 checkpoint 의 기존 후보를 재정렬
+    user_feedback = state.get("user_feedback")
+    feedback_type = classify_feedback(user_feedback)
+    query_text = search_query_text(state)
+    candidates_by_id = {item["product_id"]: item for item in candidate_items or []}
+    configurable = config.get("configurable", {})
 
     # if not items_with_metadata:
     #     print("Error: No items with metadata to rerank.")
     #     return {"error_message": "Cannot rerank without item metadata."}
-    reranked_items = rerank_items(items_with_metadata, external_info)    
-    return {"ranked_candidates": reranked_items}
+    reranked_items = await run_blocking(
+        rerank_items,
+        items_with_metadata,
+        external_info,
+        user_feedback if feedback_type == "rerank" else None,
+        weights=configurable.get("rerank_weights"),
+        query_vector=embedded_query,
+        query_text=query_text,
+        retrieval_scores=[candidates_by_id.get(item["product_id"], {}).get("score", 0.0) for item in items_with_metadata],
+        caption_scores=caption_scores_of(items_with_metadata, candidates_by_id),
+        preferred_attributes=configurable.get("preferred_attributes"),
+    )
+    return {"ranked_candidates": await run_blocking(store_payload, reranked_items, config)}
 
 async def select_final_item_node(state: ClothingRAGState , config: RunnableConfig):
     print("--- Node: select_final_item_node ---")
-    ranked_candidates = state.get("ranked_candidates")[0]
+    ranked_items = await run_blocking(load_payload, state.get("ranked_candidates"))
+    ranked_candidates = ranked_items[0]
     user_query = state.get("user_query")
     # if not ranked_candidates:
     #     print("No candidates to select from after ranking.")
@@ -79,29 +137,39 @@ async def select_final_item_node(state: ClothingRAGState , config: RunnableConfi
     
     llm_config = config.get("configurable", {}).get("llm_model", {})
     system_prompt = llm_config.get("prompt_template" , "")
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            ("user", "{user_query}")
-        ]
-    )
-    model = llm_config["model"]
-    if model.startswith("gpt"):
-        llm = ChatOpenAI(model=model , temperature=0)
-    elif model.startswith("gemini"):
-        llm = ChatGoogleGenerativeAI(model=model , temperature=0)
-    
-    chain = prompt | llm 
+    temperature = llm_config.get("temperature", 0)
+
+    # semantic cache: 프롬프트 / 모델 / 상위 후보가 같고 쿼리 임베딩이 충분히 가까우면 저장된 응답을 token stream 으로 재생
+    # (chat model callback 을 타므로 websocket 이 전달하는 "messages" stream 에는 LLM 응답과 같은 형태로 나감)
+    use_cache = config.get("configurable", {}).get("semantic_cache", True)
+    if use_cache:
+        semantic_cache = get_semantic_cache()
+        embedded_query = await run_blocking(load_payload, state.get("embedded_query"))
+        bucket = semantic_cache_bucket(
+            system_prompt, llm_config["model"], temperature,
+            [item["product_id"] for item in ranked_items],
+        )
+        cached = semantic_cache.get(bucket, embedded_query)
+        if cached is not None:
+            async for chunk in replay_model(cached).astream(user_query):
+                yield {"llm_output": chunk.content}
+            return
+
+    # 모든 세션이 공유하는 chat client / chain 재사용 (턴마다 HTTP client 를 새로 만들지 않음)
+    chain = get_chat_chain(llm_config["model"], system_prompt, temperature=temperature)
     stream = chain.astream({"user_query": user_query})
+    answer = []
     async for chunk in stream:
+        answer.append(chunk.content)
         yield {"llm_output": chunk.content}
+    if use_cache and answer:
+        semantic_cache.set(bucket, embedded_query, "".join(answer))
         
 
     
 
 # 사용자 피드백 수집 노드 
-def wait_for_user_feedback_node(state: ClothingRAGState) -> dict[str, Any]:
+async def wait_for_user_feedback_node(state: ClothingRAGState) -> dict[str, Any]:
     print("--- Node: wait_for_user_feedback_node (after interrupt, expecting feedback in state) ---")
     print("user_feedback : ", state.get("user_feedback"))
     return {}
@@ -0,0 +1,334 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from .cache import TTLCache
+
+# state 에 저장되는 참조 문자열 prefix. 실제 값은 side store 에 content hash 로 저장
+REF_PREFIX = "payload:sha256:"
+
+# 기본 state 모드. configurable["state_by_reference"] 로 요청별 변경 가능
+STATE_BY_REFERENCE = os.getenv("STATE_BY_REFERENCE", "1") == "1"
+
+
+def is_payload_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+class PayloadStore:
+    """
+    큰 immutable payload(쿼리 임베딩, 후보 상품 문서 리스트 등)를 위한 content-addressed 저장소
+
+    checkpoint 에는 "payload:sha256:<hash>" 참조만 남기고 실제 값은 이 저장소에 한 번만 저장한다.
+    - 같은 내용은 같은 hash → 노드 간 / 턴 간 / 세션 간 자동 중복 제거
+    - 최근 사용 payload 는 in-process LRU 캐시에서 바로 반환
+    - 영구 저장은 SQLite (checkpoint 가 재시작 후에도 유효하도록), ttl 동안 접근(get / put, 캐시 hit 포함)이 없으면 삭제
+      (여러 인스턴스가 checkpoint 를 공유하면 MongoPayloadStore)
+    """
+
+    def __init__(
+        self,
+        path: str = "payloads.sqlite",
+        ttl: float | None = 24 * 3600,
+        cache_size: int = 4096,
+        touch_interval: float = 60.0,
+    ):
+        self.serde = JsonPlusSerializer()
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.cache = TTLCache(maxsize=cache_size)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._last_expire = 0.0
+        # 캐시 hit 으로 SQLite 를 거치지 않은 접근 (hash → 접근 시각). touch_interval 마다 accessed_at 에 한 번에 반영
+        self._touched: dict[str, float] = {}
+        self._last_touch_flush = time.monotonic()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS payloads ("
+                "hash TEXT PRIMARY KEY, type TEXT NOT NULL, data BLOB NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def put(self, value: Any) -> str:
+        """값을 저장하고 참조 문자열 반환"""
+        type_, data = self.serde.dumps_typed(value)
+        digest = hashlib.sha256(data).hexdigest()
+        ref = REF_PREFIX + digest
+        if self.cache.get(ref) is None:
+            self._write(digest, type_, zlib.compress(data, 1))
+            self.cache.set(ref, value)
+        else:
+            # 캐시에 있는 payload 를 다시 저장해도 새 checkpoint 가 참조하므로 만료 시각을 갱신
+            self._touch(digest)
+        self._maybe_expire()
+        return ref
+
+    def get(self, ref: str) -> Any:
+        """참조 문자열에 해당하는 값 반환 (없으면 KeyError)"""
+        digest = ref[len(REF_PREFIX):]
+        value = self.cache.get(ref)
+        if value is not None:
+            self._touch(digest)
+            return value
+        row = self._read(digest)
+        if row is None:
+            raise KeyError(f"payload 를 찾을 수 없습니다 (만료되었을 수 있음): {ref}")
+        value = self.serde.loads_typed((row[0], zlib.decompress(row[1])))
+        self.cache.set(ref, value)
+        return value
+
+    def _write(self, digest: str, type_: str, blob: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO payloads VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET accessed_at = excluded.accessed_at",
+                (digest, type_, blob, time.time()),
+            )
+
+    def _read(self, digest: str) -> tuple[str, bytes] | None:
+        """(type, 압축된 data) 를 읽고 접근 시각 갱신"""
+        with self._lock:
+            row = self._conn.execute("SELECT type, data FROM payloads WHERE hash = ?", (digest,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE payloads SET accessed_at = ? WHERE hash = ?", (time.time(), digest))
+        return row
+
+    def _touch(self, digest: str) -> None:
+        with self._lock:
+            self._touched[digest] = time.time()
+        if time.monotonic() - self._last_touch_flush >= self.touch_interval:
+            self.flush_touches()
+
+    def flush_touches(self) -> None:
+        """캐시 hit 접근 시각을 저장소 accessed_at 에 반영 (touch_interval 마다, 만료 처리 직전에 호출)"""
+        with self._lock:
+            self._last_touch_flush = time.monotonic()
+            touched, self._touched = self._touched, {}
+        if touched:
+            self._write_touches(touched)
+
+    def _write_touches(self, touched: dict[str, float]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE payloads SET accessed_at = MAX(accessed_at, ?) WHERE hash = ?",
+                [(accessed_at, digest) for digest, accessed_at in touched.items()],
+            )
+
+    def _maybe_expire(self, interval: float = 600.0) -> None:
+        now = time.monotonic()
+        if self.ttl is None or now - self._last_expire < interval:
+            return
+        self._last_expire = now
+        self.flush_touches()
+        # 저장소에서 지운 payload 는 캐시에서도 지워, 캐시 hit 로 touch 만 하고 행이 없는 상태가 생기지 않게 한다
+        for digest in self._delete_expired(time.time() - self.ttl):
+            self.cache.invalidate(REF_PREFIX + digest)
+
+    def _delete_expired(self, expired_before: float) -> list[str]:
+        with self._lock, self._conn:
+            expired = self._conn.execute("SELECT hash FROM payloads WHERE accessed_at < ?", (expired_before,)).fetchall()
+            self._conn.execute("DELETE FROM payloads WHERE accessed_at < ?", (expired_before,))
+        return [digest for (digest,) in expired]
+
+
+class MongoPayloadStore(PayloadStore):
+    """
+    MongoDB 기반 payload 저장소 (CHECKPOINTER=mongo 로 여러 서버 인스턴스가 세션을 공유하는 경우)
+    checkpoint 의 참조를 다른 인스턴스에서도 풀 수 있도록 checkpoint 와 같은 database 에 저장
+    만료는 accessed_at 필드의 TTL index 로 MongoDB 가 직접 처리
+    """
+
+    def __init__(
+        self,
+        database: Any,
+        ttl: float | None = 24 * 3600,
+        cache_size: int = 4096,
+        touch_interval: float = 60.0,
+    ):
+        self.serde = JsonPlusSerializer()
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.cache = TTLCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self._last_expire = 0.0
+        self._touched: dict[str, float] = {}
+        self._last_touch_flush = time.monotonic()
+        self.payloads = database["payloads"]
+        if ttl is not None:
+            self.payloads.create_index("accessed_at", expireAfterSeconds=int(ttl))
+
+    def _write(self, digest: str, type_: str, blob: bytes) -> None:
+        self.payloads.update_one(
+            {"_id": digest},
+            {"$setOnInsert": {"type": type_, "data": blob}, "$set": {"accessed_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    def _read(self, digest: str) -> tuple[str, bytes] | None:
+        doc = self.payloads.find_one_and_update(
+            {"_id": digest}, {"$set": {"accessed_at": datetime.now(timezone.utc)}}, projection={"type": 1, "data": 1}
+        )
+        return None if doc is None else (doc["type"], bytes(doc["data"]))
+
+    def _write_touches(self, touched: dict[str, float]) -> None:
+        digests = list(touched)
+        self.payloads.update_many(
+            {"_id": {"$in": digests}}, {"$max": {"accessed_at": datetime.fromtimestamp(max(touched.values()), timezone.utc)}}
+        )
+        # 다른 인스턴스 / TTL monitor 가 이미 지운 payload 는 캐시에서도 지워 다음 put() 에서 다시 저장되게 한다
+        alive = {doc["_id"] for doc in self.payloads.find({"_id": {"$in": digests}}, {"_id": 1})}
+        for digest in digests:
+            if digest not in alive:
+                self.cache.invalidate(REF_PREFIX + digest)
+
+    def _delete_expired(self, expired_before: float) -> list[str]:
+        # 삭제는 TTL index 가 처리
+        return []
+
+
+_payload_store: PayloadStore | None = None
+
+
+def get_payload_store() -> PayloadStore:
+    """
+    프로세스 전역 payload 저장소 (checkpointer 와 같은 backend)
+    CHECKPOINTER=mongo 이면 checkpoint 를 공유하는 다른 인스턴스도 참조를 풀 수 있도록 MongoDB, 아니면 로컬 SQLite
+    """
+    global _payload_store
+    if _payload_store is None:
+        # checkpoint 가 만료되기 전에 그 checkpoint 가 참조하는 payload 가 먼저 지워지지 않도록 checkpoint TTL 보다 길게 보존
+        checkpoint_ttl = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600)))
+        ttl = float(os.getenv("PAYLOAD_TTL_SECONDS", str(checkpoint_ttl + 3600)))
+        if os.getenv("CHECKPOINTER", "sqlite").lower() == "mongo":
+            from .product_repository import MONGODB_DB, get_mongo_client
+
+            _payload_store = MongoPayloadStore(get_mongo_client()[MONGODB_DB], ttl=ttl)
+        else:
+            _payload_store = PayloadStore(os.getenv("PAYLOAD_DB_PATH", "payloads.sqlite"), ttl=ttl)
+    return _payload_store
+
+
+def set_payload_store(store: PayloadStore | None) -> None:
+    """프로세스 전역 payload 저장소 교체 (테스트용)"""
+    global _payload_store
+    _payload_store = store
+
+
+def state_by_reference(config: RunnableConfig | None) -> bool:
+    if config is None:
+        return STATE_BY_REFERENCE
+    return config.get("configurable", {}).get("state_by_reference", STATE_BY_REFERENCE)
+
+
+def store_payload(value: Any, config: RunnableConfig | None = None) -> Any:
+    """
+    by-reference 모드이면 값을 side store 에 저장하고 참조를, 아니면 값을 그대로 반환
+    노드가 큰 값을 state 에 쓸 때 사용
+    """
+    if value is None or not state_by_reference(config):
+        return value
+    return get_payload_store().put(value)
+
+
+def load_payload(value: Any) -> Any:
+    """
+    state 값이 참조이면 실제 값을, 아니면 그대로 반환 (두 모드 모두에서 안전하게 사용 가능)
+    """
+    if is_payload_ref(value):
+        return get_payload_store().get(value)
+    return value
+
+
+# --- checkpoint 크기 / 턴당 저장 비용 (checkpoint 직렬화 + 저장, by-reference put) 측정 ---
+if __name__ == "__main__":
+    import random
+    import statistics
+    import tempfile
+
+    serde = JsonPlusSerializer()
+
+    # 상품 문서 (MasterCaption 구조화 속성 + 캡션 포함) 20개 후보 기준
+    documents = [
+        {
+            "product_id": f"sku_{i}",
+            "name": f"린넨 셔츠 {i}",
+            "price": 39000 + i * 1000,
+            "structured_attributes": {
+                "common": {"category_l1": "상의", "category_l2": "셔츠", "sleeve_length": "긴소매"},
+                "subjective": {"fit": "레귤러핏", "style_tags": ["캐주얼", "미니멀"], "tpo_tags": ["데일리룩", "오피스룩"]},
+            },
+            "embedding_captions": {
+                "design_details_description": "클래식한 셔츠 칼라와 세로 스트라이프 패턴이 특징입니다. " * 4,
+                "style_vibe_description": "캐주얼하면서도 미니멀한 프렌치시크 스타일을 연출합니다. " * 4,
+                "tpo_context_description": "데일리룩은 물론 오피스룩이나 데이트룩으로도 좋습니다. " * 4,
+                "comprehensive_description": "산뜻한 블루 색상의 미니멀한 스트라이프 셔츠입니다. " * 6,
+            },
+        }
+        for i in range(20)
+    ]
+    state = {
+        "user_query": "여름 오피스룩 셔츠 추천",
+        "embedded_query": [random.random() for _ in range(1024)],
+        "candidate_items": [{"product_id": d["product_id"], "score": random.random()} for d in documents],
+        "candidate_items_with_metadata": documents,
+        "ranked_candidates": list(reversed(documents)),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        set_payload_store(PayloadStore(os.path.join(tmp, "payloads.sqlite")))
+        config = {"configurable": {"state_by_reference": True}}
+        by_reference = {
+            key: (value if key == "user_query" else store_payload(value, config)) for key, value in state.items()
+        }
+
+        # checkpoint 저장 = 직렬화 + SQLite insert (checkpointer 와 같은 WAL / synchronous=NORMAL 설정)
+        checkpoint_db = sqlite3.connect(os.path.join(tmp, "checkpoints.sqlite"), isolation_level=None)
+        checkpoint_db.execute("PRAGMA journal_mode=WAL")
+        checkpoint_db.execute("PRAGMA synchronous=NORMAL")
+        checkpoint_db.execute("CREATE TABLE checkpoints (id INTEGER PRIMARY KEY, data BLOB)")
+        serialize_ms, checkpoint_kb = {}, {}
+        for name, values in (("inline", state), ("by reference", by_reference)):
+            timings = []
+            for _ in range(50):
+                start = time.perf_counter()
+                _, data = serde.dumps_typed(values)
+                checkpoint_db.execute("INSERT INTO checkpoints (data) VALUES (?)", (data,))
+                timings.append((time.perf_counter() - start) * 1000)
+            serialize_ms[name], checkpoint_kb[name] = statistics.median(timings), len(data) / 1024
+            print(f"{name:>12}: checkpoint {checkpoint_kb[name]:7.1f}KB, 직렬화 + 저장 {serialize_ms[name]:.3f}ms")
+
+        # by-reference 모드의 노드별 put() 비용 (serde + sha256 + zlib + SQLite insert, 턴마다 새 값이므로 캐시 miss)
+        put_timings = []
+        for turn in range(50):
+            fresh = {
+                "embedded_query": [random.random() for _ in range(1024)],
+                "candidate_items": [{"product_id": d["product_id"], "score": random.random()} for d in documents],
+                "candidate_items_with_metadata": [{**d, "turn": turn} for d in documents],
+                "ranked_candidates": [{**d, "turn": turn, "rank": i} for i, d in enumerate(documents)],
+            }
+            start = time.perf_counter()
+            for value in fresh.values():
+                store_payload(value, config)
+            put_timings.append((time.perf_counter() - start) * 1000)
+        put_ms = statistics.median(put_timings)
+        print(f"by reference: 턴당 put() {len(fresh)}회 {put_ms:.3f}ms")
+
+        # 한 턴(입력 + 노드 5개)에 전체 state 의 checkpoint 가 CHECKPOINTS_PER_TURN 번 저장된다고 보고 비교 (상한)
+        CHECKPOINTS_PER_TURN = 6
+        inline_turn = CHECKPOINTS_PER_TURN * serialize_ms["inline"]
+        by_reference_turn = CHECKPOINTS_PER_TURN * serialize_ms["by reference"] + put_ms
+        print(
+            f"턴당 state 저장: inline {inline_turn:.3f}ms / {CHECKPOINTS_PER_TURN * checkpoint_kb['inline']:.0f}KB, "
+            f"by reference {by_reference_turn:.3f}ms / {CHECKPOINTS_PER_TURN * checkpoint_kb['by reference']:.0f}KB "
+            f"+ payload (checkpoint {CHECKPOINTS_PER_TURN}회 + put {len(fresh)}회)"
+        )
@@ -0,0 +1,124 @@
+import copy
+import os
+import threading
+from typing import Any, Iterable
+
+from pymongo import MongoClient
+from pymongo.collection import Collection
+
+from .cache import TTLCache
+from .reranker import get_reranker
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGODB_DB = os.getenv("MONGODB_DB", "sw_project")
+MONGODB_PRODUCT_COLLECTION = os.getenv("MONGODB_PRODUCT_COLLECTION", "products")
+
+# 추천/LLM 프롬프트에 필요한 필드만 조회 (이미지 원본 경로, 크롤링 원문 등 큰 필드 제외)
+DEFAULT_PROJECTION = {
+    "_id": 0,
+    "product_id": 1,
+    "name": 1,
+    "brand": 1,
+    "price": 1,
+    "description": 1,
+    "category": 1,
+    "review_count": 1,
+    "rating": 1,
+    "structured_attributes": 1,
+    "embedding_captions": 1,
+    "variants": 1,
+}
+
+_client: MongoClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_mongo_client(uri: str | None = None) -> MongoClient:
+    """
+    프로세스 전역 MongoClient 반환
+    MongoClient 는 내부적으로 connection pool 을 가지므로 요청마다 만들지 않고 하나를 공유
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                uri or MONGODB_URI,
+                maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE", "50")),
+                serverSelectionTimeoutMS=3000,
+            )
+        return _client
+
+
+class ProductRepository:
+    """
+    상품 상세 정보 read-through 캐시 + MongoDB 일괄 조회
+
+    - 캐시에 없는 ID 만 모아서 한 번의 $in 쿼리(projection 적용)로 조회
+    - 인기 상품은 크기 제한(LRU) + TTL 캐시에 유지
+    - 상품 정보가 수정되면 invalidate() 로 명시적으로 캐시 무효화
+    - 캐시된 문서는 호출자 간에 공유되지 않도록 사본을 반환 (반환값을 수정해도 캐시는 그대로)
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        cache: TTLCache | None = None,
+        projection: dict[str, int] | None = None,
+        id_field: str = "product_id",
+    ):
+        self.collection = collection
+        self.cache = cache if cache is not None else TTLCache(maxsize=5000, ttl=600.0)
+        self.projection = projection if projection is not None else DEFAULT_PROJECTION
+        self.id_field = id_field
+
+    def get_many(self, product_ids: list[str]) -> list[dict[str, Any]]:
+        """
+        상품 ID 리스트에 대한 상세 정보 반환 (입력 순서 유지, 존재하지 않는 ID 는 제외)
+        """
+        found: dict[str, dict[str, Any]] = {}
+        misses = []
+        for product_id in dict.fromkeys(product_ids):
+            product = self.cache.get(product_id)
+            if product is None:
+                misses.append(product_id)
+            else:
+                found[product_id] = product
+
+        if misses:
+            for product in self.collection.find({self.id_field: {"$in": misses}}, self.projection):
+                product_id = product[self.id_field]
+                self.cache.set(product_id, product)
+                found[product_id] = product
+
+        return [copy.deepcopy(found[product_id]) for product_id in product_ids if product_id in found]
+
+    def invalidate(self, product_ids: Iterable[str] | None = None) -> None:
+        """지정한 상품(또는 전체)의 캐시 무효화 (reranker 의 가격 / 인기도 / 속성 feature 포함)"""
+        if product_ids is not None:
+            product_ids = list(product_ids)
+        get_reranker().invalidate(product_ids)
+        if product_ids is None:
+            self.cache.clear()
+            return
+        for product_id in product_ids:
+            self.cache.invalidate(product_id)
+
+
+_product_repository: ProductRepository | None = None
+
+
+def get_product_repository() -> ProductRepository | None:
+    """
+    프로세스 전역 ProductRepository 반환 (MONGODB_URI 가 설정되지 않은 경우 None)
+    """
+    global _product_repository
+    if _product_repository is None and MONGODB_URI:
+        collection = get_mongo_client()[MONGODB_DB][MONGODB_PRODUCT_COLLECTION]
+        _product_repository = ProductRepository(collection)
+    return _product_repository
+
+
+def set_product_repository(repository: ProductRepository | None) -> None:
+    """프로세스 전역 ProductRepository 교체 (mongomock 등 테스트용)"""
+    global _product_repository
+    _product_repository = repository
@@ -0,0 +1,388 @@
+import math
+import threading
+from typing import Any, Iterable
+
+import numpy as np
+
+from .facet_index import match_query
+from .vector_index import normalize_rows
+
+# EmbeddingCaptions 중 다중 임베딩 대상 필드 (caption/image_caption.py)
+CAPTION_FIELDS = (
+    "design_details_description",
+    "style_vibe_description",
+    "tpo_context_description",
+    "comprehensive_description",
+)
+
+# 점수 행렬의 열 순서. 최종 점수 = features (n x S) @ weights (S)
+SIGNALS = ("retrieval", "design", "style", "tpo", "comprehensive", "price", "popularity", "attributes")
+
+DEFAULT_WEIGHTS = {
+    "retrieval": 1.0,
+    "design": 0.25,
+    "style": 0.25,
+    "tpo": 0.25,
+    "comprehensive": 0.25,
+    "price": 0.0,
+    "popularity": 0.1,
+    "attributes": 0.3,
+}
+
+# 재정렬 피드백 → 기본 가중치에 덮어쓸 값 (price 는 저렴할수록 높은 점수)
+FEEDBACK_WEIGHTS = {
+    "rerank_cheaper": {"price": 1.0},
+    "rerank_expensive": {"price": -1.0},
+    "rerank_review": {"popularity": 1.0},
+    "rerank_popular": {"popularity": 1.0},
+}
+
+
+def attribute_values(structured_attributes: dict[str, Any] | None) -> frozenset[str]:
+    """StructuredAttributes 에서 쿼리와 비교할 속성 값(카테고리, 기장, 색상, 패턴, 핏, 태그 등) 추출"""
+    if not structured_attributes:
+        return frozenset()
+    values: list[Any] = []
+    common = structured_attributes.get("common") or {}
+    values += [common.get("category_l1"), common.get("category_l2"), common.get("sleeve_length"), common.get("body_length")]
+    for colors in (common.get("color") or {}).values():
+        for color in colors if isinstance(colors, list) else [colors]:
+            values.append((color or {}).get("name"))
+    for side in ("front", "back"):
+        attributes = structured_attributes.get(side) or {}
+        values += [attributes.get("neckline"), (attributes.get("pattern") or {}).get("type")]
+        values += [detail.get("type") for detail in attributes.get("closures_and_embellishments") or []]
+    subjective = structured_attributes.get("subjective") or {}
+    values += [subjective.get("fit"), subjective.get("silhouette")]
+    for tags in ("style_tags", "mood_tags", "tpo_tags"):
+        values += subjective.get(tags) or []
+    return frozenset(str(value) for value in values if value and value != "없음")
+
+
+class _Features:
+    """
+    상품 feature 배열 한 세대 (상품 ID → 행 번호, 행별 log 가격, 인기도, 속성 ID, 캡션 임베딩)
+
+    rows 에 등록된 행은 이 세대 안에서 다시 쓰지 않는다 (invalidate 는 ID 만 빼고 행은 dead 로 셈)
+    → lock 없이 (세대, 행 번호) 를 잡은 점수 계산은 그 사이 추가 / 무효화 / 세대 교체가 있어도 같은 값을 읽음
+    """
+
+    def __init__(self, capacity: int, attribute_ids: dict[str, int] | None = None, attribute_values: list[str] | None = None):
+        self.rows: dict[str, int] = {}
+        self.count = 0
+        self.dead = 0
+        self.capacity = max(capacity, 1)
+        self.log_price = np.full(self.capacity, np.nan, dtype=np.float32)
+        self.popularity = np.zeros(self.capacity, dtype=np.float32)
+        # 속성 값 ID 행렬 (rows x 최대 속성 수, 빈 칸은 -1). 속성 값 문자열 ↔ 정수 ID
+        self.attributes = np.full((self.capacity, 16), -1, dtype=np.int32)
+        self.attribute_ids: dict[str, int] = dict(attribute_ids or {})
+        self.attribute_values: list[str] = list(attribute_values or [])
+        self.wanted_cache: tuple[tuple, np.ndarray | None] | None = None
+        # 캡션 필드별 임베딩 (rows x F x d, 정규화). 첫 캡션의 차원으로 생성, 캡션이 없는 행은 has_captions False
+        self.captions: np.ndarray | None = None
+        self.has_captions = np.zeros(self.capacity, dtype=bool)
+
+    def lookup(self, items: list[dict[str, Any]]) -> np.ndarray:
+        rows = self.rows
+        return np.fromiter((rows.get(item.get("product_id"), -1) for item in items), dtype=np.int64, count=len(items))
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+
+        def grown(array: np.ndarray, fill: Any) -> np.ndarray:
+            result = np.full((capacity, *array.shape[1:]), fill, dtype=array.dtype)
+            result[: self.count] = array[: self.count]
+            return result
+
+        self.log_price = grown(self.log_price, np.nan)
+        self.popularity = grown(self.popularity, 0)
+        self.attributes = grown(self.attributes, -1)
+        self.has_captions = grown(self.has_captions, False)
+        if self.captions is not None:
+            self.captions = grown(self.captions, 0)
+        self.capacity = capacity
+
+    def _encode_attributes(self, values: frozenset[str]) -> list[int]:
+        ids = []
+        for value in values:
+            if value not in self.attribute_ids:
+                self.attribute_ids[value] = len(self.attribute_values)
+                self.attribute_values.append(value)
+            ids.append(self.attribute_ids[value])
+        return ids
+
+    def _set_captions(self, row: int, captions: dict[str, Any] | None) -> None:
+        if not captions or any(captions.get(field) is None for field in CAPTION_FIELDS):
+            return
+        vectors = normalize_rows(np.asarray([captions[field] for field in CAPTION_FIELDS], dtype=np.float32))
+        if self.captions is None:
+            self.captions = np.zeros((self.capacity, *vectors.shape), dtype=np.float32)
+        elif vectors.shape != self.captions.shape[1:]:
+            return
+        self.captions[row] = vectors
+        self.has_captions[row] = True
+
+    def add(self, item: dict[str, Any]) -> int:
+        """상품 feature 를 새 행에 기록하고 행 번호 반환 (lock 안에서 호출, 이미 있는 상품이면 기존 행)"""
+        product_id = item.get("product_id")
+        if product_id is not None and product_id in self.rows:
+            return self.rows[product_id]
+        if self.count == self.capacity:
+            self._grow()
+        row = self.count
+        price = item.get("price")
+        popularity = item.get("popularity", item.get("review_count"))
+        self.log_price[row] = math.log1p(price) if price else np.nan
+        self.popularity[row] = math.log1p(popularity) if popularity else 0.0
+        attribute_ids = self._encode_attributes(attribute_values(item.get("structured_attributes")))
+        if len(attribute_ids) > self.attributes.shape[1]:
+            wider = np.full((self.capacity, len(attribute_ids)), -1, dtype=np.int32)
+            wider[:, : self.attributes.shape[1]] = self.attributes
+            self.attributes = wider
+        self.attributes[row, : len(attribute_ids)] = attribute_ids
+        self._set_captions(row, item.get("caption_embeddings"))
+        self.count += 1
+        if product_id is not None:
+            self.rows[product_id] = row
+        return row
+
+    def compacted(self) -> "_Features":
+        """살아 있는 행만 앞에서부터 옮겨 담은 새 세대 (속성 값 ID 는 유지)"""
+        product_ids = list(self.rows)
+        old_rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(product_ids))
+        live = len(product_ids)
+        features = _Features(live * 2, self.attribute_ids, self.attribute_values)
+        features.log_price[:live] = self.log_price[old_rows]
+        features.popularity[:live] = self.popularity[old_rows]
+        features.attributes = np.full((features.capacity, self.attributes.shape[1]), -1, dtype=np.int32)
+        features.attributes[:live] = self.attributes[old_rows]
+        features.has_captions[:live] = self.has_captions[old_rows]
+        if self.captions is not None:
+            features.captions = np.zeros((features.capacity, *self.captions.shape[1:]), dtype=np.float32)
+            features.captions[:live] = self.captions[old_rows]
+        features.rows = dict(zip(product_ids, range(live)))
+        features.count = live
+        return features
+
+
+class Reranker:
+    """
+    다중 신호 후보 재정렬
+
+    후보 n 개에 대해 신호별 점수를 (n x S) 행렬로 만들고 가중치 벡터와 한 번의 행렬 곱으로 최종 점수 계산
+    - retrieval: 벡터 검색 점수
+    - design / style / tpo / comprehensive: 쿼리 임베딩과 캡션 필드별 임베딩의 cosine 유사도
+    - price: 후보 내에서 정규화한 저렴함 (log 가격 기준)
+    - popularity: 후보 내에서 정규화한 log(리뷰 수 / 인기도)
+    - attributes: 쿼리(또는 선호 속성)에 등장하는 StructuredAttributes 값의 비율
+
+    상품별 고정값은 상품 ID → 행 번호로 미리 할당한 배열(log 가격, 인기도, 속성 ID 행렬, 캡션 임베딩)에 보관하고
+    후보의 행 번호 배열 하나로 모든 feature 를 한 번에 gather 한다
+    배열은 _Features 세대 단위로 교체하므로 점수 계산은 lock 없이 잡아 둔 세대 하나만 읽는다
+    """
+
+    def __init__(self, max_items: int = 50_000, initial_capacity: int = 1024):
+        self.max_items = max_items
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._features = _Features(initial_capacity)
+
+    def features_of(self, items: list[dict[str, Any]]) -> tuple[_Features, np.ndarray]:
+        """후보의 (feature 세대, 행 번호) (처음 보는 상품은 feature 를 계산해 추가)"""
+        features = self._features
+        rows = features.lookup(items)
+        if (rows >= 0).all():
+            return features, rows
+        with self._lock:
+            features = self._features
+            rows = features.lookup(items)
+            missing = np.flatnonzero(rows < 0)
+            if features.count + len(missing) > self.max_items:
+                # 카탈로그 전체가 들어올 만큼 크게 잡고, 넘치면 무효화된 행을 정리하거나 통째로 비움
+                # (상품 feature 는 다시 계산 가능, 이전 세대를 읽는 점수 계산에는 영향 없음)
+                if features.dead and features.count - features.dead + len(missing) <= self.max_items:
+                    features = features.compacted()
+                else:
+                    features = _Features(self.initial_capacity)
+                self._features = features
+                rows = features.lookup(items)
+                missing = np.flatnonzero(rows < 0)
+            for i in missing.tolist():
+                rows[i] = features.add(items[i])
+        return features, rows
+
+    def invalidate(self, product_ids: Iterable[str] | None = None) -> None:
+        """
+        상품 정보(가격, 인기도, 속성, 캡션) 변경 시 캐시된 feature 제거 (None 이면 전체)
+        무효화된 행이 절반을 넘으면 살아 있는 행만 모은 새 세대로 교체
+        """
+        with self._lock:
+            if product_ids is None:
+                self._features = _Features(self.initial_capacity)
+                return
+            features = self._features
+            for product_id in product_ids:
+                if features.rows.pop(product_id, None) is not None:
+                    features.dead += 1
+            if features.dead * 2 > features.count:
+                self._features = features.compacted()
+
+    @staticmethod
+    def _wanted_attributes(
+        features: _Features, query_text: str, preferred_attributes: list[str] | None
+    ) -> np.ndarray | None:
+        """
+        속성 값 ID 별 쿼리 / 선호 속성 등장 여부 (마지막 칸은 빈 칸 -1 용 0, 없으면 None)
+        쿼리는 facet 필터와 같은 토큰 / 부정 표현 규칙으로 맞춘다 ("티셔츠" 는 셔츠가 아니고 "블랙 말고" 는 블랙이 아님)
+        같은 쿼리로 여러 번 재정렬(rerank 피드백)하므로 마지막 결과를 재사용
+        """
+        values = features.attribute_values
+        count = len(values)
+        key = (query_text, tuple(preferred_attributes or ()), count)
+        cached = features.wanted_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        preferred = set(preferred_attributes or [])
+        wanted_values = {value_id for value_id in range(count) if values[value_id] in preferred}
+        if query_text:
+            phrases: dict[tuple[str, ...], list[int]] = {}
+            for value_id in range(count):
+                phrases.setdefault(tuple(values[value_id].lower().split()), []).append(value_id)
+            wanted_values.update(match_query(query_text, phrases))
+        wanted = None
+        if wanted_values:
+            wanted = np.zeros(count + 1, dtype=np.float32)
+            wanted[list(wanted_values)] = 1.0
+        features.wanted_cache = (key, wanted)
+        return wanted
+
+    def score_matrix(
+        self,
+        items: list[dict[str, Any]],
+        query_vector: np.ndarray | list[float] | None = None,
+        query_text: str = "",
+        retrieval_scores: list[float] | None = None,
+        caption_scores: np.ndarray | None = None,
+        preferred_attributes: list[str] | None = None,
+    ) -> np.ndarray:
+        """
+        신호별 점수 행렬 (n x len(SIGNALS)) 계산
+
+        Args:
+            caption_scores: 캡션 필드별 유사도 (n x F). 주어지지 않으면 상품의 caption_embeddings 와 query_vector 로 계산
+        """
+        n = len(items)
+        features, rows = self.features_of(items)
+        matrix = np.zeros((n, len(SIGNALS)), dtype=np.float32)
+
+        if retrieval_scores is not None:
+            matrix[:, 0] = retrieval_scores
+        else:
+            matrix[:, 0] = [item.get("score", 0.0) for item in items]
+
+        # 캡션 필드별 유사도: 캡션 임베딩 행렬에서 후보 행만 모아 (n x F x d) @ (d) → (n x F)
+        if caption_scores is not None:
+            matrix[:, 1:5] = caption_scores
+        elif query_vector is not None and features.captions is not None:
+            captions = features.captions
+            query = normalize_rows(query_vector)[0]
+            has_captions = features.has_captions[rows]
+            if has_captions.any() and captions.shape[-1] == query.shape[0]:
+                np.matmul(captions[rows], query, out=matrix[:, 1:5])
+                matrix[~has_captions, 1:5] = 0.0
+
+        # 가격 / 인기도: 후보 집합 내 min-max 정규화 (가격 정보가 없으면 중간값 0.5)
+        log_price = features.log_price[rows]
+        known = ~np.isnan(log_price)
+        if known.any():
+            low, high = log_price[known].min(), log_price[known].max()
+            matrix[:, 5] = 0.5
+            if high > low:
+                matrix[known, 5] = 1.0 - (log_price[known] - low) / (high - low)
+        popularity = features.popularity[rows]
+        if popularity.max() > 0:
+            matrix[:, 6] = popularity / popularity.max()
+
+        # 속성 일치: 후보의 속성 ID 행렬 (n x A, 빈 칸 -1 → 마지막 칸) 에서 쿼리에 등장하는 속성 수를 후보별로 합산
+        wanted = self._wanted_attributes(features, query_text, preferred_attributes)
+        if wanted is not None:
+            attribute_ids = features.attributes[rows]
+            present = np.zeros(len(wanted), dtype=bool)
+            present[attribute_ids] = True
+            present[-1] = False
+            wanted_count = np.count_nonzero(wanted[present])
+            if wanted_count:
+                matrix[:, 7] = wanted[attribute_ids].sum(axis=1) / wanted_count
+        return matrix
+
+    def rerank(
+        self,
+        items: list[dict[str, Any]],
+        weights: dict[str, float] | None = None,
+        **signals: Any,
+    ) -> list[dict[str, Any]]:
+        """
+        가중합 점수 내림차순으로 정렬된 후보 반환 (각 후보에 "rerank_score" 추가, 원본 dict 는 수정하지 않음)
+
+        Args:
+            weights: 신호별 가중치 (지정하지 않은 신호는 DEFAULT_WEIGHTS 사용)
+            **signals: score_matrix 의 query_vector / query_text / retrieval_scores / caption_scores / preferred_attributes
+        """
+        if not items:
+            return []
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        weight_vector = np.array([weights[signal] for signal in SIGNALS], dtype=np.float32)
+        scores = self.score_matrix(items, **signals) @ weight_vector
+        order = np.argsort(-scores, kind="stable")
+        return [{**items[i], "rerank_score": score} for i, score in zip(order.tolist(), scores[order].tolist())]
+
+
+_reranker: Reranker | None = None
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        _reranker = Reranker()
+    return _reranker
+
+
+# --- 후보 수별 rerank latency 측정 ---
+if __name__ == "__main__":
+    import statistics
+    import time
+
+    dim = 512
+    rng = np.random.default_rng(0)
+    tags = ["캐주얼", "미니멀", "스트릿", "페미닌", "데일리룩", "오피스룩", "데이트룩", "여행룩"]
+    reranker = Reranker()
+
+    def make_item(i: int) -> dict[str, Any]:
+        return {
+            "product_id": f"sku_{i}",
+            "price": int(rng.integers(10_000, 200_000)),
+            "review_count": int(rng.integers(0, 5_000)),
+            "structured_attributes": {
+                "common": {"category_l1": "상의", "category_l2": ["셔츠", "블라우스", "티셔츠"][i % 3], "sleeve_length": "긴소매"},
+                "subjective": {"fit": ["슬림핏", "오버핏"][i % 2], "style_tags": list(rng.choice(tags, 3, replace=False))},
+            },
+            "caption_embeddings": {field: rng.standard_normal(dim).tolist() for field in CAPTION_FIELDS},
+        }
+
+    query_vector = rng.standard_normal(dim).astype(np.float32)
+    for n in (20, 100, 300, 500):
+        items = [make_item(i) for i in range(n)]
+        scores = rng.random(n).tolist()
+        # multi-vector 검색이 캡션 필드 점수를 함께 넘기는 경우 (캡션 임베딩 gather 없음)
+        field_scores = rng.random((n, len(CAPTION_FIELDS))).astype(np.float32)
+        reranker.rerank(items, query_vector=query_vector, retrieval_scores=scores)  # feature 캐시 워밍업
+        results = []
+        for signals in ({"query_vector": query_vector}, {"caption_scores": field_scores}):
+            timings = []
+            for _ in range(200):
+                start = time.perf_counter()
+                reranker.rerank(items, query_text="오버핏 셔츠 데이트룩", retrieval_scores=scores, **signals)
+                timings.append((time.perf_counter() - start) * 1000)
+            results.append(f"median {statistics.median(timings):.3f}ms, p95 {sorted(timings)[189]:.3f}ms")
+        print(f"{n:>4} candidates: caption 임베딩 {results[0]} | caption_scores {results[1]}")
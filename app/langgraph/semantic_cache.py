@@ -0,0 +1,166 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional, Sequence
+
+import numpy as np
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+# 같은 버킷(프롬프트 / 모델 / 상위 후보) 안에서 쿼리 임베딩 cosine 유사도가 이 값 이상이면 hit
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "10000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+# key 에 포함할 상위 후보 수 (순서 포함)
+SEMANTIC_CACHE_TOP_N = int(os.getenv("SEMANTIC_CACHE_TOP_N", "5"))
+
+
+def semantic_cache_bucket(
+    prompt_template: str,
+    model: str,
+    temperature: float,
+    candidate_ids: Sequence[str],
+    top_n: int = SEMANTIC_CACHE_TOP_N,
+) -> str:
+    """쿼리 임베딩을 제외한 key 부분 (프롬프트 템플릿 / 모델 / 상위 후보 ID 가 모두 같아야 같은 버킷)"""
+    parts = [prompt_template, model, repr(float(temperature)), *map(str, candidate_ids[:top_n])]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray  # L2 정규화된 쿼리 임베딩
+    answer: str
+    created: float
+
+
+class SemanticCache:
+    """
+    select_final_item_node 응답 캐시: 버킷(semantic_cache_bucket) 을 정확히 맞춘 뒤 버킷 안에서 쿼리 임베딩 유사도로 조회
+
+    - "여름 데이트룩 추천" / "여름 데이트룩 추천해줘" 처럼 거의 같은 질문이 같은 후보로 이어지면 LLM 을 다시 호출하지 않음
+    - 전체 항목 수 maxsize 초과 시 가장 오래 사용되지 않은 버킷의 가장 오래된 항목부터 제거, ttl(초)이 지난 항목은 조회 시 제거
+    - hits / misses / hit_rate 통계 제공 (TTLCache 와 같은 형식)
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        maxsize: int = SEMANTIC_CACHE_SIZE,
+        ttl: Optional[float] = SEMANTIC_CACHE_TTL,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._buckets: OrderedDict[Hashable, list[_Entry]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _expire(self, bucket: Hashable, entries: list[_Entry]) -> list[_Entry]:
+        if self.ttl is not None:
+            now = self._timer()
+            alive = [e for e in entries if now - e.created <= self.ttl]
+            self._size -= len(entries) - len(alive)
+            entries[:] = alive
+        if not entries:
+            self._buckets.pop(bucket, None)
+        return entries
+
+    def _best(self, entries: list[_Entry], vector: np.ndarray) -> tuple[int, float]:
+        if not entries:
+            return -1, -1.0
+        similarities = np.stack([e.vector for e in entries]) @ vector
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+
+    def get(self, bucket: Hashable, query_vector: Sequence[float]) -> Optional[str]:
+        """유사도가 threshold 이상인 가장 가까운 항목의 응답 (없으면 None)"""
+        vector = self._normalize(query_vector)
+        with self._lock:
+            entries = self._expire(bucket, self._buckets.get(bucket, []))
+            index, similarity = self._best(entries, vector)
+            if index < 0 or similarity < self.threshold:
+                self.misses += 1
+                return None
+            self._buckets.move_to_end(bucket)
+            self.hits += 1
+            return entries[index].answer
+
+    def set(self, bucket: Hashable, query_vector: Sequence[float], answer: str) -> None:
+        vector = self._normalize(query_vector)
+        with self._lock:
+            entries = self._expire(bucket, self._buckets.get(bucket, []))
+            index, similarity = self._best(entries, vector)
+            entry = _Entry(vector, answer, self._timer())
+            if index >= 0 and similarity >= self.threshold:
+                # 거의 같은 질문이면 새 응답으로 교체 (버킷 안에 중복 항목을 쌓지 않음)
+                entries[index] = entry
+            else:
+                entries.append(entry)
+                self._size += 1
+            self._buckets[bucket] = entries
+            self._buckets.move_to_end(bucket)
+            while self._size > self.maxsize:
+                oldest_bucket, oldest_entries = next(iter(self._buckets.items()))
+                oldest_entries.pop(0)
+                self._size -= 1
+                if not oldest_entries:
+                    del self._buckets[oldest_bucket]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._size = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self._size,
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
+def replay_model(answer: str) -> GenericFakeChatModel:
+    """
+    캐시된 응답을 token stream 으로 다시 흘려보내는 chat model
+    chat model callback 을 그대로 타므로 graph 의 "messages" stream 으로 실제 LLM 응답과 같은 형태의 chunk 가 전달된다
+    """
+    return GenericFakeChatModel(messages=iter([AIMessage(content=answer)]))
+
+
+_semantic_cache: SemanticCache | None = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+
+def set_semantic_cache(cache: SemanticCache | None) -> None:
+    global _semantic_cache
+    _semantic_cache = cache
@@ -1,13 +1,14 @@
 from langgraph.graph.message import MessagesState
 from typing import Any
 
+# by-reference 모드(payload_store.py)에서는 큰 필드에 "payload:sha256:<hash>" 참조 문자열이 저장됨
 class ClothingRAGState(MessagesState):
     user_query: str
-    embedded_query: list[float] | None
-    candidate_items: list[dict[str, Any]] | None
-    candidate_items_with_metadata: list[dict[str, Any]] | None
+    embedded_query: list[float] | str | None
+    candidate_items: list[dict[str, Any]] | str | None
+    candidate_items_with_metadata: list[dict[str, Any]] | str | None
     external_info: dict[str, Any] | None   
-    ranked_candidates: list[dict[str, Any]] | None
+    ranked_candidates: list[dict[str, Any]] | str | None
     final_recommendation: dict[str, Any] | None
     user_feedback: str | None # e.g., "rerank_cheaper", "rerank_review", "restart", "accept"
     llm_output: str | None
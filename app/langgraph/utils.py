@@ -1,36 +1,425 @@
-
+import os
+import threading
+import numpy as np
 from typing import Any
 from langgraph.graph import StateGraph
 
-def embedding_query(query: str) -> list[float]:
-    return [hash(word) / 1e18 for word in query.split()][:5]
+from .vector_index import VectorIndex
+from .ivf_index import IVFPQIndex
+from .multi_vector_index import RRF_K, MultiVectorIndex
+from .facet_index import FacetIndex
+from .bm25_index import BM25Index, document_text
+from .embedding_store import EmbeddingStore
+from .embedding_service import get_embedding_service
+from .product_repository import get_product_repository
+from .reranker import CAPTION_FIELDS, FEEDBACK_WEIGHTS, get_reranker
 
+# mmap 임베딩 저장소 경로 (embedding_store.py). worker 간 카탈로그 메모리 공유를 위해 우선 사용
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH")
+# 카탈로그 임베딩 인덱스 (.npz) 경로. 둘 다 설정되지 않은 경우 mock 데이터 사용
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH")
+# 쿼리 문자열에서 facet 필터 자동 생성 여부 (hard pre-filter 이므로 기본 off, configurable["auto_filters"] 로 요청별 변경)
+AUTO_FACET_FILTERS = os.getenv("AUTO_FACET_FILTERS", "0") == "1"
 
-def search_vector_db(query: str , k:int = 3) -> list[dict[str, Any]]:
-    return [
-        {"product_id": "item_A", "name": "Classic White Shirt", "description": "A timeless white shirt."},
-        {"product_id": "item_B", "name": "Ripped Denim Jeans", "description": "Stylish ripped jeans."},
-        {"product_id": "item_C", "name": "Summer Floral Dress", "description": "Light and airy summer dress for warm weather."},
-        {"product_id": "item_D", "name": "Silk Blouse", "description": "Elegant silk blouse."},
-        {"product_id": "item_E", "name": "Slim-fit Jeans", "description": "Modern slim-fit jeans."},
-        {"product_id": "item_F", "name": "Evening Gown", "description": "Formal evening gown."},
-        {"product_id": "item_G", "name": "Casual T-shirt", "description": "Comfortable casual t-shirt."},
-    ][:k]
-    
+_MOCK_PRODUCTS = [
+    {"product_id": "item_A", "name": "Classic White Shirt", "description": "A timeless white shirt."},
+    {"product_id": "item_B", "name": "Ripped Denim Jeans", "description": "Stylish ripped jeans."},
+    {"product_id": "item_C", "name": "Summer Floral Dress", "description": "Light and airy summer dress for warm weather."},
+    {"product_id": "item_D", "name": "Silk Blouse", "description": "Elegant silk blouse."},
+    {"product_id": "item_E", "name": "Slim-fit Jeans", "description": "Modern slim-fit jeans."},
+    {"product_id": "item_F", "name": "Evening Gown", "description": "Formal evening gown."},
+    {"product_id": "item_G", "name": "Casual T-shirt", "description": "Comfortable casual t-shirt."},
+]
 
-def get_product_details(product_ids: list[str]) -> list[dict[str, Any]]:
+_vector_index: VectorIndex | IVFPQIndex | MultiVectorIndex | None = None
+_embedding_store: EmbeddingStore | None = None
+_facet_index: FacetIndex | None = None
+_facet_source: Any = None
+# _facet_index 가 반영한 벡터 인덱스 변경 버전 (ChangeLog.version)
+_facet_version = 0
+# (facet 인덱스, 버전, facet row → IVF-PQ key) — IVF-PQ 인덱스 facet 필터용
+_ivf_keys: tuple[FacetIndex, int, np.ndarray] | None = None
+_facet_lock = threading.Lock()
+_bm25_index: BM25Index | None = None
+_bm25_source: Any = None
+# _bm25_index 가 반영한 벡터 인덱스 변경 버전 (ChangeLog.version)
+_bm25_version = 0
+_bm25_lock = threading.Lock()
+# 동기화(색인)는 한 번에 하나만, background thread 에서
+_bm25_sync_lock = threading.Lock()
+_bm25_sync_thread: threading.Thread | None = None
+
+async def embedding_query(query: str) -> list[float]:
+    """
+    쿼리 임베딩 (embedding_service 의 캐시 + micro-batch 를 거쳐 provider 호출)
+    """
+    return await get_embedding_service().aembed_query(query)
+
+
+def load_vector_index(path: str) -> VectorIndex | IVFPQIndex | MultiVectorIndex:
+    """
+    .npz 파일에서 인덱스 로드. 저장된 키로 IVF-PQ(ANN) / 캡션 필드별 multi-vector / exact 인덱스 구분
+    """
+    with np.load(path, allow_pickle=True) as data:
+        files = data.files
+    if "coarse_centroids" in files:
+        return IVFPQIndex.load(path)
+    if "field_vectors" in files:
+        return MultiVectorIndex.load(path)
+    return VectorIndex.load(path)
+
+
+def get_embedding_store() -> EmbeddingStore | None:
+    """
+    프로세스 전역 mmap 임베딩 저장소 반환 (최초 호출 시 EMBEDDING_STORE_PATH 를 mmap)
+    """
+    global _embedding_store
+    if _embedding_store is None and EMBEDDING_STORE_PATH and os.path.exists(EMBEDDING_STORE_PATH):
+        _embedding_store = EmbeddingStore(EMBEDDING_STORE_PATH)
+    return _embedding_store
+
+
+def get_vector_index() -> VectorIndex | IVFPQIndex | MultiVectorIndex | None:
+    """
+    프로세스 전역 벡터 인덱스 반환
+    최초 호출 시 EMBEDDING_STORE_PATH(mmap, zero-copy) → VECTOR_INDEX_PATH(.npz) 순서로 로드
+    """
+    global _vector_index
+    if _vector_index is None:
+        store = get_embedding_store()
+        if store is not None:
+            _vector_index = VectorIndex.from_store(store)
+        elif VECTOR_INDEX_PATH and os.path.exists(VECTOR_INDEX_PATH):
+            _vector_index = load_vector_index(VECTOR_INDEX_PATH)
+    return _vector_index
+
+
+def set_vector_index(index: VectorIndex | IVFPQIndex | MultiVectorIndex | None) -> None:
+    """프로세스 전역 벡터 인덱스 교체 (카탈로그 재색인, 테스트용)"""
+    global _vector_index
+    _vector_index = index
+
+
+def get_facet_index() -> FacetIndex | None:
+    """
+    벡터 인덱스와 같은 row 순서의 facet bitmap 인덱스 반환
+    벡터 인덱스 메타데이터의 structured_attributes 로 생성하고, 이후 변경(ChangeLog)은 add / remove 를 같은 순서로 재실행하여
+    swap-remove 된 row 까지 벡터 인덱스와 일치시킨다 (같은 크기의 교체도 반영)
+    벡터 인덱스가 교체되었거나 변경 기록이 잘렸거나 row 수가 어긋나면 다시 생성 — 어긋난 row 의 mask 는 반환하지 않음
+    """
+    global _facet_index, _facet_source, _facet_version
+    index = get_vector_index()
+    if index is None:
+        return None
+    with _facet_lock:
+        version = _catalog_version(index)
+        if _facet_index is not None and _facet_source is index and _facet_version == version:
+            return _facet_index
+        changes = getattr(index, "changes", None)
+        operations = None
+        if _facet_index is not None and _facet_source is index and changes is not None:
+            operations = changes.operations_since(_facet_version, version)
+        if operations is not None:
+            for removed, product_ids in operations:
+                if removed:
+                    _facet_index.remove(product_ids)
+                else:
+                    _facet_index.add(product_ids, [_structured_attributes(index, pid) for pid in product_ids])
+        if operations is None or len(_facet_index) != len(index):
+            product_ids = list(index.ids)
+            _facet_index = FacetIndex.build(product_ids, [_structured_attributes(index, pid) for pid in product_ids])
+        _facet_source, _facet_version = index, version
+        return _facet_index
+
+
+def _structured_attributes(index: Any, product_id: str) -> dict[str, Any] | None:
+    return (index.get_metadata(product_id) or {}).get("structured_attributes")
+
+
+def set_facet_index(facet_index: FacetIndex | None) -> None:
+    """미리 만든 facet 인덱스 사용 (벡터 인덱스 메타데이터에 structured_attributes 가 없는 경우, 현재 벡터 인덱스와 같은 row 순서)"""
+    global _facet_index, _facet_source, _facet_version
+    index = get_vector_index()
+    with _facet_lock:
+        _facet_index, _facet_source = facet_index, index
+        _facet_version = 0 if index is None else _catalog_version(index)
+
+
+def _catalog_version(index: Any) -> int:
+    changes = getattr(index, "changes", None)
+    return changes.version if changes is not None else len(index)
+
+
+def sync_bm25_index() -> BM25Index | None:
+    """
+    벡터 인덱스 메타데이터(상품명, 브랜드, 캡션, 스타일 / 무드 / TPO 태그)로 BM25 인덱스를 동기화 (blocking)
+
+    - 벡터 인덱스가 교체되었거나 변경 기록이 잘렸으면 새 BM25 인덱스를 만든 뒤 교체 (그동안 검색은 이전 인덱스 사용)
+    - 아니면 마지막 동기화 이후 추가 / 갱신 / 삭제된 상품(ChangeLog)만 증분 색인 — 같은 크기의 교체나 캡션 갱신도 반영
+    요청 경로에서는 호출하지 않는다 (start_bm25_sync / 앱 startup 에서 background 로 실행)
+    """
+    global _bm25_index, _bm25_source, _bm25_version
+    index = get_vector_index()
+    if index is None:
+        return None
+    with _bm25_sync_lock:
+        with _bm25_lock:
+            bm25_index, source, synced_version = _bm25_index, _bm25_source, _bm25_version
+        # 색인 중 들어온 변경은 다음 동기화에서 반영되도록 시작 시점의 버전을 기록
+        version = _catalog_version(index)
+        if bm25_index is not None and source is index and synced_version == version:
+            return bm25_index
+        changes = getattr(index, "changes", None)
+        changed = None
+        if bm25_index is not None and source is index and changes is not None:
+            changed = changes.changed_since(synced_version)
+        if changed is None:
+            product_ids = list(index.ids)
+            bm25_index = BM25Index()
+            bm25_index.add(product_ids, (document_text(index.get_metadata(pid) or {}) for pid in product_ids))
+            bm25_index.merge()
+        else:
+            bm25_index.remove([pid for pid in changed if pid not in index])
+            updated = [pid for pid in changed if pid in index]
+            bm25_index.add(updated, [document_text(index.get_metadata(pid) or {}) for pid in updated])
+        with _bm25_lock:
+            _bm25_index, _bm25_source, _bm25_version = bm25_index, index, version
+        return bm25_index
+
+
+def start_bm25_sync() -> None:
+    """BM25 동기화를 background thread 로 시작 (이미 실행 중이면 무시). 앱 startup 과 카탈로그 변경 감지 시 호출"""
+    global _bm25_sync_thread
+    with _bm25_lock:
+        if _bm25_sync_thread is not None and _bm25_sync_thread.is_alive():
+            return
+        _bm25_sync_thread = threading.Thread(target=sync_bm25_index, name="bm25-sync", daemon=True)
+        _bm25_sync_thread.start()
+
+
+def get_bm25_index(wait: bool = False) -> BM25Index | None:
+    """
+    현재 벡터 인덱스의 BM25 인덱스 반환 (요청 경로에서 색인하지 않음)
+    카탈로그가 바뀌었으면 background 동기화를 시작하고 그동안은 이전 상태로 검색, 아직 한 번도 만들지 않았으면 None
+    wait=True 이면 동기화가 끝날 때까지 기다림 (스크립트 / 벤치마크용)
+    """
+    index = get_vector_index()
+    if index is None:
+        return None
+    if wait:
+        return sync_bm25_index()
+    with _bm25_lock:
+        bm25_index, source, synced_version = _bm25_index, _bm25_source, _bm25_version
+    if source is not index or synced_version != _catalog_version(index):
+        start_bm25_sync()
+    return bm25_index if source is index else None
+
+
+def set_bm25_index(bm25_index: BM25Index | None) -> None:
+    """미리 만든 BM25 인덱스 사용 (벡터 인덱스 메타데이터에 캡션이 없는 경우)"""
+    global _bm25_index, _bm25_source, _bm25_version
+    index = get_vector_index()
+    with _bm25_lock:
+        _bm25_index, _bm25_source = bm25_index, index
+        _bm25_version = 0 if index is None else _catalog_version(index)
+
+
+def _facet_allow_mask(
+    filters: dict[str, Any] | None,
+    query_text: str | None,
+    ) -> tuple[FacetIndex | None, np.ndarray | None]:
+    """
+    facet 필터(없으면 query_text 에서 자동 생성)에 해당하는 벡터 인덱스 row mask
+    필터가 없거나 조건을 만족하는 상품이 없으면 mask 는 None (필터 없이 검색)
+    """
+    facet_index = get_facet_index() if filters or query_text else None
+    if facet_index is None:
+        return None, None
+    if filters is None:
+        filters = facet_index.filters_from_query(query_text) or None
+    if not filters:
+        return facet_index, None
+    allow_mask = facet_index.allow_mask(filters)
+    if not allow_mask.any():
+        print(f"facet filter {filters} 에 해당하는 상품이 없어 필터 없이 검색합니다.")
+        return facet_index, None
+    return facet_index, allow_mask
+
+
+def _ivf_row_keys(index: IVFPQIndex, facet_index: FacetIndex) -> np.ndarray:
+    """facet row → IVF-PQ 상품 key 배열 (facet 인덱스가 바뀔 때까지 재사용, 쿼리마다 ID 를 변환하지 않음)"""
+    global _ivf_keys
+    with _facet_lock:
+        if _ivf_keys is None or _ivf_keys[0] is not facet_index or _ivf_keys[1] != _facet_version:
+            _ivf_keys = (facet_index, _facet_version, index.keys_of(facet_index.ids))
+        return _ivf_keys[2]
+
+
+def search_vector_db(
+    query: list[float],
+    k:int = 3,
+    nprobe: int | None = None,
+    fusion: str = "weighted",
+    field_weights: dict[str, float] | None = None,
+    filters: dict[str, Any] | None = None,
+    query_text: str | None = None,
+    ) -> list[dict[str, Any]]:
+    """
+    임베딩된 쿼리로 cosine top-k 상품 검색
+
+    Args:
+        nprobe: ANN(IVF-PQ) 인덱스에서 탐색할 inverted list 수 (exact 인덱스에서는 무시)
+        fusion / field_weights: multi-vector 인덱스의 캡션 필드 점수 결합 방식 ("weighted" | "rrf") 과 필드별 가중치
+        filters: StructuredAttributes facet 필터 표현식 (facet_index.py). 허용된 상품 안에서만 검색 (pre-filter)
+        query_text: filters 가 없을 때 쿼리 문자열에 등장하는 facet 값(e.g. "핑크", "셔츠")으로 필터 자동 생성
+
+    Returns:
+        [{"product_id", "score", ...metadata}] (score 내림차순)
+    """
+    index = get_vector_index()
+    if index is None or len(index) == 0:
+        # 카탈로그가 로드되지 않은 개발 환경에서는 mock 데이터 반환
+        return _MOCK_PRODUCTS[:k]
+    facet_index, allow_mask = _facet_allow_mask(filters, query_text)
+    if isinstance(index, IVFPQIndex):
+        allow_keys = None if allow_mask is None else _ivf_row_keys(index, facet_index)[np.flatnonzero(allow_mask)]
+        return index.search(query, k=k, nprobe=nprobe, allow_keys=allow_keys)
+    if isinstance(index, MultiVectorIndex):
+        return index.search(query, k=k, fusion=fusion, weights=field_weights, allow_mask=allow_mask)
+    return index.search(query, k=k, allow_mask=allow_mask)
+
+
+def search_bm25(
+    query_text: str,
+    k: int = 3,
+    filters: dict[str, Any] | None = None,
+    auto_filters: bool = AUTO_FACET_FILTERS,
+    ) -> list[dict[str, Any]]:
+    """
+    캡션 / 태그 BM25 검색 (브랜드, "오버핏", "V넥" 처럼 임베딩이 흐리게 만드는 정확한 토큰 매칭)
+
+    Args:
+        filters / auto_filters: search_vector_db 와 동일한 facet 필터 (BM25 top-k * 10 안에서 post-filter)
+
+    Returns:
+        [{"product_id", "score", ...metadata}] (score 내림차순). 카탈로그가 없으면 []
+    """
+    index = get_vector_index()
+    bm25_index = get_bm25_index()
+    if index is None or bm25_index is None or not query_text:
+        return []
+    facet_index, allow_mask = _facet_allow_mask(filters, query_text if auto_filters else None)
+    allow_ids = None if allow_mask is None else {facet_index.ids[row] for row in np.flatnonzero(allow_mask).tolist()}
     return [
-        {"product_id": "item_A", "name": "Classic White Shirt", "description": "A timeless white shirt."},
-        {"product_id": "item_B", "name": "Ripped Denim Jeans", "description": "Stylish ripped jeans."},
-        {"product_id": "item_C", "name": "Summer Floral Dress", "description": "Light and airy summer dress for warm weather."},
+        {**(index.get_metadata(item["product_id"]) or {}), **item}
+        for item in bm25_index.search(query_text, k=k, allow_ids=allow_ids)
     ]
 
+
+def fuse_search_results(
+    results: dict[str, list[dict[str, Any]]],
+    k: int = 3,
+    weights: dict[str, float] | None = None,
+    rrf_k: int = RRF_K,
+    ) -> list[dict[str, Any]]:
+    """
+    검색 결과 리스트들(e.g. {"vector": [...], "bm25": [...]})을 reciprocal rank fusion 으로 결합
+
+    - 점수 척도가 다른 검색(cosine / BM25)을 순위로만 결합
+    - 각 결과의 원래 점수는 "{name}_score" 로 보존하고, "score" 는 최대 가능 값으로 나눈 fused 점수 (0~1, reranker 입력)
+    - 같은 상품이 여러 리스트에 있으면 먼저 나온 리스트의 항목(메타데이터, field_scores)을 사용
+    """
+    weights = {name: (weights or {}).get(name, 1.0) for name in results}
+    max_fused = sum(weights.values()) / (rrf_k + 1) or 1.0
+    fused: dict[str, dict[str, Any]] = {}
+    for name, items in results.items():
+        for rank, item in enumerate(items):
+            entry = fused.setdefault(item["product_id"], {**item, "score": 0.0})
+            entry["score"] += weights[name] / (rrf_k + 1 + rank) / max_fused
+            entry[f"{name}_score"] = item.get("score", 0.0)
+    return sorted(fused.values(), key=lambda item: item["score"], reverse=True)[:k]
+
+
+
+def get_product_details(product_ids: list[str]) -> list[dict[str, Any]]:
+    """
+    상품 ID 리스트에 대한 상세 메타데이터 반환 (입력 순서 유지, 존재하지 않는 ID 는 제외)
+    MongoDB(캐시 + $in 일괄 조회) → 벡터 인덱스 메타데이터(mmap 임베딩 저장소 포함) → mock 데이터 순서로 사용
+    """
+    repository = get_product_repository()
+    if repository is not None:
+        return repository.get_many(product_ids)
+    index = get_vector_index()
+    if index is None or len(index) == 0:
+        mock_products = {item["product_id"]: item for item in _MOCK_PRODUCTS}
+        return [mock_products[pid] for pid in product_ids if pid in mock_products]
+    details = []
+    for product_id in product_ids:
+        metadata = index.get_metadata(product_id)
+        if metadata is not None:
+            details.append({**metadata, "product_id": product_id})
+    return details
+
+def classify_feedback(user_feedback: str | None) -> str:
+    """
+    사용자 피드백 분류
+
+    Returns:
+        "accept": 종료
+        "rerank": 기존 후보 재정렬만 필요 (임베딩 / 검색 / 상세 조회 생략)
+        "restart": 원래 쿼리로 처음부터 다시 실행
+        "requery": 피드백으로 쿼리를 수정하여 재검색
+    """
+    feedback = (user_feedback or "").strip()
+    if feedback == "accept":
+        return "accept"
+    if feedback in FEEDBACK_WEIGHTS:
+        return "rerank"
+    if feedback == "restart":
+        return "restart"
+    return "requery"
+
+
 def rerank_items(
     items_with_metadata: list[dict[str, Any]],
-    external_info: dict[str, Any]
+    external_info: dict[str, Any],
+    user_feedback: str | None = None,
+    weights: dict[str, float] | None = None,
+    **signals: Any,
     ) -> list[dict[str, Any]]:
-    
-    return items_with_metadata
+    """
+    다중 신호(검색 점수, 캡션 필드별 유사도, 가격, 인기도, 속성 일치) 가중합으로 후보 재정렬 (reranker.py)
+
+    Args:
+        user_feedback: rerank 피드백(e.g. "rerank_cheaper")이면 해당 신호의 가중치를 높임
+        weights: 신호별 가중치 (config["configurable"]["rerank_weights"])
+        **signals: query_vector / query_text / retrieval_scores / caption_scores / preferred_attributes
+    """
+    weights = {**(weights or {}), **FEEDBACK_WEIGHTS.get(user_feedback, {})}
+    return get_reranker().rerank(items_with_metadata, weights=weights, **signals)
+
+
+def caption_scores_of(
+    items_with_metadata: list[dict[str, Any]],
+    candidates_by_id: dict[str, dict[str, Any]],
+    ) -> np.ndarray | None:
+    """
+    multi-vector 검색 결과의 캡션 필드별 점수를 reranker 입력 (n x len(CAPTION_FIELDS)) 으로 변환
+    모든 후보에 필드 점수가 있을 때만 반환 (없으면 reranker 가 상품의 caption_embeddings 로 계산)
+    """
+    field_scores = [candidates_by_id.get(item["product_id"], {}).get("field_scores") for item in items_with_metadata]
+    if not field_scores or any(scores is None for scores in field_scores):
+        return None
+    return np.array([[scores.get(field, 0.0) for field in CAPTION_FIELDS] for scores in field_scores], dtype=np.float32)
+
+
+def search_query_text(state: dict[str, Any]) -> str:
+    """facet 필터 / 속성 일치에 사용할 쿼리 문자열 (쿼리 수정 피드백이 있으면 함께 사용)"""
+    query_text = state.get("user_query") or ""
+    user_feedback = state.get("user_feedback")
+    if user_feedback and classify_feedback(user_feedback) == "requery":
+        query_text = f"{query_text} {user_feedback}"
+    return query_text
 
 
 def modify_query(query: str, user_feedback: str) -> str:
@@ -0,0 +1,298 @@
+import numpy as np
+from collections import deque
+from typing import TYPE_CHECKING, Any, Iterable
+
+if TYPE_CHECKING:
+    from .embedding_store import EmbeddingStore
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    각 행을 L2 정규화한 float32 행렬을 반환 (norm이 0인 행은 그대로 0으로 유지)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    점수 벡터에서 상위 k개의 index를 점수 내림차순으로 반환
+    전체 정렬 대신 argpartition(O(n)) 후 k개만 정렬
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class ChangeLog:
+    """
+    add / remove 된 상품 ID 기록 (BM25 / facet 처럼 벡터 인덱스로 만드는 파생 인덱스의 증분 동기화용)
+    version 은 변경된 ID 하나마다 1 증가, 최근 max_entries 개까지만 보관
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.version = 0
+        self._entries: deque[tuple[int, str, bool]] = deque(maxlen=max_entries)
+
+    def record(self, product_ids: Iterable[str], removed: bool = False) -> None:
+        for product_id in product_ids:
+            self.version += 1
+            self._entries.append((self.version, product_id, removed))
+
+    def _since(self, version: int, until: int | None) -> list[tuple[int, str, bool]] | None:
+        until = self.version if until is None else until
+        if version >= until:
+            return []
+        entries = list(self._entries)
+        if not entries or entries[0][0] > version + 1:
+            return None
+        return [entry for entry in entries if version < entry[0] <= until]
+
+    def changed_since(self, version: int, until: int | None = None) -> set[str] | None:
+        """version 이후 추가 / 갱신 / 삭제된 ID (기록이 잘려 알 수 없으면 None → 전체 재동기화)"""
+        entries = self._since(version, until)
+        return None if entries is None else {product_id for _, product_id, _ in entries}
+
+    def operations_since(self, version: int, until: int | None = None) -> list[tuple[bool, list[str]]] | None:
+        """
+        version 이후의 add / remove 를 일어난 순서대로 (삭제 여부, ID 목록) 으로 반환 (연속된 같은 연산은 묶음)
+        row 순서가 벡터 인덱스와 같아야 하는 파생 인덱스(FacetIndex)는 같은 순서로 재실행해야 swap-remove 결과가 일치
+        """
+        entries = self._since(version, until)
+        if entries is None:
+            return None
+        operations: list[tuple[bool, list[str]]] = []
+        for _, product_id, removed in entries:
+            if not operations or operations[-1][0] != removed:
+                operations.append((removed, []))
+            operations[-1][1].append(product_id)
+        return operations
+
+
+class VectorIndex:
+    """
+    상품 카탈로그 임베딩을 하나의 연속된 float32 행렬로 보관하는 in-process 벡터 인덱스
+
+    - 모든 행은 L2 정규화되어 저장되므로 cosine 유사도 = 행렬-벡터 곱 한 번
+    - add / remove 는 전체 재구축 없이 수행
+        - add : capacity 를 2배씩 늘리는 버퍼에 append (amortized O(1))
+        - remove : 삭제 위치에 마지막 행을 옮겨오는 swap-remove (O(d))
+    - from_store() 로 만든 인덱스는 mmap 된 벡터와 저장소의 ids / id→row 표를 복사 없이 그대로 사용
+      (add / remove 가 처음 호출될 때만 프로세스 로컬 버퍼로 복사)
+    """
+
+    # float16 저장소를 검색할 때 float32 로 변환하는 행 단위 chunk 크기
+    SCORE_CHUNK_ROWS = 1024
+    # allow_mask 로 허용된 row 비율이 이 값보다 작으면 허용된 row 만 모아서 점수 계산
+    SELECTIVE_FILTER_RATIO = 0.25
+
+    def __init__(self, dim: int, initial_capacity: int = 1024):
+        self.dim = dim
+        self._vectors = np.zeros((max(initial_capacity, 1), dim), dtype=np.float32)
+        self._ids: list[str] = []
+        # row 별 메타데이터. None 은 저장소에서 읽는 row, 리스트 자체가 None 이면 저장소 표를 공유 중
+        self._metadata: list[dict[str, Any] | None] | None = []
+        self._id_to_row: dict[str, int] = {}
+        self._store: "EmbeddingStore | None" = None
+        self.changes = ChangeLog()
+
+    @classmethod
+    def from_store(cls, store: "EmbeddingStore") -> "VectorIndex":
+        """
+        mmap 임베딩 저장소 위에 인덱스 생성 (벡터 / ids / id→row 표 복사, 메타데이터 역직렬화 없음)
+        메타데이터는 get_metadata() 호출 시 저장소에서 읽음
+        """
+        index = cls(dim=store.dim, initial_capacity=1)
+        index._vectors = store.vectors
+        index._ids = store.ids
+        index._id_to_row = store.id_to_row
+        index._metadata = None
+        index._store = store
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._id_to_row
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """현재 유효한 (정규화된) 벡터 행렬 view"""
+        return self._vectors[: len(self._ids)]
+
+    @property
+    def ids(self) -> list[str]:
+        return self._ids
+
+    def _own_tables(self) -> None:
+        """저장소와 공유 중인 ids / id→row 표를 처음 수정하기 전에 프로세스 로컬로 복사"""
+        if self._metadata is None:
+            self._ids = list(self._ids)
+            self._id_to_row = dict(self._id_to_row)
+            self._metadata = [None] * len(self._ids)
+
+    def _ensure_capacity(self, required: int) -> None:
+        capacity = self._vectors.shape[0]
+        if required <= capacity and self._vectors.flags.writeable:
+            return
+        new_capacity = max(required, capacity * 2)
+        grown = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        # mmap(read-only) 또는 float16 벡터는 여기서 프로세스 로컬 float32 버퍼로 복사됨
+        grown[: len(self._ids)] = self._vectors[: len(self._ids)]
+        self._vectors = grown
+
+    def add(
+        self,
+        product_ids: Iterable[str],
+        vectors: np.ndarray,
+        metadata: Iterable[dict[str, Any]] | None = None,
+    ) -> None:
+        """
+        벡터 추가. 이미 존재하는 product_id 는 벡터/메타데이터를 덮어씀
+        """
+        product_ids = list(product_ids)
+        vectors = normalize_rows(vectors)
+        if vectors.shape != (len(product_ids), self.dim):
+            raise ValueError(
+                f"vectors shape {vectors.shape} 이 ({len(product_ids)}, {self.dim}) 와 일치하지 않습니다."
+            )
+        metadata = list(metadata) if metadata is not None else [{} for _ in product_ids]
+        if len(metadata) != len(product_ids):
+            raise ValueError("metadata 개수가 product_ids 개수와 일치하지 않습니다.")
+
+        self._own_tables()
+        self._ensure_capacity(len(self._ids) + len(product_ids))
+        for product_id, vector, meta in zip(product_ids, vectors, metadata):
+            row = self._id_to_row.get(product_id)
+            if row is None:
+                row = len(self._ids)
+                self._ids.append(product_id)
+                self._metadata.append(meta)
+                self._id_to_row[product_id] = row
+            else:
+                self._metadata[row] = meta
+            self._vectors[row] = vector
+        self.changes.record(product_ids)
+
+    def remove(self, product_ids: Iterable[str]) -> int:
+        """
+        벡터 삭제 (swap-remove). 삭제된 개수를 반환
+        """
+        removed = 0
+        self._own_tables()
+        for product_id in product_ids:
+            row = self._id_to_row.pop(product_id, None)
+            if row is None:
+                continue
+            if not self._vectors.flags.writeable:
+                self._ensure_capacity(len(self._ids))
+            last = len(self._ids) - 1
+            if row != last:
+                last_id = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = last_id
+                self._metadata[row] = self._metadata[last]
+                self._id_to_row[last_id] = row
+            self._ids.pop()
+            self._metadata.pop()
+            self.changes.record([product_id], removed=True)
+            removed += 1
+        return removed
+
+    def get_metadata(self, product_id: str) -> dict[str, Any] | None:
+        row = self._id_to_row.get(product_id)
+        if row is None:
+            return None
+        metadata = None if self._metadata is None else self._metadata[row]
+        if metadata is None and self._store is not None:
+            return self._store.get_metadata(product_id)
+        return metadata
+
+    def _score(self, query: np.ndarray) -> np.ndarray:
+        vectors = self.vectors
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        # float16 저장소는 전체를 한 번에 변환하지 않고 chunk 단위로 재사용 버퍼에 float32 변환 후 계산
+        scores = np.empty(vectors.shape[0], dtype=np.float32)
+        buffer = np.empty((self.SCORE_CHUNK_ROWS, self.dim), dtype=np.float32)
+        for start in range(0, vectors.shape[0], self.SCORE_CHUNK_ROWS):
+            chunk = vectors[start : start + self.SCORE_CHUNK_ROWS]
+            converted = buffer[: chunk.shape[0]]
+            np.copyto(converted, chunk)
+            scores[start : start + chunk.shape[0]] = converted @ query
+        return scores
+
+    def search_rows(
+        self,
+        query: np.ndarray | list[float],
+        k: int = 3,
+        allow_mask: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        cosine top-k 검색. (row index 배열, score 배열) 반환
+
+        Args:
+            allow_mask: 검색 대상 row 의 bool mask (facet_index.py). 허용된 row 가 적으면
+                해당 row 만 모아서 계산하므로 선택적인 필터일수록 오히려 빨라짐
+        """
+        if len(self._ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize_rows(query)[0]
+        if query.shape[0] != self.dim:
+            raise ValueError(f"query 차원 {query.shape[0]} 이 인덱스 차원 {self.dim} 과 다릅니다.")
+        if allow_mask is None:
+            scores = self._score(query)
+            rows = top_k_indices(scores, k)
+            return rows, scores[rows]
+
+        allowed = np.flatnonzero(allow_mask[: len(self._ids)])
+        if allowed.shape[0] < len(self._ids) * self.SELECTIVE_FILTER_RATIO:
+            scores = self.vectors[allowed].astype(np.float32, copy=False) @ query
+            top = top_k_indices(scores, k)
+            return allowed[top], scores[top]
+        scores = self._score(query)
+        scores[~allow_mask[: len(self._ids)]] = -np.inf
+        rows = top_k_indices(scores, min(k, allowed.shape[0]))
+        return rows, scores[rows]
+
+    def search(
+        self,
+        query: np.ndarray | list[float],
+        k: int = 3,
+        allow_mask: np.ndarray | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        cosine top-k 검색 결과를 {"product_id", "score", **metadata} 형태로 반환
+        """
+        rows, scores = self.search_rows(query, k, allow_mask=allow_mask)
+        return [
+            {**(self.get_metadata(self._ids[row]) or {}), "product_id": self._ids[row], "score": float(score)}
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def save(self, path: str) -> None:
+        """인덱스를 .npz 파일로 저장"""
+        np.savez(
+            path,
+            vectors=self.vectors,
+            ids=np.asarray(self._ids, dtype=object),
+            metadata=np.asarray([self.get_metadata(product_id) or {} for product_id in self._ids], dtype=object),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        """save() 로 저장한 .npz 파일에서 인덱스 로드"""
+        data = np.load(path, allow_pickle=True)
+        vectors = data["vectors"]
+        index = cls(dim=vectors.shape[1], initial_capacity=vectors.shape[0])
+        index.add(data["ids"].tolist(), vectors, data["metadata"].tolist())
+        return index
@@ -5,6 +5,9 @@ import uuid
 from dotenv import load_dotenv
 
 from .router import websocket
+from .langgraph.executor import shutdown_node_executor
+from .langgraph.llm_registry import warm_up
+from .langgraph.utils import start_bm25_sync
 
 load_dotenv()
 # os.environ["LANGSMITH_TRACING"] = "true"
@@ -18,6 +21,11 @@ app = FastAPI(
 )
 
 app.include_router(websocket.router)
+# 카탈로그 BM25 색인은 첫 요청이 아니라 시작 시 background 에서 (완료 전까지 hybrid 검색은 벡터 검색만 사용)
+app.add_event_handler("startup", start_bm25_sync)
+# 기본 설정(llm_model "auto")에서 쓰일 모델의 chat client 를 미리 생성
+app.add_event_handler("startup", warm_up)
+app.add_event_handler("shutdown", shutdown_node_executor)
 
 
 @app.get("/" , tags=["root"])
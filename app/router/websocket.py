@@ -5,6 +5,8 @@ from fastapi.encoders import jsonable_encoder
 
 # Import the compiled graph object
 from app.langgraph.graph import graph
+from app.langgraph.executor import run_blocking
+from app.langgraph.payload_store import load_payload
 
 router = APIRouter(
     tags=["websocket"],
@@ -26,10 +28,11 @@ async def websocket_endpoint(websocket: WebSocket):
         "configurable": {
             "thread_id": session_id,
             "llm_model" : {
-                "model": "gemini-1.5-flash",
+                "model": "auto", # llm_router 가 요청 크기 / 관측 latency / 오류에 따라 선택 (모델 이름을 쓰면 고정)
                 "prompt_template": "You are a helpful assistant that recommends clothing items based on the user's query. ",
             },
-            "k": 3
+            "k": 50, # rerank_candidates_node 에서 재정렬할 over-fetch 후보 수 (reranker.py)
+            "nprobe": 16, # ANN(IVF-PQ) 인덱스 사용 시 탐색할 list 수 (ivf_index.py 리포트 참고)
         },
     }
     print(f"New client connected: {session_id}")
@@ -94,7 +97,9 @@ async def websocket_endpoint(websocket: WebSocket):
                             await websocket.send_json({
                                 "status": updated_state_name,
                                 "node": node_name,
-                                "response": updated_state_value
+                                # by-reference 모드에서는 state 에 참조만 있으므로 실제 값으로 변환하여 전송
+                                # (캐시 miss 시 SQLite / MongoDB 조회이므로 event loop 밖에서)
+                                "response": await run_blocking(load_payload, updated_state_value)
                             })
                 else:
                     ...    
@@ -0,0 +1,562 @@
+"""
+카탈로그 전체 배치 캡셔닝 파이프라인
+
+manifest(JSONL, 한 줄에 상품 그룹 하나) → 이미지 전처리(process pool) → VLM 호출(async, 동시성 제한 + 공유 LLMScheduler 의 RPM/TPM 제한)
+→ 결과를 끝나는 순서대로 JSONL sink 에 기록
+
+    {"product_group_id": "674732", "image_paths": ["front.jpg", "back.jpg", "model.jpg"]}
+
+뷰가 누락된 그룹은 있는 이미지만 적는다 (정면 → 후면 → 모델 착용샷 순서). 합칠 배치는 뷰 수마다 이미지 토큰 예산에 맞춰 고른다
+
+결과는 caption_cache(SQLite) 에 이미지 / 프롬프트 / 스키마 버전 / 모델 기준으로 저장되므로
+중단 후 같은 명령으로 이어서 실행할 수 있고, 프롬프트 변경 후 재실행하면 영향 받는 그룹만 다시 캡셔닝한다
+
+    python -m caption.batch_caption manifest.jsonl captions.jsonl --concurrency 32 --rpm 2000 --tpm 4000000
+    python -m caption.batch_caption --synthetic 500 --dry-run-latency 2.0 /tmp/manifest.jsonl /tmp/captions.jsonl
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from app.langgraph.llm_scheduler import LLMScheduler, Priority, get_llm_scheduler
+
+from .caption_cache import CaptionCache, caption_cache_key, source_fingerprint
+from .image_layout import DEFAULT_IMAGE_TOKEN_BUDGET, Layout, image_tokens, plan_layout
+from .image_preprocessing import EncodedImage, preprocess_to_base64
+from .output_parsing import bind_native_output, get_path, native_tool, set_path, sub_overrides
+
+# 텍스트 토큰 추정 (한/영 혼합 기준 대략치, 응답 후 실제 usage 로 정산)
+CHARS_PER_TOKEN = 3
+# MasterCaption JSON 출력 토큰 추정치
+OUTPUT_TOKEN_ESTIMATE = 2048
+
+
+def estimate_text_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+# --- 1. Manifest / Sink ---
+
+def read_manifest(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_completed_ids(path: str) -> dict[str, str]:
+    """sink 에 성공으로 기록된 product_group_id → cache key (같은 key 면 재실행 시 다시 쓰지 않음)"""
+    if not os.path.exists(path):
+        return {}
+    completed = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # 중단 시 잘린 마지막 줄
+                continue
+            if record.get("status") == "ok":
+                completed[record["product_group_id"]] = record.get("cache_key")
+    return completed
+
+
+class JsonlSink:
+    """결과를 끝나는 순서대로 한 줄씩 append (줄 단위 flush → 중단되어도 완료분은 보존)"""
+
+    def __init__(self, path: str, mode: str = "a"):
+        self.path = path
+        self._file = open(path, mode, encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    succeeded: int = 0
+    cached: int = 0
+    failed: int = 0
+    skipped: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    payload_bytes: int = 0
+    repaired: int = 0
+    sub_retries: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.cached + self.failed
+
+    @property
+    def products_per_minute(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed * 60 if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.processed}/{self.total - self.skipped} 처리 (VLM {self.succeeded}, 캐시 {self.cached}, 실패 {self.failed}, skip {self.skipped}) "
+            f"| {self.products_per_minute:.1f} products/min "
+            f"| 복구 {self.repaired}, sub-object 재요청 {self.sub_retries} "
+            f"| tokens in {self.input_tokens:,} / out {self.output_tokens:,} "
+            f"| image payload {self.payload_bytes / max(self.succeeded, 1) / 1024:.1f}KB/req"
+        )
+
+
+# --- 2. Pipeline ---
+
+@dataclass
+class _BatchContext:
+    vlm_chain: Any
+    model: Any
+    parser: Any
+    repair_prompt: Any
+    output_mode: str
+    native_overrides: dict[str, dict]
+    repair_chains: dict[str, Any]
+    max_repair_rounds: int
+    format_instructions: str
+    prompt_text: str
+    prompt_tokens: int
+    schema_version: str
+    model_name: str
+    scheduler: LLMScheduler
+    cache: CaptionCache
+    completed: dict[str, str]
+    inflight: dict[str, asyncio.Future]
+    pool: ProcessPoolExecutor
+    target_size: int
+    concat_direction: str
+    image_token_budget: int
+    layouts: dict[int, Layout]
+    jpeg_quality: Optional[int]
+    jpeg_subsampling: Optional[str]
+    max_retries: int
+
+
+def _model_name(model) -> str:
+    for attr in ("model", "model_name", "name"):
+        value = getattr(model, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    return type(model).__name__
+
+
+def _layout(item: dict, ctx: _BatchContext) -> Layout:
+    """그룹의 뷰 수(누락된 뷰 제외)에 맞는 배치 (뷰 수별로 한 번만 계산)"""
+    n_views = len(item["image_paths"])
+    layout = ctx.layouts.get(n_views)
+    if layout is None:
+        if ctx.concat_direction == "auto":
+            layout = plan_layout(n_views, ctx.model_name, ctx.image_token_budget, reserved_tokens=ctx.prompt_tokens)
+        else:
+            layout = Layout.strip(n_views, ctx.target_size, ctx.concat_direction)
+        ctx.layouts[n_views] = layout
+    return layout
+
+
+async def _preprocess(item: dict, layout: Layout, ctx: _BatchContext) -> EncodedImage:
+    return await asyncio.get_running_loop().run_in_executor(
+        ctx.pool, preprocess_to_base64, item["image_paths"], layout.tile_size, ctx.concat_direction,
+        ctx.jpeg_quality, ctx.jpeg_subsampling, layout,
+    )
+
+
+async def _caption_group(item: dict, ctx: _BatchContext) -> Optional[dict]:
+    """
+    상품 그룹 하나를 캡셔닝하여 sink 에 쓸 record 반환 (sink 에 같은 결과가 이미 있으면 None)
+    캐시 hit 이면 VLM 을 호출하지 않고, 원본 이미지가 그대로면 전처리도 하지 않는다
+    """
+    group_id = item["product_group_id"]
+    start = time.perf_counter()
+    encoded = None
+    try:
+        layout = _layout(item, ctx)
+        fingerprint = source_fingerprint(
+            item["image_paths"], layout.tile_size, f"{layout.rows}x{layout.cols}",
+            (ctx.jpeg_quality, ctx.jpeg_subsampling),
+        )
+        image_hash = ctx.cache.image_hash(fingerprint)
+        if image_hash is None:
+            encoded = await _preprocess(item, layout, ctx)
+            image_hash = encoded.sha256
+            ctx.cache.set_image_hash(fingerprint, image_hash)
+    except Exception as e:
+        return {"product_group_id": group_id, "status": "error", "stage": "preprocess", "error": repr(e)}
+
+    # 배치 설명도 프롬프트의 일부이므로 key 에 포함
+    prompt_text = ctx.prompt_text + layout.describe()
+    key = caption_cache_key(image_hash, prompt_text, ctx.schema_version, ctx.model_name)
+    if ctx.completed.get(group_id) == key:
+        return None
+    record = {"product_group_id": group_id, "cache_key": key}
+    cached = ctx.cache.get(key)
+    if cached is not None:
+        return {**record, "status": "ok", "cached": True, "caption": cached}
+
+    pending = ctx.inflight.get(key)
+    if pending is not None:
+        # 같은 입력(이미지 내용이 같은 다른 그룹)이 이미 요청 중이면 그 결과를 공유
+        shared = await asyncio.shield(pending)
+        if shared["status"] != "ok":
+            return {**shared, "product_group_id": group_id}
+        return {**record, "status": "ok", "cached": True, "caption": shared["caption"]}
+
+    pending = ctx.inflight[key] = asyncio.get_running_loop().create_future()
+    result = {**record, "status": "error", "stage": "vlm", "error": "cancelled"}
+    try:
+        result = await _call_vlm(item, record, layout, prompt_text, image_hash, encoded, start, ctx)
+        return result
+    finally:
+        del ctx.inflight[key]
+        pending.set_result(result)
+
+
+async def _call_vlm(
+    item: dict,
+    record: dict,
+    layout: Layout,
+    prompt_text: str,
+    image_hash: str,
+    encoded: Optional[EncodedImage],
+    start: float,
+    ctx: _BatchContext,
+) -> dict:
+    if encoded is None:
+        # 이미지는 그대로지만 프롬프트 / 스키마 / 모델이 바뀐 경우
+        try:
+            encoded = await _preprocess(item, layout, ctx)
+        except Exception as e:
+            return {**record, "status": "error", "stage": "preprocess", "error": repr(e)}
+    record = {**record, "payload_bytes": encoded.payload_bytes}
+
+    estimated = ctx.prompt_tokens + image_tokens(*encoded.size, ctx.model_name) + OUTPUT_TOKEN_ESTIMATE
+    inputs = {
+        "image_data": encoded.data,
+        "layout_description": layout.describe(),
+        "format_instructions": ctx.format_instructions,
+    }
+    try:
+        message = await _ainvoke_limited(ctx.vlm_chain, inputs, estimated, ctx)
+    except Exception as e:
+        return {**record, "status": "error", "stage": "vlm", "error": repr(e)}
+
+    usage = message.usage_metadata or {}
+    input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    # 복구해도 검증에 실패한 sub-object 만 다시 요청 (전체 요청을 버리지 않음)
+    # 파싱 중 예상하지 못한 예외도 이 상품의 parse 오류로 기록 (worker 가 죽으면 run_batch 전체가 중단됨)
+    try:
+        parsed = ctx.parser.repair(message)
+    except Exception as e:
+        return {**record, "status": "error", "stage": "parse", "error": repr(e), "raw": message.content}
+    repairs, retried = list(parsed.repairs), []
+    for _ in range(ctx.max_repair_rounds):
+        if parsed.ok:
+            break
+        data = parsed.data
+        for path, errors in parsed.invalid.items():
+            retried.append(path)
+            try:
+                sub_message = await _request_sub_object(path, errors, data, inputs, encoded, ctx)
+            except Exception:
+                continue
+            sub_usage = sub_message.usage_metadata or {}
+            input_tokens += sub_usage.get("input_tokens", 0)
+            output_tokens += sub_usage.get("output_tokens", 0)
+            sub_parsed = ctx.parser.for_path(path).repair(sub_message)
+            repairs.extend(f"{path}:{repair}" for repair in sub_parsed.repairs)
+            data = set_path(data, path, sub_parsed.value.model_dump(mode="json") if sub_parsed.ok else sub_parsed.data)
+        parsed = ctx.parser.repair(data)
+        repairs.extend(parsed.repairs)
+
+    record = {
+        **record,
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    if repairs:
+        record["repairs"] = repairs
+    if retried:
+        record["sub_retries"] = retried
+    if not parsed.ok:
+        return {**record, "status": "error", "stage": "parse", "invalid": parsed.invalid, "raw": message.content}
+    caption = parsed.value.model_dump(mode="json")
+    ctx.cache.put(
+        record["cache_key"], caption, image_hash, prompt_text, ctx.schema_version, ctx.model_name,
+        usage=record["usage"],
+    )
+    return {**record, "status": "ok", "caption": caption}
+
+
+async def _ainvoke_limited(chain, inputs: dict, estimated: int, ctx: _BatchContext):
+    """RPM/TPM 한도 안에서 BATCH 우선순위로 VLM 호출 (429 등은 jitter backoff 후 재시도, 마지막 실패는 그대로 raise)"""
+    return await ctx.scheduler.run(
+        ctx.model_name, lambda: chain.ainvoke(inputs), estimated, Priority.BATCH, ctx.max_retries,
+    )
+
+
+async def _request_sub_object(path: str, errors: list[str], data: Any, inputs: dict, encoded: EncodedImage, ctx: _BatchContext):
+    """검증에 실패한 sub-object(path) 만 다시 요청 ("" 이면 전체)"""
+    sub_parser = ctx.parser.for_path(path)
+    chain = ctx.repair_chains.get(path)
+    if chain is None:
+        model = ctx.model
+        if ctx.output_mode == "native":
+            model = bind_native_output(model, sub_parser.pydantic_object, sub_overrides(ctx.native_overrides, path))
+        chain = ctx.repair_chains[path] = ctx.repair_prompt | model
+    sub_inputs = {
+        **inputs,
+        "path": path or "전체",
+        "errors": "; ".join(errors[:5]),
+        "previous": json.dumps(get_path(data, path), ensure_ascii=False)[:2000],
+        "format_instructions": "" if ctx.output_mode == "native" else sub_parser.get_format_instructions(),
+    }
+    text = sub_inputs["errors"] + sub_inputs["previous"] + sub_inputs["format_instructions"]
+    estimated = (
+        ctx.prompt_tokens + estimate_text_tokens(text) + image_tokens(*encoded.size, ctx.model_name)
+        + OUTPUT_TOKEN_ESTIMATE // 4
+    )
+    return await _ainvoke_limited(chain, sub_inputs, estimated, ctx)
+
+
+async def run_batch(
+    manifest_path: str,
+    output_path: str,
+    model=None,
+    cache: Optional[CaptionCache] = None,
+    concurrency: int = 16,
+    rpm: Optional[int] = None,
+    tpm: Optional[int] = None,
+    preprocess_workers: Optional[int] = None,
+    target_size: int = 224,
+    concat_direction: str = "auto",
+    image_token_budget: int = DEFAULT_IMAGE_TOKEN_BUDGET,
+    jpeg_quality: Optional[int] = None,
+    jpeg_subsampling: Optional[str] = None,
+    output_mode: str = "parser",
+    max_retries: int = 3,
+    max_repair_rounds: int = 1,
+    report_interval: float = 30.0,
+) -> BatchStats:
+    """
+    manifest 의 모든 상품 그룹을 캡셔닝하여 output_path(JSONL) 에 기록
+
+    Args:
+        model: VLM chat model (None 이면 image_caption.model). 응답의 usage_metadata 로 TPM 을 정산한다
+        cache: 캡션 결과 캐시 (None 이면 CAPTION_CACHE_PATH). 이미지 / 프롬프트 / 스키마 버전 / 모델이 같으면 VLM 을 다시 호출하지 않음
+        concurrency: 동시에 진행 중인 VLM 요청 수 상한
+        rpm / tpm: 모델의 분당 요청 / 토큰 한도. 주면 공유 scheduler 의 해당 모델 한도를 바꾸고,
+                   None 이면 scheduler 설정(LLM_RATE_LIMITS_PATH / 기본값)을 따른다
+        preprocess_workers: 전처리 process 수 (None 이면 CPU 수)
+        concat_direction: 'auto' 이면 그룹의 뷰 수마다 image_token_budget 안에서 grid / strip 과 타일 크기를 고르고
+                          (image_layout.plan_layout), 'horizontal' / 'vertical' 이면 target_size 뷰를 이어붙인다
+        jpeg_quality / jpeg_subsampling: VLM 에 보내는 이미지 인코딩 설정 (None 이면 뷰 타일 크기의 JPEG_PRESETS)
+        output_mode: 'parser' 이면 프롬프트의 format instructions 로, 'native' 이면 provider 의 function calling(JSON schema)
+                     으로 출력 형식을 강제 (native 는 format instructions 만큼 요청당 프롬프트 토큰이 줄어듦)
+        max_repair_rounds: 응답을 복구해도 검증에 실패한 sub-object 를 다시 요청하는 횟수
+    """
+    # 모델 초기화 비용(인증 등)이 있으므로 실행 시점에 import (spawn 된 전처리 worker 에서는 import 하지 않음)
+    from .image_caption import (
+        MASTER_CAPTION_SCHEMA_VERSION, NATIVE_SCHEMA_OVERRIDES, MasterCaption, model as default_model, parser,
+        prompt_template, repair_prompt_template,
+    )
+
+    model = model or default_model
+    if output_mode not in ("parser", "native"):
+        raise ValueError("output_mode는 'parser' 또는 'native'이어야 합니다.")
+    format_instructions = "" if output_mode == "native" else parser.get_format_instructions()
+    if concat_direction not in ("auto", "horizontal", "vertical"):
+        raise ValueError("concat_direction은 'auto', 'horizontal' 또는 'vertical'이어야 합니다.")
+    # 이미지 / 배치 설명을 뺀 프롬프트 텍스트 (그룹마다 동일) - 토큰 추정 + 캐시 key 에 사용
+    rendered = prompt_template.invoke(
+        {"format_instructions": format_instructions, "image_data": "", "layout_description": ""}
+    )
+    prompt_text = "".join(str(m.content) for m in rendered.to_messages())
+    if output_mode == "native":
+        # tool schema 도 입력 토큰으로 계산되고, 바뀌면 캐시가 무효화되어야 하므로 프롬프트 텍스트에 포함
+        prompt_text += json.dumps(native_tool(MasterCaption, NATIVE_SCHEMA_OVERRIDES), ensure_ascii=False)
+
+    items = list(read_manifest(manifest_path))
+    stats = BatchStats(total=len(items))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    cache = cache or CaptionCache(os.getenv("CAPTION_CACHE_PATH", "caption_cache.sqlite"))
+    completed = load_completed_ids(output_path)
+    sink = JsonlSink(output_path)
+
+    async def produce() -> None:
+        for item in items:
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work(ctx: _BatchContext) -> None:
+        while (item := await queue.get()) is not None:
+            record = await _caption_group(item, ctx)
+            if record is None:
+                stats.skipped += 1
+                continue
+            sink.write(record)
+            if record["status"] != "ok":
+                stats.failed += 1
+            elif record.get("cached"):
+                stats.cached += 1
+            else:
+                stats.succeeded += 1
+            usage = record.get("usage", {})
+            stats.input_tokens += usage.get("input_tokens", 0)
+            stats.output_tokens += usage.get("output_tokens", 0)
+            if not record.get("cached"):
+                stats.payload_bytes += record.get("payload_bytes", 0)
+                stats.repaired += bool(record.get("repairs"))
+                stats.sub_retries += len(record.get("sub_retries", []))
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(report_interval)
+            print(f"[batch_caption] {stats.summary()}")
+
+    scheduler = get_llm_scheduler()
+    if rpm or tpm:
+        scheduler.set_limits(_model_name(model), rpm, tpm)
+
+    reporter = asyncio.create_task(report())
+    try:
+        with ProcessPoolExecutor(max_workers=preprocess_workers) as pool:
+            ctx = _BatchContext(
+                vlm_chain=prompt_template | (
+                    bind_native_output(model, MasterCaption, NATIVE_SCHEMA_OVERRIDES) if output_mode == "native" else model
+                ),
+                model=model,
+                parser=parser,
+                repair_prompt=repair_prompt_template,
+                output_mode=output_mode,
+                native_overrides=NATIVE_SCHEMA_OVERRIDES,
+                repair_chains={},
+                max_repair_rounds=max_repair_rounds,
+                format_instructions=format_instructions,
+                prompt_text=prompt_text,
+                prompt_tokens=estimate_text_tokens(prompt_text),
+                schema_version=MASTER_CAPTION_SCHEMA_VERSION,
+                model_name=_model_name(model),
+                scheduler=scheduler,
+                cache=cache,
+                completed=completed,
+                inflight={},
+                pool=pool,
+                target_size=target_size,
+                concat_direction=concat_direction,
+                image_token_budget=image_token_budget,
+                layouts={},
+                jpeg_quality=jpeg_quality,
+                jpeg_subsampling=jpeg_subsampling,
+                max_retries=max_retries,
+            )
+            await asyncio.gather(produce(), *(work(ctx) for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+        sink.close()
+    return stats
+
+
+# --- 실행 예시 / dry-run 벤치마크 ---
+
+def _write_synthetic_manifest(path: str, n_groups: int, image_dir: str) -> None:
+    """랜덤 이미지 1~3장으로 구성된 상품 그룹 n_groups 개의 manifest 생성 (일부 그룹은 뷰가 누락된 경우)"""
+    import numpy as np
+    from PIL import Image
+
+    os.makedirs(image_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    # 그룹마다 새 이미지를 쓰면 생성 시간이 벤치마크보다 길어지므로 이미지 풀을 재사용
+    pool_paths = []
+    for i in range(min(n_groups * 3, 60)):
+        image_path = os.path.join(image_dir, f"{i}.jpg")
+        height, width = rng.integers(400, 1200, 2)
+        Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)).save(image_path, quality=90)
+        pool_paths.append(image_path)
+    with open(path, "w", encoding="utf-8") as f:
+        for g in range(n_groups):
+            paths = [pool_paths[(g * 3 + j) % len(pool_paths)] for j in range((3, 3, 2, 1)[g % 4])]
+            f.write(json.dumps({"product_group_id": f"group_{g}", "image_paths": paths}) + "\n")
+
+
+def _dry_run_model(latency: float, defect_rate: float = 0.0):
+    """
+    VLM 대신 latency 만큼 기다린 뒤 고정된 MasterCaption JSON 을 돌려주는 fake model
+    defect_rate 비율의 응답에는 caption_fixtures.DEFECTS 의 결함을 섞고, sub-object 재요청에는 해당 부분만 돌려준다
+    """
+    import re
+
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    from .caption_fixtures import SAMPLE_CAPTION, defective_response
+
+    content = json.dumps(SAMPLE_CAPTION, ensure_ascii=False)
+    repair_path = re.compile(r"`([\w.]+|전체)` 항목의 JSON 객체만")
+
+    async def respond(prompt) -> AIMessage:
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        text = "".join(str(m.content) for m in prompt.to_messages())
+        repair = repair_path.search(text)
+        if repair:
+            path = "" if repair.group(1) == "전체" else repair.group(1)
+            response = json.dumps(get_path(SAMPLE_CAPTION, path), ensure_ascii=False)
+        elif random.random() < defect_rate:
+            _, response = defective_response(random.Random())
+        else:
+            response = content
+        return AIMessage(content=response, usage_metadata={"input_tokens": 2300, "output_tokens": 400, "total_tokens": 2700})
+
+    return RunnableLambda(respond, name="dry-run")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("manifest")
+    arg_parser.add_argument("output")
+    arg_parser.add_argument("--concurrency", type=int, default=16)
+    arg_parser.add_argument("--rpm", type=int, default=None, help="None 이면 LLM_RATE_LIMITS_PATH / 기본 한도")
+    arg_parser.add_argument("--tpm", type=int, default=None)
+    arg_parser.add_argument("--preprocess-workers", type=int, default=None)
+    arg_parser.add_argument("--target-size", type=int, default=224)
+    arg_parser.add_argument("--concat-direction", default="auto", choices=["auto", "horizontal", "vertical"])
+    arg_parser.add_argument("--image-token-budget", type=int, default=DEFAULT_IMAGE_TOKEN_BUDGET)
+    arg_parser.add_argument("--jpeg-quality", type=int, default=None)
+    arg_parser.add_argument("--jpeg-subsampling", default=None, choices=["4:4:4", "4:2:2", "4:2:0"])
+    arg_parser.add_argument("--output-mode", default="parser", choices=["parser", "native"])
+    arg_parser.add_argument("--report-interval", type=float, default=30.0)
+    arg_parser.add_argument("--cache-path", default=os.getenv("CAPTION_CACHE_PATH", "caption_cache.sqlite"))
+    arg_parser.add_argument("--synthetic", type=int, default=0, help="랜덤 이미지로 상품 그룹 N개의 manifest 를 생성")
+    arg_parser.add_argument("--dry-run-latency", type=float, default=None, help="VLM 대신 fake model 사용 (초)")
+    arg_parser.add_argument("--dry-run-defect-rate", type=float, default=0.0, help="fake model 응답 중 결함을 섞을 비율")
+    args = arg_parser.parse_args()
+
+    if args.synthetic:
+        _write_synthetic_manifest(args.manifest, args.synthetic, os.path.splitext(args.manifest)[0] + "_images")
+    dry_run_model = None
+    if args.dry_run_latency is not None:
+        # image_caption 의 기본 모델 생성에 필요한 인증 정보 대체 (실제 호출은 하지 않음)
+        os.environ.setdefault("GOOGLE_API_KEY", "dry-run")
+        dry_run_model = _dry_run_model(args.dry_run_latency, args.dry_run_defect_rate)
+
+    result = asyncio.run(run_batch(
+        args.manifest, args.output, model=dry_run_model, cache=CaptionCache(args.cache_path),
+        concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm,
+        preprocess_workers=args.preprocess_workers, target_size=args.target_size,
+        concat_direction=args.concat_direction, image_token_budget=args.image_token_budget, jpeg_quality=args.jpeg_quality,
+        jpeg_subsampling=args.jpeg_subsampling, output_mode=args.output_mode, report_interval=args.report_interval,
+    ))
+    print(f"[batch_caption] 완료: {result.summary()}")
@@ -0,0 +1,136 @@
+"""
+그룹 딥 캡션 + SKU 색상 → SKU 별 최종 상품 문서 (readme 워크플로우 4단계)
+
+    python -m caption.build_documents captions.jsonl sku_colors.jsonl documents.jsonl
+
+- captions.jsonl: batch_caption 결과 (product_group_id, status, caption)
+- sku_colors.jsonl: color_extraction 결과 (sku_id, product_group_id, status, color)
+각 SKU 문서는 그룹의 공통 정보(structured_attributes, embedding_captions)를 모두 포함하고,
+structured_attributes.common.color 는 SKU 이미지에서 추출한 색상으로 바뀐다 (facet / BM25 인덱스가 그대로 사용)
+embedding_captions 문장 속 그룹 색상 표현("흰색 긴소매 셔츠")도 SKU 색상 이름으로 바꾼다
+"""
+import argparse
+import json
+import re
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from .batch_caption import JsonlSink, read_manifest
+from .color_extraction import COLOR_SYNONYMS, nearest_color_name, srgb_to_lab
+
+_HEX_RE = re.compile(r"#?([0-9a-fA-F]{6})")
+
+
+def load_group_captions(path: str) -> dict[str, dict]:
+    """product_group_id → MasterCaption dict (재실행으로 같은 그룹이 여러 번 기록된 경우 마지막 성공 결과)"""
+    captions = {}
+    for record in read_manifest(path):
+        if record.get("status") == "ok":
+            captions[record["product_group_id"]] = record["caption"]
+    return captions
+
+
+def _color_details(color: Optional[dict]) -> list[dict]:
+    """CommonAttributes.color → [primary, *secondary] ColorDetail 목록"""
+    details = []
+    for value in ((color or {}).get("primary"), (color or {}).get("secondary")):
+        for detail in value if isinstance(value, list) else [value]:
+            if isinstance(detail, dict) and detail.get("name"):
+                details.append(detail)
+    return details
+
+
+def _palette_name(detail: dict) -> str:
+    """ColorDetail 의 hex 에 가장 가까운 팔레트 색상 이름 (hex 가 없거나 잘못되면 이름 그대로)"""
+    match = _HEX_RE.fullmatch(str(detail.get("hex") or "").strip())
+    if not match:
+        return detail["name"]
+    rgb = np.frombuffer(bytes.fromhex(match.group(1)), dtype=np.uint8)
+    return nearest_color_name(srgb_to_lab(rgb[None, :]))[0]
+
+
+def patch_caption_colors(embedding_captions: dict, group_color: Optional[dict], sku_color: Optional[dict]) -> dict:
+    """
+    그룹 캡션 문장의 그룹 색상 표현을 SKU 색상 이름으로 바꾼 사본
+    primary ↔ primary, secondary 는 순서대로 짝짓고, 같은 팔레트 색이면 그대로 둔다
+    (그룹 색 이름과 그 팔레트 색의 한글 표현 COLOR_SYNONYMS 를 다른 단어의 일부가 아닐 때만 바꿈, "오프화이트" 는 제외)
+    """
+    replacements: dict[str, str] = {}
+    for group, sku in zip(_color_details(group_color), _color_details(sku_color)):
+        group_palette, sku_palette = _palette_name(group), _palette_name(sku)
+        if group_palette == sku_palette:
+            continue
+        for word in (group["name"], group_palette, *COLOR_SYNONYMS.get(group_palette, ())):
+            replacements.setdefault(word, sku["name"])
+    if not replacements:
+        return dict(embedding_captions)
+    words = sorted(replacements, key=len, reverse=True)
+    pattern = re.compile(r"(?<![가-힣A-Za-z])(" + "|".join(map(re.escape, words)) + ")")
+    return {
+        field: pattern.sub(lambda match: replacements[match.group(1)], text) if isinstance(text, str) else text
+        for field, text in embedding_captions.items()
+    }
+
+
+def build_sku_documents(captions: dict[str, dict], sku_colors: Iterable[dict]) -> Iterator[dict]:
+    """
+    SKU 색상 레코드마다 그룹 캡션을 합친 문서 생성 (캡션이 없는 그룹의 SKU 는 제외)
+    색상 추출에 실패한 SKU 는 VLM 이 추출한 그룹 색상을 그대로 사용 (color_source 로 구분)
+    추출한 색상이 그룹 색상과 다르면 embedding_captions 의 색 표현을 SKU 색상으로 바꾼다 (patch_caption_colors)
+    """
+    groups = defaultdict(list)
+    for record in sku_colors:
+        groups[record["product_group_id"]].append(record)
+
+    for group_id, skus in groups.items():
+        caption = captions.get(group_id)
+        if caption is None:
+            continue
+        attributes = caption["structured_attributes"]
+        variants = [{"sku_id": sku["sku_id"], "color": sku.get("color")} for sku in skus if sku.get("status") == "ok"]
+        for sku in skus:
+            extracted = sku.get("status") == "ok"
+            color = sku["color"] if extracted else attributes["common"].get("color")
+            yield {
+                "product_id": sku["sku_id"],
+                "product_group_id": group_id,
+                "image_path": sku.get("image_path"),
+                "color_source": "extracted" if extracted else "vlm",
+                "structured_attributes": {**attributes, "common": {**attributes["common"], "color": color}},
+                "embedding_captions": (
+                    patch_caption_colors(caption["embedding_captions"], attributes["common"].get("color"), color)
+                    if extracted else caption["embedding_captions"]
+                ),
+                "variants": variants,
+            }
+
+
+def build_documents(captions_path: str, colors_path: str, output_path: str) -> dict:
+    captions = load_group_captions(captions_path)
+    sku_colors = list(read_manifest(colors_path))
+    sink = JsonlSink(output_path, mode="w")
+    written = 0
+    try:
+        for document in build_sku_documents(captions, sku_colors):
+            sink.write(document)
+            written += 1
+    finally:
+        sink.close()
+    missing_groups = {record["product_group_id"] for record in sku_colors} - captions.keys()
+    return {"documents": written, "skus": len(sku_colors), "missing_groups": len(missing_groups)}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("captions")
+    arg_parser.add_argument("sku_colors")
+    arg_parser.add_argument("output")
+    args = arg_parser.parse_args()
+
+    result = build_documents(args.captions, args.sku_colors, args.output)
+    print(
+        f"[build_documents] SKU 문서 {result['documents']}/{result['skus']} 생성 "
+        f"(캡션 없는 그룹 {result['missing_groups']}개의 SKU 제외)"
+    )
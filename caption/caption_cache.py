@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import Optional
+
+
+def sha256_hex(data: str | bytes) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def source_fingerprint(image_paths: list[str], target_size: int, concat_direction: str, encoding: tuple = ()) -> str:
+    """
+    원본 이미지 파일(경로, 크기, mtime) + 전처리 / 인코딩 파라미터의 fingerprint
+    전처리 없이 stat 만으로 계산되므로, 재시작 시 이미 처리한 그룹을 이미지 디코딩 없이 찾는 데 사용
+    """
+    sources = []
+    for path in image_paths:
+        stat = os.stat(path)
+        sources.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return sha256_hex(json.dumps([sources, target_size, concat_direction, list(encoding)]))
+
+
+def caption_cache_key(image_hash: str, prompt_text: str, schema_version: str, model_name: str) -> str:
+    """전처리된 이미지 + 프롬프트 + MasterCaption 스키마 버전 + 모델 이름 중 하나라도 바뀌면 다른 key"""
+    return sha256_hex("\x00".join([image_hash, sha256_hex(prompt_text), str(schema_version), model_name]))
+
+
+class CaptionCache:
+    """
+    VLM 캡션 결과 영구 캐시 ("Extract Once" - 같은 입력으로 VLM 을 두 번 호출하지 않는다)
+
+    - captions: caption_cache_key → MasterCaption JSON (zlib)
+    - sources: source_fingerprint → 전처리된 이미지 hash (재실행 시 전처리 생략용)
+    배치 실행이 중단되어도 완료된 결과는 즉시 commit 되어 있으므로 재실행 시 남은 작업만 수행한다
+    """
+
+    def __init__(self, path: str = "caption_cache.sqlite"):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS captions ("
+            "key TEXT PRIMARY KEY, image_hash TEXT NOT NULL, prompt_hash TEXT NOT NULL, "
+            "schema_version TEXT NOT NULL, model TEXT NOT NULL, caption BLOB NOT NULL, "
+            "usage TEXT, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources (fingerprint TEXT PRIMARY KEY, image_hash TEXT NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT caption FROM captions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(
+        self,
+        key: str,
+        caption: dict,
+        image_hash: str,
+        prompt_text: str,
+        schema_version: str,
+        model_name: str,
+        usage: Optional[dict] = None,
+    ) -> None:
+        data = zlib.compress(json.dumps(caption, ensure_ascii=False).encode("utf-8"), 1)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, image_hash, sha256_hex(prompt_text), str(schema_version), model_name, data,
+             json.dumps(usage) if usage else None, time.time()),
+        )
+
+    def image_hash(self, fingerprint: str) -> Optional[str]:
+        row = self._conn.execute("SELECT image_hash FROM sources WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return row[0] if row else None
+
+    def set_image_hash(self, fingerprint: str, image_hash: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (fingerprint, image_hash))
+
+    def stats(self) -> list[tuple[str, str, str, int]]:
+        """(model, schema_version, prompt_hash, 캡션 수) - 프롬프트 / 모델 변경 시 영향 범위 확인용"""
+        return self._conn.execute(
+            "SELECT model, schema_version, prompt_hash, COUNT(*) FROM captions "
+            "GROUP BY model, schema_version, prompt_hash ORDER BY MAX(created_at) DESC"
+        ).fetchall()
+
+    def close(self) -> None:
+        self._conn.close()
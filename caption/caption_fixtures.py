@@ -0,0 +1,181 @@
+"""
+MasterCaption 응답 fixture (dry-run 모델 / 구조화 출력 파싱 비교용)
+
+    python -m caption.caption_fixtures [--n 1000]
+
+실제 VLM 응답에서 자주 보이는 결함을 섞은 fixture 로 기존 PydanticOutputParser 와 TolerantOutputParser 의
+실패율 / 재요청 토큰, format instructions 방식과 native(function calling) 방식의 요청당 프롬프트 토큰을 비교한다
+"""
+import argparse
+import copy
+import json
+import random
+from typing import Callable
+
+SAMPLE_CAPTION = {
+    "structured_attributes": {
+        "common": {
+            "category_l1": "상의", "category_l2": "셔츠",
+            "color": {"primary": {"name": "화이트", "hex": "#FFFFFF"}, "secondary": []},
+            "sleeve_length": "긴소매", "body_length": "레귤러(골반선)",
+        },
+        "front": {"neckline": "셔츠 칼라", "pattern": {"type": "없음", "description": None}, "closures_and_embellishments": []},
+        "back": {"pattern": {"type": "없음", "description": None}, "closures_and_embellishments": []},
+        "subjective": {
+            "fit": "레귤러핏", "silhouette": "H라인",
+            "style_tags": ["미니멀"], "mood_tags": ["깔끔한"], "tpo_tags": ["출근"],
+        },
+    },
+    "embedding_captions": {
+        "clip_text_front": "흰색 긴소매 셔츠", "design_details_description": "셔츠 칼라와 중앙 버튼 여밈",
+        "style_vibe_description": "미니멀하고 깔끔한 스타일", "tpo_context_description": "출근룩",
+        "comprehensive_description": "출근룩으로 좋은 미니멀한 흰색 긴소매 셔츠",
+    },
+}
+
+
+def _dumps(caption: dict, indent=None) -> str:
+    return json.dumps(caption, ensure_ascii=False, indent=indent)
+
+
+def _with_synonyms(caption: dict, rng: random.Random) -> str:
+    caption = copy.deepcopy(caption)
+    attributes = caption["structured_attributes"]
+    attributes["common"]["sleeve_length"] = rng.choice(["반팔", "긴팔", "7부 소매"])
+    attributes["common"]["body_length"] = "레귤러"
+    attributes["front"]["neckline"] = rng.choice(["브이넥", "카라", "라운드"])
+    attributes["front"]["pattern"]["type"] = "무지"
+    attributes["subjective"]["fit"] = rng.choice(["오버사이즈", "루즈핏", "regular"])
+    return _dumps(caption)
+
+
+def _with_unknown_enum(caption: dict, rng: random.Random) -> str:
+    caption = copy.deepcopy(caption)
+    caption["structured_attributes"]["front"]["neckline"] = "보트넥"
+    return _dumps(caption)
+
+
+def _with_missing_field(caption: dict, rng: random.Random) -> str:
+    caption = copy.deepcopy(caption)
+    del caption["embedding_captions"]["tpo_context_description"]
+    return _dumps(caption)
+
+
+def _truncated(caption: dict, rng: random.Random) -> str:
+    text = _dumps(caption)
+    return text[:int(len(text) * rng.uniform(0.6, 0.95))]
+
+
+# 결함 이름 → (비율, 생성 함수)
+DEFECTS: dict[str, tuple[float, Callable[[dict, random.Random], str]]] = {
+    "clean": (0.58, lambda c, rng: _dumps(c)),
+    "code_fence": (0.10, lambda c, rng: f"```json\n{_dumps(c, 2)}\n```"),
+    "leading_text": (0.04, lambda c, rng: f"다음은 이미지 분석 결과입니다.\n{_dumps(c)}"),
+    "bracketed_text": (0.02, lambda c, rng: f"{rng.choice(['[참고] 분석 결과입니다.', '응답 [1/1]'])}\n{_dumps(c)}"),
+    "trailing_text": (0.05, lambda c, rng: f"{_dumps(c)}\n\n위 정보는 제공된 이미지에 기반합니다."),
+    "trailing_comma": (0.03, lambda c, rng: _dumps(c, 2).replace('"\n', '",\n', 3)),
+    "enum_synonym": (0.08, _with_synonyms),
+    "unknown_enum": (0.03, _with_unknown_enum),
+    "missing_field": (0.02, _with_missing_field),
+    "truncated": (0.04, _truncated),
+    "not_json": (0.01, lambda c, rng: "죄송합니다. 이미지를 분석할 수 없습니다."),
+}
+
+
+def defective_response(rng: random.Random, caption: dict = SAMPLE_CAPTION) -> tuple[str, str]:
+    """DEFECTS 비율대로 결함을 골라 (결함 이름, 응답 텍스트)"""
+    names = list(DEFECTS)
+    name = rng.choices(names, weights=[DEFECTS[n][0] for n in names])[0]
+    return name, DEFECTS[name][1](caption, rng)
+
+
+if __name__ == "__main__":
+    import os
+    from collections import Counter, defaultdict
+
+    from langchain_core.exceptions import OutputParserException
+    from langchain_core.output_parsers import PydanticOutputParser
+
+    from .batch_caption import OUTPUT_TOKEN_ESTIMATE, estimate_text_tokens
+    from .image_layout import DEFAULT_IMAGE_TOKEN_BUDGET
+    from .output_parsing import get_path, native_tool, sub_overrides
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--n", type=int, default=1000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    # 모델 객체 생성에 필요한 인증 정보 대체 (호출하지 않음)
+    os.environ.setdefault("GOOGLE_API_KEY", "fixture")
+    from .image_caption import NATIVE_SCHEMA_OVERRIDES, MasterCaption, parser, prompt_template, repair_prompt_template
+
+    def prompt_tokens(template, **inputs) -> int:
+        rendered = template.invoke({"image_data": "", "layout_description": "", **inputs})
+        return estimate_text_tokens("".join(str(m.content) for m in rendered.to_messages()))
+
+    baseline = PydanticOutputParser(pydantic_object=MasterCaption)
+    image = DEFAULT_IMAGE_TOKEN_BUDGET
+    native_schema_tokens = estimate_text_tokens(json.dumps(native_tool(MasterCaption, NATIVE_SCHEMA_OVERRIDES), ensure_ascii=False))
+    request_tokens = {
+        "PydanticOutputParser": prompt_tokens(prompt_template, format_instructions=baseline.get_format_instructions()),
+        "Tolerant (compact)": prompt_tokens(prompt_template, format_instructions=parser.get_format_instructions()),
+        "native (tool schema)": prompt_tokens(prompt_template, format_instructions="") + native_schema_tokens,
+    }
+
+    def sub_retry_tokens(path: str, errors: list[str], native: bool) -> int:
+        sub_parser = parser.for_path(path)
+        instructions = "" if native else sub_parser.get_format_instructions()
+        text = prompt_tokens(
+            repair_prompt_template, path=path, errors="; ".join(errors), previous="", format_instructions=instructions,
+        )
+        if native:
+            text += estimate_text_tokens(json.dumps(native_tool(sub_parser.pydantic_object, sub_overrides(NATIVE_SCHEMA_OVERRIDES, path)), ensure_ascii=False))
+        output = estimate_text_tokens(json.dumps(get_path(SAMPLE_CAPTION, path), ensure_ascii=False))
+        return text + image + output
+
+    rng = random.Random(args.seed)
+    outcomes = defaultdict(Counter)
+    retry_tokens = Counter()
+    for _ in range(args.n):
+        defect, text = defective_response(rng)
+        try:
+            baseline.parse(text)
+            outcomes["baseline"][defect, "ok"] += 1
+        except OutputParserException:
+            outcomes["baseline"][defect, "full retry"] += 1
+            retry_tokens["baseline"] += request_tokens["PydanticOutputParser"] + image + OUTPUT_TOKEN_ESTIMATE
+        parsed = parser.repair(text)
+        if parsed.ok:
+            outcomes["tolerant"][defect, "ok"] += 1
+            continue
+        outcomes["tolerant"][defect, "sub-object retry"] += 1
+        for path, errors in parsed.invalid.items():
+            retry_tokens["tolerant"] += sub_retry_tokens(path, errors, native=False)
+            retry_tokens["native"] += sub_retry_tokens(path, errors, native=True)
+
+    print(f"fixture {args.n}개 (seed {args.seed})\n")
+    print(f"{'defect':>15} {'n':>5} {'baseline 실패':>12} {'tolerant 재요청':>14}  tolerant 복구 예")
+    for defect in DEFECTS:
+        n = sum(count for (d, _), count in outcomes["baseline"].items() if d == defect)
+        if not n:
+            continue
+        failed = outcomes["baseline"][defect, "full retry"]
+        retried = outcomes["tolerant"][defect, "sub-object retry"]
+        sample = parser.repair(DEFECTS[defect][1](SAMPLE_CAPTION, random.Random(1)))
+        detail = ", ".join(sample.repairs[:2]) or "-"
+        if sample.invalid:
+            detail += f" | 재요청 {list(sample.invalid)}"
+        print(f"{defect:>15} {n:>5} {failed / n:>11.0%} {retried / n:>14.0%}  {detail}")
+
+    baseline_failed = sum(c for (_, outcome), c in outcomes["baseline"].items() if outcome != "ok")
+    tolerant_failed = sum(c for (_, outcome), c in outcomes["tolerant"].items() if outcome != "ok")
+    print(f"\n첫 응답 파싱 실패율: baseline {baseline_failed / args.n:.1%} → tolerant {tolerant_failed / args.n:.1%}")
+
+    print(f"\n{'mode':>22} {'요청당 프롬프트':>14} {'재요청 / 요청':>12} {'합계 (이미지 ' + str(image) + ' + 출력 포함)':>28}")
+    for mode, retry_key in (
+        ("PydanticOutputParser", "baseline"), ("Tolerant (compact)", "tolerant"), ("native (tool schema)", "native"),
+    ):
+        per_request = request_tokens[mode]
+        retry = retry_tokens[retry_key] / args.n
+        total = per_request + image + OUTPUT_TOKEN_ESTIMATE + retry
+        print(f"{mode:>22} {per_request:>14,} {retry:>12,.0f} {total:>28,.0f}")
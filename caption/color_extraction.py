@@ -0,0 +1,315 @@
+"""
+SKU 단위 저비용 색상 추출 (readme 의 "단순 속성 추출" 단계)
+
+VLM 호출 없이 Pillow / NumPy 만으로 정면(누끼컷) 이미지의 대표 색상을 추출한다
+    1. JPEG draft 디코딩으로 작은 크기만 디코딩 → 썸네일
+    2. 전처리 패딩(검정 행/열) 제거 후, 테두리와 연결된 배경 영역을 flood fill 로 제외 → 의류 전경
+    3. 전경 픽셀을 CIELAB 공간에서 k-means → 클러스터 중심을 색상 팔레트(readme 색상 분류 체계)의 가장 가까운 이름으로 매핑
+결과는 CommonAttributes.color 형식 ({"primary": ColorDetail, "secondary": [ColorDetail, ...]})
+
+    python -m caption.color_extraction sku_manifest.jsonl sku_colors.jsonl --workers 4
+    {"sku_id": "P0001-BLUE", "product_group_id": "P0001", "image_path": "front.jpg"}
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+# 색상 이름별 대표 RGB (한 이름에 여러 기준색). 쿼리에 그대로 등장하는 이름을 쓰기 위해 readme 분류 체계의
+# "퍼플/바이올렛", "베이지/크림" 은 앞 단어만 사용하고, 의류에서 흔한 네이비 / 카키를 추가
+COLOR_PALETTE: dict[str, list[tuple[int, int, int]]] = {
+    "화이트": [(255, 255, 255), (245, 245, 240)],
+    "그레이": [(128, 128, 128), (176, 176, 176), (90, 90, 90)],
+    "블랙": [(0, 0, 0), (35, 35, 35)],
+    "레드": [(200, 16, 46), (224, 60, 49), (128, 0, 32)],
+    "핑크": [(255, 192, 203), (244, 166, 192), (231, 84, 128)],
+    "옐로우": [(255, 215, 0), (246, 226, 122)],
+    "오렌지": [(255, 140, 0), (242, 140, 40)],
+    "그린": [(46, 139, 87), (143, 188, 143), (0, 100, 0)],
+    "카키": [(120, 134, 107), (107, 107, 58)],
+    "블루": [(30, 144, 255), (74, 144, 226), (135, 206, 235)],
+    "네이비": [(31, 42, 68), (0, 0, 128)],
+    "데님": [(93, 123, 157), (111, 143, 175), (59, 90, 122)],
+    "퍼플": [(128, 0, 128), (181, 126, 220)],
+    "브라운": [(139, 69, 19), (160, 82, 45), (92, 64, 51)],
+    "베이지": [(245, 245, 220), (210, 180, 140), (232, 220, 196)],
+}
+
+# 팔레트 이름별로 캡션 문장에 함께 쓰이는 한글 색 표현 (build_documents 가 그룹 캡션의 색을 SKU 색으로 바꿀 때 사용)
+COLOR_SYNONYMS: dict[str, tuple[str, ...]] = {
+    "화이트": ("흰색", "하얀색", "흰", "하얀"),
+    "그레이": ("회색",),
+    "블랙": ("검정색", "검은색", "검정", "검은"),
+    "레드": ("빨간색", "빨강", "빨간", "붉은색"),
+    "핑크": ("분홍색", "분홍"),
+    "옐로우": ("노란색", "노랑", "노란"),
+    "오렌지": ("주황색", "주황"),
+    "그린": ("초록색", "녹색", "초록"),
+    "블루": ("파란색", "파랑", "파란", "하늘색"),
+    "네이비": ("남색",),
+    "퍼플": ("보라색", "보라"),
+    "브라운": ("갈색",),
+}
+
+THUMBNAIL_SIZE = 96
+# 배경으로 볼 Lab 거리 (ΔE76)
+BACKGROUND_DELTA_E = 10.0
+# 테두리 픽셀 중 이 비율 이상이 한 색이면 단색 배경(누끼컷)으로 판단
+BACKGROUND_BORDER_RATIO = 0.6
+PADDING_MAX_VALUE = 16
+
+# sRGB(D65) → XYZ, D65 white point
+_RGB_TO_XYZ = np.array(
+    [[0.4124, 0.3576, 0.1805], [0.2126, 0.7152, 0.0722], [0.0193, 0.1192, 0.9505]], dtype=np.float32
+)
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+_SRGB_TO_LINEAR = np.array(
+    [c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4 for c in np.arange(256) / 255], dtype=np.float32
+)
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """uint8 sRGB (..., 3) → float32 CIELAB (..., 3)"""
+    xyz = _SRGB_TO_LINEAR[rgb] @ _RGB_TO_XYZ.T / _D65_WHITE
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack(
+        [116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1
+    ).astype(np.float32)
+
+
+_PALETTE_NAMES = [name for name, colors in COLOR_PALETTE.items() for _ in colors]
+_PALETTE_LAB = srgb_to_lab(np.array([c for colors in COLOR_PALETTE.values() for c in colors], dtype=np.uint8))
+
+
+def nearest_color_name(lab: np.ndarray) -> list[str]:
+    """Lab 색 (n, 3) → 가장 가까운 팔레트 색상 이름"""
+    distances = ((lab[:, None, :] - _PALETTE_LAB[None, :, :]) ** 2).sum(-1)
+    return [_PALETTE_NAMES[i] for i in distances.argmin(1)]
+
+
+def to_hex(rgb) -> str:
+    return "#{:02X}{:02X}{:02X}".format(*(int(round(c)) for c in rgb))
+
+
+# --- 1. 전경 추출 ---
+
+def load_thumbnail(image_path: str, size: int = THUMBNAIL_SIZE) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """이미지를 size 이하로 축소하여 (RGB uint8 배열, alpha 기반 전경 mask 또는 None) 반환"""
+    with Image.open(image_path) as image:
+        # JPEG 는 DCT 단계에서 축소 디코딩 (전체 해상도 디코딩 대비 수 배 빠름)
+        image.draft("RGB", (size * 2, size * 2))
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail((size, size), Image.Resampling.BILINEAR)
+        pixels = np.asarray(image)
+    if has_alpha:
+        return np.ascontiguousarray(pixels[..., :3]), pixels[..., 3] > 127
+    return pixels, None
+
+
+def _trim_padding(rgb: np.ndarray) -> tuple[slice, slice]:
+    """preprocess_and_concat_images 등이 붙인 검정 패딩 행/열을 제외한 영역"""
+    dark = rgb.max(axis=2) <= PADDING_MAX_VALUE
+    rows = np.flatnonzero(~dark.all(axis=1))
+    cols = np.flatnonzero(~dark.all(axis=0))
+    if len(rows) == 0 or len(cols) == 0:
+        return slice(None), slice(None)
+
+    def inner(kept: np.ndarray, length: int, margin: int = 2) -> slice:
+        # 축소 시 패딩과 섞인 경계 픽셀도 제외
+        start = kept[0] + margin if kept[0] > 0 else 0
+        stop = kept[-1] + 1 - margin if kept[-1] < length - 1 else length
+        return slice(start, max(stop, start + 1))
+
+    return inner(rows, rgb.shape[0]), inner(cols, rgb.shape[1])
+
+
+def _border_connected(mask: np.ndarray) -> np.ndarray:
+    """mask 중 이미지 테두리와 연결된 영역 (4-이웃 flood fill 을 dilation 반복으로 계산)"""
+    reached = np.zeros_like(mask)
+    reached[0, :], reached[-1, :], reached[:, 0], reached[:, -1] = mask[0, :], mask[-1, :], mask[:, 0], mask[:, -1]
+    while True:
+        grown = reached.copy()
+        grown[1:, :] |= reached[:-1, :]
+        grown[:-1, :] |= reached[1:, :]
+        grown[:, 1:] |= reached[:, :-1]
+        grown[:, :-1] |= reached[:, 1:]
+        grown &= mask
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
+
+
+def foreground_pixels(rgb: np.ndarray, alpha: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    의류 전경 픽셀의 (sRGB, Lab) 반환 (각 (n, 3))
+    - 패딩 제거 → 테두리 색이 균일하면 그 색과 가깝고 테두리와 연결된 영역을 배경으로 제외
+      (배경과 같은 색의 옷이라도 윤곽 안쪽은 연결되지 않으므로 남는다)
+    - 균일한 배경이 없으면 (모델 착용샷 등) 가운데 영역만 사용
+    """
+    rows, cols = _trim_padding(rgb)
+    rgb = rgb[rows, cols]
+    lab = srgb_to_lab(rgb)
+    if alpha is not None:
+        mask = alpha[rows, cols]
+    else:
+        border = np.concatenate([lab[0], lab[-1], lab[1:-1, 0], lab[1:-1, -1]])
+        background = np.median(border, axis=0)
+        near_background = np.sqrt(((lab - background) ** 2).sum(-1)) < BACKGROUND_DELTA_E
+        border_near = np.concatenate([near_background[0], near_background[-1], near_background[1:-1, 0], near_background[1:-1, -1]])
+        if border_near.mean() >= BACKGROUND_BORDER_RATIO:
+            mask = ~_border_connected(near_background)
+        else:
+            h, w = near_background.shape
+            mask = np.zeros_like(near_background)
+            mask[h // 4: h - h // 4, w // 4: w - w // 4] = True
+    # 전경이 거의 없으면 (배경과 구분 불가) 전체 사용
+    if mask.mean() < 0.02:
+        mask = np.ones(mask.shape, dtype=bool)
+    return rgb[mask], lab[mask]
+
+
+# --- 2. 색상 클러스터링 ---
+
+def _kmeans(points: np.ndarray, k: int, iterations: int = 8, seed: int = 0) -> np.ndarray:
+    """k-means++ 초기화 + Lloyd 반복, 각 점의 클러스터 label 반환"""
+    rng = np.random.default_rng(seed)
+    squared_norms = (points ** 2).sum(1)
+    centers = points[[rng.integers(len(points))]]
+    d2 = ((points - centers[0]) ** 2).sum(1)
+    for _ in range(1, k):
+        total = d2.sum()
+        if total <= 0:
+            break
+        picked = points[np.searchsorted(np.cumsum(d2), rng.random() * total)]
+        centers = np.vstack([centers, picked])
+        d2 = np.minimum(d2, ((points - picked) ** 2).sum(1))
+    labels = np.zeros(len(points), dtype=np.intp)
+    for iteration in range(iterations):
+        # |p - c|^2 = |p|^2 - 2 p·c + |c|^2
+        distances = squared_norms[:, None] - 2 * points @ centers.T + (centers ** 2).sum(1)[None, :]
+        new_labels = distances.argmin(1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=len(centers))
+        for dim in range(points.shape[1]):
+            sums = np.bincount(labels, weights=points[:, dim], minlength=len(centers))
+            centers[:, dim] = np.where(counts > 0, sums / np.maximum(counts, 1), centers[:, dim])
+    return labels
+
+
+def dominant_colors(image_path: str, k: int = 5, max_pixels: int = 1024) -> list[dict]:
+    """
+    전경의 대표 색상 리스트 (비율 내림차순)
+    같은 이름으로 매핑된 클러스터는 합치고, hex 는 해당 픽셀들의 평균 색
+
+    Returns:
+        [{"name": "그레이", "hex": "#7F7F7F", "ratio": 0.83}, ...]
+    """
+    rgb, lab = foreground_pixels(*load_thumbnail(image_path))
+    if len(lab) > max_pixels:
+        step = len(lab) / max_pixels
+        picks = (np.arange(max_pixels) * step).astype(np.intp)
+        rgb, lab = rgb[picks], lab[picks]
+    labels = _kmeans(lab, min(k, len(lab)))
+    n_clusters = labels.max() + 1
+    counts = np.bincount(labels, minlength=n_clusters)
+    center_lab = np.stack([np.bincount(labels, weights=lab[:, d], minlength=n_clusters) for d in range(3)], 1)
+    names = nearest_color_name(center_lab / np.maximum(counts, 1)[:, None])
+
+    merged: dict[str, list] = {}
+    for cluster, name in enumerate(names):
+        if counts[cluster] == 0:
+            continue
+        pixels = rgb[labels == cluster]
+        entry = merged.setdefault(name, [0, np.zeros(3)])
+        entry[0] += len(pixels)
+        entry[1] += pixels.sum(axis=0)
+    total = sum(count for count, _ in merged.values())
+    colors = [
+        {"name": name, "hex": to_hex(rgb_sum / count), "ratio": round(count / total, 3)}
+        for name, (count, rgb_sum) in merged.items()
+    ]
+    return sorted(colors, key=lambda c: c["ratio"], reverse=True)
+
+
+def extract_colors(image_path: str, min_ratio: float = 0.15, max_secondary: int = 2) -> dict:
+    """정면 이미지 → CommonAttributes.color 형식 {"primary": ColorDetail, "secondary": [ColorDetail, ...]}"""
+    colors = dominant_colors(image_path)
+    detail = [{"name": c["name"], "hex": c["hex"]} for c in colors]
+    secondary = [d for d, c in zip(detail[1:], colors[1:]) if c["ratio"] >= min_ratio][:max_secondary]
+    return {"primary": detail[0], "secondary": secondary}
+
+
+# --- 3. 배치 실행 ---
+
+def _extract_record(item: dict) -> dict:
+    record = {"sku_id": item["sku_id"], "product_group_id": item.get("product_group_id"), "image_path": item["image_path"]}
+    try:
+        return {**record, "status": "ok", "color": extract_colors(item["image_path"])}
+    except Exception as e:
+        return {**record, "status": "error", "error": repr(e)}
+
+
+def run_color_extraction(manifest_path: str, output_path: str, workers: Optional[int] = None, report_every: int = 5000) -> dict:
+    """SKU manifest(JSONL) 의 정면 이미지 색상을 process pool 로 추출하여 output_path(JSONL) 에 기록"""
+    from .batch_caption import JsonlSink, read_manifest
+
+    items = list(read_manifest(manifest_path))
+    sink = JsonlSink(output_path, mode="w")
+    start = time.monotonic()
+    counts = {"ok": 0, "error": 0}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for record in pool.map(_extract_record, items, chunksize=64):
+                sink.write(record)
+                counts[record["status"]] += 1
+                if (counts["ok"] + counts["error"]) % report_every == 0:
+                    elapsed = time.monotonic() - start
+                    print(f"[color_extraction] {counts['ok'] + counts['error']}/{len(items)} | {(counts['ok'] + counts['error']) / elapsed * 60:.0f} SKUs/min")
+    finally:
+        sink.close()
+    elapsed = time.monotonic() - start
+    return {**counts, "elapsed": elapsed, "skus_per_minute": (counts["ok"] + counts["error"]) / elapsed * 60 if elapsed else 0.0}
+
+
+def _write_synthetic_skus(path: str, n_skus: int, image_dir: str) -> None:
+    """흰 배경 위 단색 의류 실루엣(음영 포함) 이미지로 SKU manifest 생성 (색상별 이미지 한 장을 재사용)"""
+    from PIL import ImageDraw
+
+    os.makedirs(image_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    palette = [(name, colors[0]) for name, colors in COLOR_PALETTE.items() if name != "화이트"]
+    image_paths = []
+    for i, (name, color) in enumerate(palette):
+        image = Image.new("RGB", (800, 1000), (255, 255, 255))
+        ImageDraw.Draw(image).polygon(
+            [(250, 150), (550, 150), (700, 350), (620, 400), (600, 900), (200, 900), (180, 400), (100, 350)], fill=color
+        )
+        noise = rng.normal(0, 6, (1000, 800, 3))
+        image_paths.append(os.path.join(image_dir, f"{i}.jpg"))
+        Image.fromarray(np.clip(np.asarray(image) + noise, 0, 255).astype(np.uint8)).save(image_paths[-1], quality=90)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n_skus):
+            record = {"sku_id": f"sku_{i}", "product_group_id": f"group_{i // 3}", "image_path": image_paths[i % len(palette)]}
+            f.write(json.dumps({**record, "expected": palette[i % len(palette)][0]}, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("manifest")
+    arg_parser.add_argument("output")
+    arg_parser.add_argument("--workers", type=int, default=None)
+    arg_parser.add_argument("--synthetic", type=int, default=0, help="합성 누끼컷 이미지로 SKU N개의 manifest 를 생성")
+    args = arg_parser.parse_args()
+
+    if args.synthetic:
+        _write_synthetic_skus(args.manifest, args.synthetic, os.path.splitext(args.manifest)[0] + "_images")
+    result = run_color_extraction(args.manifest, args.output, workers=args.workers)
+    print(f"[color_extraction] 완료: 성공 {result['ok']}, 실패 {result['error']} | {result['skus_per_minute']:.0f} SKUs/min")
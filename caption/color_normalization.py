@@ -0,0 +1,426 @@
+"""
+카탈로그 전체 색상 옵션명 표준화 배치 작업 (example/transform_text.ipynb 의 색상 표준화 체인을 작업으로 옮긴 것)
+
+    python -m caption.color_normalization musinsa_product_detail_info.json colors.jsonl --dictionary color_dictionary.sqlite
+    python -m caption.color_normalization --synthetic 50000 --dry-run-latency 0.5 /tmp/catalog.json /tmp/colors.jsonl
+
+1. catalog JSON(최상위 배열 또는 JSONL)을 상품 하나씩 읽는다 (전체를 json.load 하지 않으므로 메모리는 상품 하나 + 읽기 버퍼)
+2. color_size_info 의 색상 옵션명을 전역으로 중복 제거. 보수적으로 정규화한 라벨(label_key: NFKC / 소문자 / 공백 / 앞 번호 /
+   품번 prefix 만 정리)로 모으므로 "LRAMCTR702P_화이트", "[17]화이트", "01화이트" 는 라벨 하나("화이트")가 되고,
+   "멜란지(그레이)", "7부 블랙" 처럼 괄호 / 숫자에 색 정보가 있는 라벨은 그대로 LLM 에 보낸다
+3. 색상 사전(SQLite)에 없는 라벨만 토큰 예산 단위 batch 로 LLM 에 보내고(공유 scheduler / router, BATCH 우선순위) 결과를 사전에 저장
+   → 다음 실행부터는 새로 등장한 라벨만 LLM 을 호출한다
+4. catalog 를 다시 한 번 읽으며 상품별 {"product_id", "colors", "colors_transformed"} 를 JSONL 로 기록
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.langgraph.llm_router import routed
+from app.langgraph.llm_scheduler import Priority, scheduled
+
+from .batch_caption import JsonlSink, estimate_text_tokens
+from .output_parsing import extract_json
+
+# 프롬프트 / 규칙(label_key 포함)이 바뀌면 올려서 사전의 기존 결과를 쓰지 않게 한다
+COLOR_PROMPT_VERSION = "2"
+# 변환 불가 라벨
+PASS = "pass"
+
+SYSTEM_PROMPT = """당신은 의류 색상 표현을 표준화하는 전문가입니다.
+번호가 붙은 색상 옵션명 목록을 받아 각 옵션명을 다음 규칙에 따라 표준 색상명으로 변환합니다.
+
+규칙:
+1. 색상명이 아닌 정보(코드, 숫자, 브랜드명, 제품명, 소재 / 스타일 정보, 기타 수식어)는 모두 제거합니다. (예: '차콜_기모' -> 'charcoal', '[기모] 블랙' -> 'black')
+2. 색상명은 영어 소문자로 씁니다. 한글 색상명은 해당 영어 색상명으로 변환합니다.
+   (예: '화이트' -> 'white', '차콜' -> 'charcoal', '연그레이' -> 'light gray', '웜그레이' -> 'warm gray', 'DARK GRAY' -> 'dark gray', 'BE' -> 'beige', 'BR' -> 'brown', 'NA' -> 'navy')
+3. 줄임말은 풀어서 씁니다. (예: 'Lt Gray' -> 'light gray')
+4. 한 옵션에 색상이 여러 개면 '/' 로 연결합니다. (예: '블랙/화이트' -> 'black/white')
+5. 어떤 색상인지 알 수 없으면 "pass" 로 씁니다.
+
+출력은 번호를 key, 표준 색상명을 value 로 하는 JSON 객체 하나입니다. 모든 번호를 빠짐없이 포함하고 추가 설명 없이 JSON 만 출력하세요.
+예: {{"1": "white", "2": "charcoal", "3": "pass"}}"""
+
+prompt_template = ChatPromptTemplate.from_messages([("system", SYSTEM_PROMPT), ("user", "{labels}")])
+
+
+# --- 1. catalog 스트리밍 ---
+
+def iter_catalog(path: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    최상위 JSON 배열(또는 JSONL)의 객체를 하나씩 반환
+    chunk_size 씩 읽어 버퍼에서 완성된 객체만 decode 하므로 메모리는 가장 큰 객체 + chunk 정도
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer, position, eof, started = "", 0, False, False
+        while True:
+            # 객체 사이의 공백 / 쉼표 건너뛰기
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and not started:
+                started = True
+                if buffer[position] == "[":
+                    position += 1
+                    continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            value = None
+            if position < len(buffer):
+                try:
+                    value, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                return
+            if value is not None:
+                yield value
+                continue
+            # 객체가 아직 다 읽히지 않음: 처리한 앞부분을 버리고 더 읽는다
+            chunk = f.read(chunk_size)
+            buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+
+
+def color_labels(product: dict) -> list[str]:
+    """상품의 색상 옵션명 (color_size_info 가 "failed" 등 dict 가 아니면 빈 리스트)"""
+    info = product.get("color_size_info")
+    return [str(label) for label in info] if isinstance(info, dict) else []
+
+
+# 앞에 붙은 옵션 번호 ("[17]화이트", "(3) 블랙", "01화이트", "06 WHITE", "1. 네이비") — "7부 블랙" 의 7 은 남긴다
+_INDEX_PREFIX_RE = re.compile(r"^(?:\[\d+\]|\(\d+\)|\d{2,}(?=\D)|\d+[._)\-])\s*")
+# 앞에 붙은 품번 ("LRAMCTR702P_화이트", "LKTMCTR701M 블랙"): 영문과 숫자가 섞인 5자 이상 토큰 + 구분자
+_SKU_PREFIX_RE = re.compile(r"^(?=[a-z0-9]*\d)(?=[a-z0-9]*[a-z])[a-z0-9]{5,}[_\s\-]+(?=\S)")
+
+
+def label_key(label: str) -> str:
+    """
+    중복 제거 / 사전 key 이자 LLM 에 보내는 라벨: NFKC + casefold + 공백 정리 + 앞 번호 / 품번 prefix 제거
+    괄호 내용("멜란지(그레이)")과 라벨 중간의 숫자("네이비 2톤")는 색 정보일 수 있으므로 남긴다
+    """
+    text = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", label).casefold()).strip()
+    key = _SKU_PREFIX_RE.sub("", _INDEX_PREFIX_RE.sub("", text)).strip()
+    return key or text
+
+
+# --- 2. 색상 사전 ---
+
+class ColorDictionary:
+    """
+    label_key → 표준 색상명 영구 사전 (COLOR_PROMPT_VERSION 별)
+    batch 마다 commit 되므로 중단 후 재실행하면 남은 라벨만 LLM 에 보낸다
+    """
+
+    def __init__(self, path: str = "color_dictionary.sqlite", prompt_version: str = COLOR_PROMPT_VERSION):
+        self.path = path
+        self.prompt_version = prompt_version
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS colors ("
+            "label TEXT NOT NULL, prompt_version TEXT NOT NULL, color TEXT NOT NULL, "
+            "model TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (label, prompt_version))"
+        )
+
+    def get_many(self, labels: Iterable[str], chunk: int = 500) -> dict[str, str]:
+        labels, found = list(labels), {}
+        for i in range(0, len(labels), chunk):
+            part = labels[i:i + chunk]
+            rows = self._conn.execute(
+                f"SELECT label, color FROM colors WHERE prompt_version = ? AND label IN ({','.join('?' * len(part))})",
+                (self.prompt_version, *part),
+            )
+            found.update(rows)
+        return found
+
+    def put_many(self, mapping: dict[str, str], model: str) -> None:
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO colors VALUES (?, ?, ?, ?, ?)",
+                [(label, self.prompt_version, color, model, now) for label, color in mapping.items()],
+            )
+
+    def __len__(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM colors WHERE prompt_version = ?", (self.prompt_version,)
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# --- 3. LLM batch ---
+
+def plan_batches(labels: list[str], max_batch_tokens: int = 1500, max_batch_labels: int = 100) -> list[list[str]]:
+    """입력 토큰 합이 max_batch_tokens, 라벨 수가 max_batch_labels 를 넘지 않도록 나눈 batch"""
+    batches, batch, tokens = [], [], 0
+    for label in labels:
+        label_tokens = estimate_text_tokens(f"{len(batch) + 1}. {label}\n")
+        if batch and (tokens + label_tokens > max_batch_tokens or len(batch) >= max_batch_labels):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(label)
+        tokens += label_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def parse_batch_response(text: str, labels: list[str]) -> dict[str, str]:
+    """{"1": "white", ...} → {label: color} (빠진 번호 / 빈 값은 제외, 잘린 응답은 완성된 항목만)"""
+    data, _ = extract_json(text)
+    if not isinstance(data, dict):
+        return {}
+    mapping = {}
+    for key, color in data.items():
+        try:
+            index = int(key) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < len(labels) and isinstance(color, str) and color.strip():
+            mapping[labels[index]] = re.sub(r"\s+", " ", color.strip().lower())
+    return mapping
+
+
+@dataclass
+class ColorJobStats:
+    products: int = 0
+    label_occurrences: int = 0
+    unique_labels: int = 0
+    label_keys: int = 0
+    dictionary_hits: int = 0
+    llm_labels: int = 0
+    llm_calls: int = 0
+    failed_labels: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def summary(self) -> str:
+        return (
+            f"상품 {self.products:,} | 색상 옵션 {self.label_occurrences:,} → 고유 {self.unique_labels:,} → key {self.label_keys:,} "
+            f"| 사전 hit {self.dictionary_hits:,}, LLM {self.llm_labels:,} labels / {self.llm_calls} calls, 실패 {self.failed_labels} "
+            f"| tokens in {self.input_tokens:,} / out {self.output_tokens:,} | {time.monotonic() - self.started:.1f}s"
+        )
+
+
+async def normalize_labels(
+    labels: list[str],
+    chain,
+    model_name: str,
+    dictionary: ColorDictionary,
+    stats: ColorJobStats,
+    concurrency: int = 4,
+    max_batch_tokens: int = 1500,
+    max_batch_labels: int = 100,
+    max_rounds: int = 2,
+) -> None:
+    """
+    사전에 없는 라벨을 batch 로 표준화하여 사전에 저장
+    응답에서 빠진 라벨은 다음 round 에 다시 묶어 보내고, max_rounds 후에도 남으면 사전에 넣지 않는다 (다음 실행에서 재시도)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(batch: list[str]) -> set[str]:
+        text = "\n".join(f"{i}. {label}" for i, label in enumerate(batch, 1))
+        async with semaphore:
+            try:
+                message = await chain.ainvoke({"labels": text})
+            except Exception as e:
+                print(f"[color_normalization] batch 실패 ({len(batch)} labels): {e!r}")
+                return set(batch)
+        stats.llm_calls += 1
+        usage = getattr(message, "usage_metadata", None) or {}
+        stats.input_tokens += usage.get("input_tokens", 0)
+        stats.output_tokens += usage.get("output_tokens", 0)
+        try:
+            mapping = parse_batch_response(str(message.content), batch)
+        except Exception:
+            mapping = {}
+        if mapping:
+            dictionary.put_many(mapping, model_name)
+        return set(batch) - set(mapping)
+
+    pending = labels
+    for _ in range(max_rounds):
+        if not pending:
+            break
+        batches = plan_batches(pending, max_batch_tokens, max_batch_labels)
+        missing = await asyncio.gather(*(run(batch) for batch in batches))
+        pending = [label for label in pending if any(label in m for m in missing)]
+    stats.failed_labels = len(pending)
+
+
+# --- 4. 작업 ---
+
+def build_chain(model=None, model_name: Optional[str] = None):
+    """(chain, 사전에 기록할 모델 이름): model 이 없고 model_name 도 없으면 router 가 color_normalization 조건으로 선택"""
+    if model is not None:
+        name = model_name or getattr(model, "model", None) or getattr(model, "name", None) or type(model).__name__
+        return prompt_template | scheduled(model, name, Priority.BATCH, output_tokens=1024), name
+    # 모델 초기화 비용(인증 등)이 있으므로 실제 호출하는 경우에만 import
+    from app.langgraph.llm_registry import get_chat_model
+
+    if model_name:
+        return prompt_template | scheduled(get_chat_model(model_name), model_name, Priority.BATCH, output_tokens=1024), model_name
+    return prompt_template | routed("color_normalization", get_chat_model, Priority.BATCH), "auto"
+
+
+async def run_color_job(
+    catalog_path: str,
+    output_path: str,
+    dictionary: Optional[ColorDictionary] = None,
+    model=None,
+    model_name: Optional[str] = None,
+    concurrency: int = 4,
+    max_batch_tokens: int = 1500,
+    max_batch_labels: int = 100,
+) -> ColorJobStats:
+    """
+    catalog 의 모든 색상 옵션명을 표준화하여 output_path(JSONL) 에 상품별로 기록
+
+    Args:
+        dictionary: 색상 사전 (None 이면 COLOR_DICTIONARY_PATH)
+        model / model_name: 표준화에 쓸 chat model / 모델 이름 (둘 다 없으면 llm_router 가 선택, 실패 시 다음 모델)
+        max_batch_tokens / max_batch_labels: LLM 요청 하나에 넣을 라벨의 입력 토큰 / 개수 상한
+    """
+    if dictionary is None:
+        dictionary = ColorDictionary(os.getenv("COLOR_DICTIONARY_PATH", "color_dictionary.sqlite"))
+    stats = ColorJobStats()
+
+    # 1차: 전역 중복 제거 (고유 라벨 수만큼만 메모리 사용)
+    unique: set[str] = set()
+    for product in iter_catalog(catalog_path):
+        labels = color_labels(product)
+        stats.products += 1
+        stats.label_occurrences += len(labels)
+        unique.update(labels)
+    stats.unique_labels = len(unique)
+    keys = sorted({label_key(label) for label in unique})
+    stats.label_keys = len(keys)
+
+    known = dictionary.get_many(keys)
+    stats.dictionary_hits = len(known)
+    unseen = [label for label in keys if label not in known]
+    stats.llm_labels = len(unseen)
+    if unseen:
+        chain, name = build_chain(model, model_name)
+        await normalize_labels(
+            unseen, chain, name, dictionary, stats, concurrency, max_batch_tokens, max_batch_labels,
+        )
+        known.update(dictionary.get_many(unseen))
+
+    # 2차: 상품별 결과 기록 (사전에 없는 라벨은 "pass")
+    sink = JsonlSink(output_path, mode="w")
+    try:
+        for product in iter_catalog(catalog_path):
+            labels = color_labels(product)
+            if not labels:
+                continue
+            sink.write({
+                "product_id": product.get("product_id"),
+                "colors": labels,
+                "colors_transformed": [known.get(label_key(label), PASS) for label in labels],
+            })
+    finally:
+        sink.close()
+    return stats
+
+
+# --- 실행 예시 / dry-run ---
+
+# dry-run 용 색상 (label_key → 표준 색상명)
+_DRY_RUN_COLORS = {
+    "화이트": "white", "블랙": "black", "차콜": "charcoal", "네이비": "navy", "베이지": "beige", "아이보리": "ivory",
+    "라이트그레이": "light gray", "멜란지그레이": "melange gray", "카키": "khaki", "브라운": "brown", "소라": "sky blue",
+    "white": "white", "black": "black", "dark gray": "dark gray", "light blue": "light blue", "indigo": "indigo",
+    "be": "beige", "br": "brown", "na": "navy", "lt gray": "light gray", "차콜_기모": "charcoal", "블랙/화이트": "black/white",
+}
+
+
+def _write_synthetic_catalog(path: str, n_products: int) -> None:
+    """고유 색상 라벨 수백 개를 공유하는 상품 n_products 개의 catalog (최상위 JSON 배열, 일부는 "failed")"""
+    import random
+
+    rng = random.Random(0)
+    bases = list(_DRY_RUN_COLORS) + ["RED BEAN", "ALMOND", "SOBORO"]
+    codes = [f"LKTMCTR{700 + i}M" for i in range(60)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(n_products):
+            if rng.random() < 0.05:
+                info = "failed"
+            else:
+                style = rng.choice(["plain", "code", "bracket", "number"])
+                labels = []
+                for base in rng.sample(bases, rng.randint(1, 5)):
+                    if style == "code":
+                        base = f"{rng.choice(codes)}_{base}"
+                    elif style == "bracket":
+                        base = f"[{rng.randint(1, 40)}]{base.upper()}"
+                    elif style == "number":
+                        base = f"{rng.randint(1, 9):02d}{base}"
+                    labels.append(base)
+                info = {label: ["S", "M", "L"] for label in labels}
+            product = {"product_id": str(4_000_000 + i), "color_size_info": info}
+            f.write(("," if i else "") + json.dumps(product, ensure_ascii=False) + "\n")
+        f.write("]\n")
+
+
+def _dry_run_model(latency: float):
+    """LLM 대신 latency 만큼 기다린 뒤 _DRY_RUN_COLORS 로 답하는 fake model (모르는 라벨은 "pass")"""
+    import random
+
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    async def respond(prompt) -> AIMessage:
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        lines = str(prompt.to_messages()[-1].content).splitlines()
+        answer = {}
+        for line in lines:
+            number, _, label = line.partition(". ")
+            answer[number] = _DRY_RUN_COLORS.get(label, PASS)
+        content = json.dumps(answer, ensure_ascii=False)
+        input_tokens = estimate_text_tokens(SYSTEM_PROMPT + "\n".join(lines))
+        output_tokens = estimate_text_tokens(content)
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens,
+        })
+
+    return RunnableLambda(respond, name="dry-run")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("catalog")
+    arg_parser.add_argument("output")
+    arg_parser.add_argument("--dictionary", default=os.getenv("COLOR_DICTIONARY_PATH", "color_dictionary.sqlite"))
+    arg_parser.add_argument("--model", default=None, help="None 이면 llm_router 가 color_normalization 조건으로 선택")
+    arg_parser.add_argument("--concurrency", type=int, default=4)
+    arg_parser.add_argument("--max-batch-tokens", type=int, default=1500)
+    arg_parser.add_argument("--max-batch-labels", type=int, default=100)
+    arg_parser.add_argument("--synthetic", type=int, default=0, help="상품 N개의 synthetic catalog 를 생성")
+    arg_parser.add_argument("--dry-run-latency", type=float, default=None, help="LLM 대신 fake model 사용 (초)")
+    args = arg_parser.parse_args()
+
+    if args.synthetic:
+        _write_synthetic_catalog(args.catalog, args.synthetic)
+    dry_run_model = _dry_run_model(args.dry_run_latency) if args.dry_run_latency is not None else None
+
+    result = asyncio.run(run_color_job(
+        args.catalog, args.output, ColorDictionary(args.dictionary), model=dry_run_model, model_name=args.model,
+        concurrency=args.concurrency, max_batch_tokens=args.max_batch_tokens, max_batch_labels=args.max_batch_labels,
+    ))
+    print(f"[color_normalization] 완료: {result.summary()}")
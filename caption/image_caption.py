@@ -1,18 +1,24 @@
 import base64
+import json
 import os
 from pprint import pprint
 from typing import List, Optional, Literal
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field, HttpUrl
 from enum import Enum
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from app.langgraph.llm_router import get_llm_router
+from app.langgraph.llm_scheduler import Priority, scheduled
+
 # 이미지 전처리 모듈 import
-from .image_preprocessing import preprocess_and_concat_images, pil_to_base64
+from .caption_cache import sha256_hex
+from .image_layout import Layout, plan_layout
+from .image_preprocessing import compose_views, pil_to_base64
+from .output_parsing import TolerantOutputParser, bind_native_output, get_path, set_path
 
 # --- 1. Pydantic 클래스 설계 (데이터 구조의 Python 표현) ---
 # JSON 구조를 Pydantic 모델로 변환하여 VLM의 출력 형식을 강제합니다.
@@ -109,46 +115,151 @@ class EmbeddingCaptions(BaseModel):
     tpo_context_description: str = Field(description="다중 임베딩(TPO)용. 이 옷의 추천 활용 상황을 설명하는 캡션.")
     comprehensive_description: str = Field(description="단일 임베딩(초기)용. 모든 정보를 종합한 최종 상품 설명문.")
 
+# schema 에 드러나지 않는 의미 변경(필드 해석 등) 시에만 수동으로 올림 (schema / enum 동의어 변경은 아래 hash 로 자동 반영)
+MASTER_CAPTION_SEMANTIC_VERSION = "1"
+
 class MasterCaption(BaseModel):
     """VLM으로부터 추출할 의류 정보의 전체 마스터 데이터 구조"""
     structured_attributes: StructuredAttributes = Field(description="필터링 및 UI 구성을 위한 구조화된 속성 정보")
     embedding_captions: EmbeddingCaptions = Field(description="벡터 검색 임베딩에 사용될 다양한 목적의 자연어 캡션")
 
+# VLM 이 enum 값 대신 자주 쓰는 표현 (값 / 멤버 이름 / 괄호 앞부분은 자동으로 인식)
+ENUM_SYNONYMS = {
+    SleeveLength: {
+        "나시": SleeveLength.SLEEVELESS, "슬리브리스": SleeveLength.SLEEVELESS,
+        "반팔": SleeveLength.SHORT_SLEEVE, "숏슬리브": SleeveLength.SHORT_SLEEVE,
+        "5부소매": SleeveLength.FIVE_QUARTER_SLEEVE, "7부소매": SleeveLength.SEVEN_QUARTER_SLEEVE,
+        "긴팔": SleeveLength.LONG_SLEEVE, "롱슬리브": SleeveLength.LONG_SLEEVE,
+    },
+    BodyLength: {
+        "숏": BodyLength.CROP, "크롭기장": BodyLength.CROP,
+        "기본기장": BodyLength.REGULAR, "레귤러기장": BodyLength.REGULAR,
+        "롱기장": BodyLength.LONG, "맥시기장": BodyLength.MAXI, "발목기장": BodyLength.MAXI,
+    },
+    NecklineType: {
+        "라운드": NecklineType.ROUND_NECK, "크루넥": NecklineType.ROUND_NECK,
+        "브이넥": NecklineType.V_NECK, "유넥": NecklineType.U_NECK,
+        "스퀘어": NecklineType.SQUARE_NECK, "셔츠카라": NecklineType.SHIRT_COLLAR, "카라": NecklineType.SHIRT_COLLAR,
+        "칼라": NecklineType.SHIRT_COLLAR, "터틀넥": NecklineType.HIGH_NECK, "목폴라": NecklineType.HIGH_NECK,
+        "폴라": NecklineType.HIGH_NECK, "모크넥": NecklineType.HIGH_NECK,
+    },
+    PatternType: {
+        "무지": PatternType.NONE, "솔리드": PatternType.NONE, "단색": PatternType.NONE,
+        "줄무늬": PatternType.STRIPE, "스트라이프패턴": PatternType.STRIPE, "땡땡이": PatternType.DOT,
+        "도트패턴": PatternType.DOT, "물방울": PatternType.DOT, "체크무늬": PatternType.CHECK, "깅엄": PatternType.CHECK,
+        "꽃무늬": PatternType.FLORAL, "플라워": PatternType.FLORAL, "프린팅": PatternType.GRAPHIC, "레터링": PatternType.GRAPHIC,
+    },
+    FitType: {
+        "슬림": FitType.SLIM, "레귤러": FitType.REGULAR, "기본핏": FitType.REGULAR, "스탠다드핏": FitType.REGULAR,
+        "오버": FitType.OVERSIZED, "오버사이즈": FitType.OVERSIZED, "오버사이즈핏": FitType.OVERSIZED,
+        "릴렉스": FitType.RELAXED, "루즈핏": FitType.RELAXED, "세미오버핏": FitType.RELAXED,
+    },
+    SilhouetteType: {
+        "A": SilhouetteType.A_LINE, "H": SilhouetteType.H_LINE, "I": SilhouetteType.I_LINE, "X": SilhouetteType.X_LINE,
+        "박스": SilhouetteType.H_LINE, "스트레이트": SilhouetteType.I_LINE, "머메이드라인": SilhouetteType.MERMAID,
+    },
+}
+
+
+
+def caption_schema_version() -> str:
+    """
+    캡션 캐시 key 에 들어가는 schema 버전: 수동 버전 + MasterCaption JSON schema / ENUM_SYNONYMS 의 hash
+    필드 / enum 값 / 설명 / 동의어가 바뀌면 버전을 올리지 않아도 캐시된 캡션이 무효화된다
+    """
+    synonyms = {
+        enum_cls.__name__: {synonym: member.value for synonym, member in sorted(table.items())}
+        for enum_cls, table in sorted(ENUM_SYNONYMS.items(), key=lambda item: item[0].__name__)
+    }
+    fingerprint = json.dumps([MasterCaption.model_json_schema(), synonyms], ensure_ascii=False, sort_keys=True)
+    return f"{MASTER_CAPTION_SEMANTIC_VERSION}-{sha256_hex(fingerprint)[:12]}"
+
+
+MASTER_CAPTION_SCHEMA_VERSION = caption_schema_version()
+
+# native 모드(function calling) 에서 Gemini function declaration 이 표현하지 못하는 필드의 schema
+# (dict[Literal, A | B] 는 STRING 으로 바뀌므로 primary / secondary 를 명시한 object 로 보낸다)
+_color_detail_schema = ColorDetail.model_json_schema()
+NATIVE_SCHEMA_OVERRIDES = {
+    "structured_attributes.common.color": {
+        "type": "object",
+        "properties": {
+            "primary": _color_detail_schema,
+            "secondary": {"type": "array", "items": _color_detail_schema},
+        },
+        "required": ["primary", "secondary"],
+    },
+}
+
 # --- 2. LangChain 프롬프트 및 체인 구성 ---
 
 # Pydantic 파서 생성: VLM이 이 구조에 맞춰 출력하도록 강제
-parser = PydanticOutputParser(pydantic_object=MasterCaption)
+# (흔한 결함 - 앞뒤 설명 문장, trailing comma, enum 동의어 등 - 은 복구 후 검증)
+parser = TolerantOutputParser(pydantic_object=MasterCaption, enum_synonyms=ENUM_SYNONYMS)
 
-# VLM 모델 초기화 (Gemini 1.5 Pro Vision 모델 사용)
+# VLM 모델 초기화 (CAPTION_MODEL 이 없으면 llm_router 가 deep_caption 조건에 맞는 가장 싼 버전 고정 모델 선택)
+# 캡션 캐시 key 에 모델 이름이 들어가므로 실행 중에는 모델을 바꾸지 않는다
 # temperature=0으로 설정하여 더 일관성 있고 사실에 기반한 출력을 유도
+CAPTION_MODEL = os.getenv("CAPTION_MODEL") or get_llm_router().select("deep_caption").name
 model = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash-001",
+    model=CAPTION_MODEL,
     temperature=0,
     # project="YOUR_GCP_PROJECT_ID" # 필요한 경우 프로젝트 ID 지정
 )
 
-# 프롬프트 템플릿 정의
-prompt_template = ChatPromptTemplate.from_messages(
-    [
-        SystemMessage(
-            content="""당신은 고도로 숙련된 패션 전문 MD이자 AI 콘텐츠 생성 전문가입니다. 당신의 임무는 주어진 1개의 복합 의류 이미지를 정밀하게 분석하여, 사용자가 요청한 JSON 형식에 맞춰 모든 정보를 최대한 정확하게 추출하고 생성하는 것입니다.
-- 제공되는 이미지는 의류의 '정면(누끼컷)', '후면(누끼컷)', '모델 착용샷(정면)' 3가지 뷰가 하나로 합쳐져 있습니다. 모든 뷰의 정보를 종합적으로 활용하여 답변해야 합니다.
+SYSTEM_PROMPT = """당신은 고도로 숙련된 패션 전문 MD이자 AI 콘텐츠 생성 전문가입니다. 당신의 임무는 주어진 1개의 복합 의류 이미지를 정밀하게 분석하여, 사용자가 요청한 JSON 형식에 맞춰 모든 정보를 최대한 정확하게 추출하고 생성하는 것입니다.
+- 제공되는 이미지는 의류의 '정면(누끼컷)', '후면(누끼컷)', '모델 착용샷(정면)' 뷰 중 일부 또는 전부가 이 순서대로 하나로 합쳐져 있습니다. 뷰의 배치는 요청 메시지에 안내됩니다. 모든 뷰의 정보를 종합적으로 활용하여 답변해야 합니다.
 - 모든 정보는 제공된 이미지에서 시각적으로 확인할 수 있는 내용에 기반해야 합니다.
 - 특정 필드에 해당하는 정보가 없거나 판단이 불가능할 경우, 해당 필드의 값은 `null`을 사용하십시오.
 - 모든 텍스트 설명과 태그 값은 반드시 한국어로 작성해야 합니다."""
+
+# 프롬프트 템플릿 정의
+# native 모드에서는 format_instructions 를 빈 문자열로 두고 schema 는 tool 로 전달
+prompt_template = ChatPromptTemplate.from_messages(
+    [
+        SystemMessage(content=SYSTEM_PROMPT),
+        # HumanMessage 객체는 템플릿 변수가 치환되지 않으므로 ("human", ...) 튜플 형태로 정의
+        (
+            "human",
+            [
+                {"type": "text", "text": "아래 지침에 따라, 주어진 이미지를 분석하고 전체 JSON 객체를 완성해 주십시오.\n{layout_description}\n{format_instructions}"},
+                {"type": "image_url", "image_url": "data:image/jpeg;base64,{image_data}"},
+            ],
         ),
-        HumanMessage(
-            content=[
-                {"type": "text", "text": "아래 지침에 따라, 주어진 이미지를 분석하고 전체 JSON 객체를 완성해 주십시오.\n{format_instructions}"},
+    ]
+)
+
+# 응답 중 검증에 실패한 sub-object(path) 만 다시 요청하는 프롬프트
+repair_prompt_template = ChatPromptTemplate.from_messages(
+    [
+        SystemMessage(content=SYSTEM_PROMPT),
+        (
+            "human",
+            [
+                {
+                    "type": "text",
+                    "text": "이전 응답의 `{path}` 항목이 형식에 맞지 않습니다.\n오류: {errors}\n이전 값: {previous}\n"
+                            "이미지를 다시 확인하고 `{path}` 항목의 JSON 객체만 출력해 주십시오.\n{layout_description}\n{format_instructions}",
+                },
                 {"type": "image_url", "image_url": "data:image/jpeg;base64,{image_data}"},
-            ]
+            ],
         ),
     ]
 )
 
 # LCEL을 이용한 체인 구성
 # 프롬프트 -> 모델 -> 파서 순서로 파이프라인을 연결
-chain = prompt_template | model | parser
+# 다른 LLM 호출 지점과 RPM / TPM 한도를 공유 (단건 캡셔닝도 배치 우선순위)
+chain = prompt_template | scheduled(model, model.model, Priority.BATCH) | parser
+# 파싱 전 응답(AIMessage) 을 받는 체인: 복구 후에도 틀린 sub-object 만 repair_chain 으로 다시 요청 (batch_caption 과 동일)
+raw_chain = prompt_template | scheduled(model, model.model, Priority.BATCH)
+repair_chain = repair_prompt_template | scheduled(model, model.model, Priority.BATCH)
+# provider 의 function calling 으로 schema 를 강제하는 체인 (format_instructions 는 빈 문자열로 호출)
+native_chain = (
+    prompt_template
+    | scheduled(bind_native_output(model, MasterCaption, NATIVE_SCHEMA_OVERRIDES), model.model, Priority.BATCH)
+    | parser
+)
 
 
 # --- 3. 체인 실행 (Invoke) ---
@@ -181,35 +292,38 @@ def encode_image(image_path):
 #         return None
 
 
-def get_caption_from_multiple_images(image_paths, target_size=224, concat_direction='horizontal'):
+def get_caption_from_multiple_images(image_paths, target_size=224, concat_direction='auto', max_repair_rounds=1):
     """
     여러 이미지를 전처리하고 합쳐서 VLM에 전달하는 함수
     
     Args:
-        image_paths: 이미지 파일 경로 리스트
-        target_size: 각 이미지의 목표 크기
-        concat_direction: 'horizontal' 또는 'vertical'
+        image_paths: 이미지 파일 경로 리스트 (정면, 후면, 모델 착용샷 중 있는 것만)
+        target_size: 각 이미지의 목표 크기 (concat_direction 이 'auto' 이면 사용하지 않음)
+        concat_direction: 'auto' (모델의 이미지 토큰 예산에 맞춰 grid / strip 선택), 'horizontal' 또는 'vertical'
+        max_repair_rounds: 응답을 복구해도 검증에 실패한 sub-object 를 다시 요청하는 횟수
     
     Returns:
         VLM 분석 결과 (MasterCaption 객체)
     """
     try:
         # 이미지 전처리 및 합치기
-        combined_image = preprocess_and_concat_images(
-            image_paths, 
-            target_size, 
-            concat_direction
-        )
+        if concat_direction == 'auto':
+            layout = plan_layout(len(image_paths), model.model)
+        else:
+            layout = Layout.strip(len(image_paths), target_size, concat_direction)
+        combined_image = compose_views(image_paths, layout)
         
         # PIL Image를 base64로 변환
         base64_image = pil_to_base64(combined_image)
         
         # VLM 체인 호출
         print("VLM 모델을 호출하여 캡션 정보를 추출합니다...")
-        result = chain.invoke({
+        inputs = {
             "image_data": base64_image,
+            "layout_description": layout.describe(),
             "format_instructions": parser.get_format_instructions()
-        })
+        }
+        result = parse_with_repair(raw_chain.invoke(inputs), inputs, max_repair_rounds)
         print("정보 추출이 완료되었습니다.")
         return result
         
@@ -218,41 +332,42 @@ def get_caption_from_multiple_images(image_paths, target_size=224, concat_direct
         return None
 
 
-def get_caption_from_multiple_images(image_paths, target_size=224, concat_direction='horizontal'):
+def parse_with_repair(message, inputs, max_repair_rounds=1):
     """
-    여러 이미지를 전처리하고 합쳐서 VLM에 전달하는 함수
-    
-    Args:
-        image_paths: 이미지 파일 경로 리스트
-        target_size: 각 이미지의 목표 크기
-        concat_direction: 'horizontal' 또는 'vertical'
-    
+    VLM 응답을 복구 / 검증하고, 그래도 틀린 sub-object(예: structured_attributes.front) 만 다시 요청
+    (응답 하나의 결함으로 전체 캡션을 버리지 않음, batch_caption._call_vlm 과 같은 흐름)
+
     Returns:
-        VLM 분석 결과 (MasterCaption 객체)
+        MasterCaption 객체 (재요청 후에도 검증에 실패하면 None)
     """
-    try:
-        # 이미지 전처리 및 합치기
-        combined_image = preprocess_and_concat_images(
-            image_paths, 
-            target_size, 
-            concat_direction
-        )
-        
-        # PIL Image를 base64로 변환
-        base64_image = pil_to_base64(combined_image)
-        
-        # VLM 체인 호출
-        print("VLM 모델을 호출하여 캡션 정보를 추출합니다...")
-        result = chain.invoke({
-            "image_data": base64_image,
-            "format_instructions": parser.get_format_instructions()
-        })
-        print("정보 추출이 완료되었습니다.")
-        return result
-        
-    except Exception as e:
-        print(f"오류가 발생했습니다: {e}")
+    parsed = parser.repair(message)
+    for _ in range(max_repair_rounds):
+        if parsed.ok:
+            break
+        data = parsed.data
+        for path, errors in parsed.invalid.items():
+            sub_parser = parser.for_path(path)
+            print(f"'{path or '전체'}' 항목을 다시 요청합니다: {'; '.join(errors[:5])}")
+            try:
+                sub_message = repair_chain.invoke({
+                    **inputs,
+                    "path": path or "전체",
+                    "errors": "; ".join(errors[:5]),
+                    "previous": json.dumps(get_path(data, path), ensure_ascii=False)[:2000],
+                    "format_instructions": sub_parser.get_format_instructions(),
+                })
+            except Exception as e:
+                print(f"'{path or '전체'}' 재요청 실패: {e}")
+                continue
+            sub_parsed = sub_parser.repair(sub_message)
+            data = set_path(data, path, sub_parsed.value.model_dump(mode="json") if sub_parsed.ok else sub_parsed.data)
+        parsed = parser.repair(data)
+    if parsed.repairs:
+        print(f"응답 복구: {parsed.repairs}")
+    if not parsed.ok:
+        print(f"응답 검증 실패: {parsed.invalid}")
         return None
+    return parsed.value
 
 
 # --- 실행 예시 ---
@@ -273,11 +388,7 @@ if __name__ == "__main__":
 
     
     '''
-    result2 = get_caption_from_multiple_images(
-        multiple_images, 
-        target_size=224, 
-        concat_direction='horizontal'
-    )
+    result2 = get_caption_from_multiple_images(multiple_images)
     
     # 결과 출력 (방법 2 사용)
     if result2:
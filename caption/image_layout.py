@@ -0,0 +1,156 @@
+"""
+합성 캡션 이미지의 뷰 배치(layout) / 타일 크기 결정
+
+VLM 이미지 토큰은 합쳐진 이미지의 크기와 가로세로 비로 정해진다 (image_tokens).
+3개 뷰를 512px 가로 strip(1536x512)으로 붙이면 긴 변 방향으로 타일이 늘어 토큰 대부분이 검정 패딩에 쓰이므로,
+뷰 수(1~3, 일부 뷰가 없을 수 있음)에 맞춰 strip / grid 와 타일 크기를 골라 토큰 예산 안에서 뷰당 해상도를 최대화한다.
+"""
+import json
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+# Gemini 이미지 토큰 (추정치, 실제 사용량은 응답의 usage_metadata 로 확인)
+# - 1.x: 크기와 무관하게 이미지당 258
+# - 2.x 이후: 양 변 384px 이하이면 258, 그보다 크면 crop unit(짧은 변 / 1.5) 단위 타일로 잘라 768x768 로 스케일, 타일당 258
+IMAGE_TILE_TOKENS = 258
+SMALL_IMAGE_MAX_SIDE = 384
+TILE_SCALE_SIZE = 768
+
+# 기본 예산: 타일 4개 (3개 뷰 2x2 grid 기준 뷰당 576px)
+DEFAULT_IMAGE_TOKEN_BUDGET = 4 * IMAGE_TILE_TOKENS
+
+GEMINI_MODELS_PATH = Path(__file__).resolve().parent.parent / "gemini_models.json"
+
+
+def normalize_model_name(model_name: Optional[str]) -> str:
+    """"models/gemini-2.0-flash-001" → "gemini-2.0-flash-001\""""
+    return (model_name or "").split("/")[-1]
+
+
+def _crop_unit(width: int, height: int) -> int:
+    return max(1, min(width, height) * 2 // 3)
+
+
+def image_tokens(width: int, height: int, model_name: Optional[str] = None) -> int:
+    """이미지 한 장의 VLM 입력 토큰 추정"""
+    if normalize_model_name(model_name).startswith("gemini-1."):
+        return IMAGE_TILE_TOKENS
+    if width <= SMALL_IMAGE_MAX_SIDE and height <= SMALL_IMAGE_MAX_SIDE:
+        return IMAGE_TILE_TOKENS
+    unit = _crop_unit(width, height)
+    return IMAGE_TILE_TOKENS * math.ceil(width / unit) * math.ceil(height / unit)
+
+
+@lru_cache(maxsize=None)
+def model_token_limits(model_name: Optional[str]) -> tuple[Optional[int], Optional[int]]:
+    """gemini_models.json 의 (inputTokenLimit, outputTokenLimit), 모르는 모델이면 (None, None)"""
+    name = normalize_model_name(model_name)
+    try:
+        with open(GEMINI_MODELS_PATH, encoding="utf-8") as f:
+            models = json.load(f)["full_response"]["models"]
+    except (OSError, KeyError, json.JSONDecodeError):
+        return None, None
+    for model in models:
+        if normalize_model_name(model.get("name")) == name:
+            return model.get("inputTokenLimit"), model.get("outputTokenLimit")
+    return None, None
+
+
+@dataclass(frozen=True)
+class Layout:
+    """rows x cols 격자에 정사각형 타일(tile_size)로 n_views 개의 뷰를 왼쪽 위부터 행 순서로 배치"""
+
+    rows: int
+    cols: int
+    tile_size: int
+    n_views: int
+
+    @classmethod
+    def strip(cls, n_views: int, tile_size: int, concat_direction: str = "horizontal") -> "Layout":
+        if concat_direction == "horizontal":
+            return cls(1, n_views, tile_size, n_views)
+        return cls(n_views, 1, tile_size, n_views)
+
+    @property
+    def canvas_size(self) -> tuple[int, int]:
+        return self.cols * self.tile_size, self.rows * self.tile_size
+
+    @property
+    def empty_cells(self) -> int:
+        return self.rows * self.cols - self.n_views
+
+    def positions(self) -> list[tuple[int, int]]:
+        """각 뷰 타일의 왼쪽 위 좌표"""
+        return [((i % self.cols) * self.tile_size, (i // self.cols) * self.tile_size) for i in range(self.n_views)]
+
+    def tokens(self, model_name: Optional[str] = None) -> int:
+        return image_tokens(*self.canvas_size, model_name)
+
+    def effective_tile_size(self, model_name: Optional[str] = None) -> float:
+        """VLM 이 실제로 보는 뷰당 해상도 (타일이 768px 로 축소되면 그만큼 감소)"""
+        width, height = self.canvas_size
+        if normalize_model_name(model_name).startswith("gemini-1.") or max(width, height) <= SMALL_IMAGE_MAX_SIDE:
+            return float(self.tile_size)
+        return self.tile_size * min(1.0, TILE_SCALE_SIZE / _crop_unit(width, height))
+
+    def describe(self) -> str:
+        """프롬프트에 넣을 배치 설명"""
+        if self.n_views == 1:
+            return "이미지에는 1개의 뷰만 있습니다."
+        if self.rows == 1:
+            return f"이미지는 {self.n_views}개의 뷰를 왼쪽부터 가로로 이어붙인 것입니다."
+        if self.cols == 1:
+            return f"이미지는 {self.n_views}개의 뷰를 위에서부터 세로로 이어붙인 것입니다."
+        empty = " 빈 칸은 검정색입니다." if self.empty_cells else ""
+        return f"이미지는 {self.rows}x{self.cols} 격자에 {self.n_views}개의 뷰를 왼쪽 위부터 행 순서로 배치한 것입니다.{empty}"
+
+
+def plan_layout(
+    n_views: int,
+    model_name: Optional[str] = None,
+    token_budget: int = DEFAULT_IMAGE_TOKEN_BUDGET,
+    min_tile: int = 128,
+    max_tile: int = 768,
+    step: int = 16,
+    reserved_tokens: int = 0,
+) -> Layout:
+    """
+    토큰 예산 안에서 뷰당 실효 해상도가 가장 큰 배치 선택
+    (같으면 토큰 → 타일 크기(전송 bytes) → 빈 칸 수가 작은 쪽)
+
+    Args:
+        token_budget: 이미지 토큰 예산. 모델 입력 한도(gemini_models.json) - reserved_tokens 를 넘지 않게 줄인다
+        reserved_tokens: 프롬프트 텍스트 등 이미지 외 입력 토큰
+    """
+    if n_views < 1:
+        raise ValueError("뷰가 최소 1개 있어야 합니다.")
+    input_limit, _ = model_token_limits(model_name)
+    if input_limit:
+        token_budget = min(token_budget, input_limit - reserved_tokens)
+
+    best, best_key = None, None
+    fallback, fallback_key = None, None
+    for rows in range(1, n_views + 1):
+        for cols in range(1, n_views + 1):
+            if rows * cols < n_views:
+                continue
+            # 작은 이미지 구간(양 변 384px 이하) 경계에 딱 맞는 크기도 후보에 포함
+            small = SMALL_IMAGE_MAX_SIDE // max(rows, cols)
+            sizes = set(range(max_tile, min_tile - 1, -step)) | ({small} if min_tile <= small <= max_tile else set())
+            for tile_size in sizes:
+                layout = Layout(rows, cols, tile_size, n_views)
+                tokens = layout.tokens(model_name)
+                if tile_size == min_tile:
+                    key = (tokens, layout.empty_cells)
+                    if fallback_key is None or key < fallback_key:
+                        fallback, fallback_key = layout, key
+                if tokens > token_budget:
+                    continue
+                key = (round(layout.effective_tile_size(model_name)), -tokens, -tile_size, -layout.empty_cells)
+                if best_key is None or key > best_key:
+                    best, best_key = layout, key
+    # 예산 안에 드는 배치가 없으면 최소 타일 크기에서 토큰이 가장 적은 배치
+    return best or fallback
@@ -1,13 +1,101 @@
 import base64
+import hashlib
 import io
-from typing import List, Union
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Union
 from PIL import Image, ImageOps
 
+from .image_layout import Layout
+
+
+PADDING_COLOR = (0, 0, 0)  # 검정색 패딩
+
+_decode_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _fitted_size(width: int, height: int, target_size: int) -> tuple[int, int]:
+    """aspect ratio 를 유지하며 target_size 정사각형 안에 들어가는 크기 (ImageOps.contain 과 같은 반올림)"""
+    if width == height:
+        return target_size, target_size
+    if width > height:
+        return target_size, round(height / width * target_size)
+    return round(width / height * target_size), target_size
+
+
+def _decode_fitted(path, target_size: int) -> Image.Image:
+    """
+    target_size 안에 맞춘 크기로 바로 디코딩
+    - JPEG 는 draft() 로 DCT 단계에서 1/2 ~ 1/8 축소 디코딩 (목표 크기 이상은 유지)
+    - 남은 축소는 reduce(정수배 box 축소) + BICUBIC 리샘플링
+    """
+    try:
+        image = Image.open(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"이미지 파일을 찾을 수 없습니다: {path}")
+    with image:
+        fitted = _fitted_size(image.width, image.height, target_size)
+        image.draft('RGB', (fitted[0], fitted[1]))
+        return image.convert('RGB').resize(fitted, Image.Resampling.BICUBIC, reducing_gap=2.0)
+
+
+def _decode_padded_reference(path, target_size: int) -> Image.Image:
+    """기존 경로: 전체 해상도 디코딩 + ImageOps.pad (벤치마크 / 비교용)"""
+    try:
+        image = Image.open(path).convert('RGB')
+    except FileNotFoundError:
+        raise FileNotFoundError(f"이미지 파일을 찾을 수 없습니다: {path}")
+    # ImageOps.pad: aspect ratio 유지하면서 목표 크기에 맞춰 패딩 추가
+    return ImageOps.pad(image, (target_size, target_size), color=PADDING_COLOR)
+
+
+def _get_decode_pool(max_workers: int) -> ThreadPoolExecutor:
+    global _decode_pool
+    if _decode_pool is None:
+        _decode_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-decode")
+    return _decode_pool
+
+
+def compose_views(
+    image_paths: List[str],
+    layout: Layout,
+    fast: bool = True,
+    decode_workers: Optional[int] = None,
+) -> Image.Image:
+    """
+    각 뷰를 layout 의 타일 크기로 디코딩해 layout 캔버스의 자기 칸 가운데에 배치
+
+    Args:
+        image_paths: 이미지 파일 경로 리스트 (layout.n_views 개)
+        layout: 뷰 배치 (image_layout.plan_layout / Layout.strip)
+        fast: True 이면 draft 축소 디코딩 후 합쳐진 캔버스에 바로 배치 (패딩된 중간 이미지 없음),
+              False 이면 기존 경로 (전체 해상도 디코딩 + ImageOps.pad + paste)
+        decode_workers: 2 이상이면 각 뷰를 thread pool 에서 병렬 디코딩 (Pillow 디코딩은 GIL 을 놓음)
+    """
+    if len(image_paths) != layout.n_views:
+        raise ValueError(f"layout 은 {layout.n_views}개 뷰용인데 이미지가 {len(image_paths)}개입니다.")
+
+    tile_size = layout.tile_size
+    decode = _decode_fitted if fast else _decode_padded_reference
+    if decode_workers and decode_workers > 1 and len(image_paths) > 1:
+        views = list(_get_decode_pool(decode_workers).map(decode, image_paths, [tile_size] * len(image_paths)))
+    else:
+        views = [decode(path, tile_size) for path in image_paths]
+
+    # 캔버스는 패딩 색으로 한 번만 할당 (빈 칸도 패딩 색)
+    combined = Image.new('RGB', layout.canvas_size, PADDING_COLOR)
+    for view, (left, top) in zip(views, layout.positions()):
+        combined.paste(view, (left + round((tile_size - view.width) * 0.5), top + round((tile_size - view.height) * 0.5)))
+    return combined
+
 
 def preprocess_and_concat_images(
     image_paths: List[str], 
     target_size: int = 224, 
-    concat_direction: str = 'horizontal'
+    concat_direction: str = 'horizontal',
+    fast: bool = True,
+    decode_workers: Optional[int] = None,
 ) -> Image.Image:
     """
     여러 이미지를 전처리하고 하나로 이어붙이는 함수
@@ -16,6 +104,8 @@ def preprocess_and_concat_images(
         image_paths: 이미지 파일 경로 리스트
         target_size: 각 이미지의 목표 크기 (정사각형)
         concat_direction: 'horizontal' 또는 'vertical'
+        fast: compose_views 참고
+        decode_workers: compose_views 참고
     
     Returns:
         합쳐진 PIL Image 객체
@@ -27,40 +117,8 @@ def preprocess_and_concat_images(
     if concat_direction not in ['horizontal', 'vertical']:
         raise ValueError("concat_direction은 'horizontal' 또는 'vertical'이어야 합니다.")
     
-    processed_images = []
-    
-    # 각 이미지 전처리 (aspect ratio 유지 + 패딩)
-    for path in image_paths:
-        try:
-            image = Image.open(path).convert('RGB')
-            # ImageOps.pad: aspect ratio 유지하면서 목표 크기에 맞춰 패딩 추가
-            processed = ImageOps.pad(
-                image, 
-                (target_size, target_size), 
-                color=(0, 0, 0)  # 검정색 패딩
-            )
-            processed_images.append(processed)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"이미지 파일을 찾을 수 없습니다: {path}")
-    
-    # 이미지 이어붙이기
-    if concat_direction == 'horizontal':
-        # 가로로 이어붙이기
-        total_width = target_size * len(processed_images)
-        combined = Image.new('RGB', (total_width, target_size))
-        
-        for i, img in enumerate(processed_images):
-            combined.paste(img, (i * target_size, 0))
-            
-    else:  # vertical
-        # 세로로 이어붙이기
-        total_height = target_size * len(processed_images)
-        combined = Image.new('RGB', (target_size, total_height))
-        
-        for i, img in enumerate(processed_images):
-            combined.paste(img, (0, i * target_size))
-    
-    return combined
+    layout = Layout.strip(len(image_paths), target_size, concat_direction)
+    return compose_views(image_paths, layout, fast, decode_workers)
 
 
 def resize_with_padding_single(
@@ -77,15 +135,88 @@ def resize_with_padding_single(
     Returns:
         전처리된 PIL Image 객체
     """
-    image = Image.open(image_path).convert('RGB')
-    processed = ImageOps.pad(
-        image, 
-        (target_size, target_size), 
-        color=(0, 0, 0)  # 검정색 패딩
-    )
+    image = _decode_fitted(image_path, target_size)
+    processed = Image.new('RGB', (target_size, target_size), PADDING_COLOR)
+    processed.paste(image, (round((target_size - image.width) * 0.5), round((target_size - image.height) * 0.5)))
     return processed
 
 
+# 뷰 하나의 크기(target_size)별 JPEG 인코딩 설정 (quality, subsampling)
+# 작은 이미지는 chroma 해상도가 색상 판단에 중요하므로 4:4:4, 큰 이미지는 4:2:0 으로 payload 를 줄인다
+JPEG_PRESETS: dict[int, tuple[int, str]] = {
+    224: (90, '4:4:4'),
+    384: (88, '4:2:0'),
+    512: (85, '4:2:0'),
+}
+
+
+def jpeg_preset(target_size: int) -> tuple[int, str]:
+    """target_size 이상인 가장 작은 preset (없으면 가장 큰 preset)"""
+    for size in sorted(JPEG_PRESETS):
+        if target_size <= size:
+            return JPEG_PRESETS[size]
+    return JPEG_PRESETS[max(JPEG_PRESETS)]
+
+
+@dataclass
+class EncodedImage:
+    data: str                 # base64 문자열 (프롬프트의 image_data)
+    size: tuple[int, int]     # 이미지 크기 (width, height) - VLM 이미지 토큰 추정용
+    payload_bytes: int        # 인코딩된 이미지 bytes (base64 이전)
+    sha256: str               # 인코딩된 이미지 bytes 의 hash (캡션 캐시 key)
+    quality: int
+    subsampling: str
+
+    @property
+    def base64_bytes(self) -> int:
+        return len(self.data)
+
+
+class ImageEncoder:
+    """
+    PIL Image → base64 payload 인코더 (thread / process 별로 하나를 재사용, get_image_encoder())
+
+    - 인코딩 결과를 쓰는 BytesIO 를 재사용 (truncate 하면 버퍼가 줄어들므로 seek(0) 후 덮어쓰고 길이만 기록)
+    - getvalue() 복사 없이 getbuffer() memoryview 에서 바로 hash / base64 인코딩
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    def encode(
+        self,
+        image: Image.Image,
+        quality: Optional[int] = None,
+        subsampling: Optional[str] = None,
+        target_size: Optional[int] = None,
+        format: str = 'JPEG',
+    ) -> EncodedImage:
+        """quality / subsampling 을 지정하지 않으면 target_size(기본: 이미지의 짧은 변) 의 JPEG_PRESETS 사용"""
+        preset_quality, preset_subsampling = jpeg_preset(target_size or min(image.size))
+        quality = preset_quality if quality is None else quality
+        subsampling = preset_subsampling if subsampling is None else subsampling
+
+        buffer = self._buffer
+        buffer.seek(0)
+        image.save(buffer, format=format, quality=quality, subsampling=subsampling)
+        length = buffer.tell()
+        with buffer.getbuffer() as view, view[:length] as payload:
+            digest = hashlib.sha256(payload).hexdigest()
+            data = base64.b64encode(payload).decode('ascii')
+        return EncodedImage(data, image.size, length, digest, quality, subsampling)
+
+
+_encoder_local = threading.local()
+
+
+def get_image_encoder() -> ImageEncoder:
+    """현재 thread 의 ImageEncoder (process pool worker 에서는 process 당 하나)"""
+    encoder = getattr(_encoder_local, 'encoder', None)
+    if encoder is None:
+        encoder = _encoder_local.encoder = ImageEncoder()
+    return encoder
+
+
 def pil_to_base64(image: Image.Image, format: str = 'JPEG', quality: int = 95) -> str:
     """
     PIL Image를 base64 문자열로 변환하는 함수
@@ -98,9 +229,34 @@ def pil_to_base64(image: Image.Image, format: str = 'JPEG', quality: int = 95) -
     Returns:
         base64로 인코딩된 문자열
     """
-    buffer = io.BytesIO()
-    image.save(buffer, format=format, quality=quality)
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    # subsampling 은 Pillow 기본값(4:2:0)과 동일하게 유지
+    return get_image_encoder().encode(image, quality=quality, subsampling='4:2:0', format=format).data
+
+
+def preprocess_to_base64(
+    image_paths: List[str],
+    target_size: int = 224,
+    concat_direction: str = 'horizontal',
+    quality: Optional[int] = None,
+    subsampling: Optional[str] = None,
+    layout: Optional[Layout] = None,
+) -> EncodedImage:
+    """
+    전처리 + 이어붙이기 + base64 인코딩을 한 번에 수행하는 함수
+    배치 캡셔닝에서 process pool worker 로 실행되므로 가벼운 이 모듈에 둔다
+
+    Args:
+        layout: 지정하면 target_size / concat_direction 대신 이 배치로 합친다
+
+    Returns:
+        EncodedImage (quality / subsampling 미지정 시 뷰 타일 크기의 JPEG_PRESETS)
+    """
+    if layout is None:
+        combined = preprocess_and_concat_images(image_paths, target_size, concat_direction)
+    else:
+        combined = compose_views(image_paths, layout)
+        target_size = layout.tile_size
+    return get_image_encoder().encode(combined, quality, subsampling, target_size=target_size)
 
 
 def save_preprocessed_image(
@@ -125,42 +281,123 @@ def save_preprocessed_image(
     print(f"전처리된 이미지가 저장되었습니다: {output_path}")
 
 
-# --- 사용 예시 및 테스트 코드 ---
+# --- 기존 경로 vs fast 경로 벤치마크 (출력 동등성 확인 포함) ---
+# python -m caption.image_preprocessing [front.jpg back.jpg model.jpg]  (경로를 주지 않으면 합성 상품 사진 사용)
 if __name__ == "__main__":
-    # 예시 이미지 경로들
-    from pathlib import Path
-    DATA_DIR = Path("/Users/kkh/Desktop/1005")
-    PRODUCT_ID = "674732"
-    IMAGE_PATH = DATA_DIR / PRODUCT_ID / "segment"
-    
-    sample_images = [
-        IMAGE_PATH / "0_1.jpg",
-        IMAGE_PATH / "0_2.jpg", 
-        IMAGE_PATH / "1_4.jpg"
-    ]
-    
-    try:
-        # 1. 이미지 전처리 및 합치기dma
-        combined = preprocess_and_concat_images(
-            sample_images, 
-            target_size=384, # (224,224) , (384,384) , (512,512) 
-            concat_direction='vertical'
-        )
-        print(f"합쳐진 이미지 크기: {combined.size}")
-        
-        # 2. Base64 변환
-        base64_string = pil_to_base64(combined)
-        print(f"Base64 길이: {len(base64_string)}")
-        
-        # 3. 파일로 저장
-        save_preprocessed_image(
-            sample_images,
-            "combined_output.jpg",
-            target_size=224,
-            concat_direction='horizontal'
-        )
-        
-    except FileNotFoundError as e:
-        print(f"파일 오류: {e}")
-    except Exception as e:
-        print(f"처리 중 오류 발생: {e}") 
\ No newline at end of file
+    import os
+    import statistics
+    import sys
+    import tempfile
+    import time
+
+    import numpy as np
+    from PIL import ImageDraw, ImageFilter
+
+    def synthetic_photos(directory: str) -> List[str]:
+        """1500x2000 급 상품 사진 (흰 배경 + 음영 있는 의류 실루엣)"""
+        rng = np.random.default_rng(0)
+        paths = []
+        for i, (size, color) in enumerate([((1500, 2000), (90, 110, 160)), ((1500, 2000), (200, 80, 90)), ((2000, 1500), (60, 60, 60))]):
+            image = Image.new('RGB', size, (250, 250, 250))
+            w, h = size
+            ImageDraw.Draw(image).polygon(
+                [(w * .3, h * .15), (w * .7, h * .15), (w * .9, h * .35), (w * .78, h * .42), (w * .75, h * .9), (w * .25, h * .9), (w * .22, h * .42), (w * .1, h * .35)],
+                fill=color,
+            )
+            image = image.filter(ImageFilter.GaussianBlur(3))
+            pixels = np.asarray(image, dtype=np.float32) + rng.normal(0, 4, (h, w, 3))
+            paths.append(os.path.join(directory, f"view_{i}.jpg"))
+            Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(paths[-1], quality=92)
+        return paths
+
+    def psnr(a: Image.Image, b: Image.Image) -> float:
+        mse = np.mean((np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)) ** 2)
+        return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+    # 이 이상이면 육안으로 구분되지 않는 수준으로 간주
+    VISUAL_PSNR_DB = 38.0
+
+    def median_ms(fn, repeat: int = 15) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = sys.argv[1:] or synthetic_photos(tmp)
+        for target_size in (224, 384, 512):
+            reference = preprocess_and_concat_images(paths, target_size, fast=False)
+            fast = preprocess_and_concat_images(paths, target_size)
+            assert fast.size == reference.size
+            assert psnr(fast, reference) >= VISUAL_PSNR_DB, f"{target_size}px 출력 차이가 큽니다"
+            timings = {
+                "reference": median_ms(lambda: preprocess_and_concat_images(paths, target_size, fast=False)),
+                "fast": median_ms(lambda: preprocess_and_concat_images(paths, target_size)),
+                "fast+threads": median_ms(lambda: preprocess_and_concat_images(paths, target_size, decode_workers=len(paths))),
+            }
+            print(
+                f"{target_size:>4}px: " + ", ".join(f"{name} {ms:6.1f}ms" for name, ms in timings.items())
+                + f" | PSNR(fast vs reference) {psnr(fast, reference):.1f}dB"
+            )
+
+        # 인코딩 설정별 payload 크기 / 화질 (VLM 이미지 토큰은 크기로만 결정되므로 target_size 별로 고정)
+        import tracemalloc
+
+        from .image_layout import DEFAULT_IMAGE_TOKEN_BUDGET, image_tokens, plan_layout
+
+        print("\ntarget quality subsampling   payload   base64   PSNR  image tokens")
+        for target_size in (224, 384, 512):
+            combined = preprocess_and_concat_images(paths, target_size)
+            preset = jpeg_preset(target_size)
+            for quality in sorted({75, 85, 90, 95, preset[0]}):
+                for subsampling in ('4:4:4', '4:2:0'):
+                    encoded = get_image_encoder().encode(combined, quality, subsampling)
+                    with Image.open(io.BytesIO(base64.b64decode(encoded.data))) as decoded:
+                        quality_db = psnr(decoded.convert('RGB'), combined)
+                    mark = " <- preset" if (quality, subsampling) == preset else ""
+                    print(
+                        f"{target_size:>6} {quality:>7} {subsampling:>11} {encoded.payload_bytes / 1024:7.1f}KB "
+                        f"{encoded.base64_bytes / 1024:6.1f}KB {quality_db:5.1f}dB {image_tokens(*encoded.size):>6}{mark}"
+                    )
+
+        # 기존 인코딩 (getvalue 복사 + 버퍼 증가 재할당) 대비 할당량
+        def encode_with_copies(image: Image.Image) -> str:
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=95)
+            return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+        combined = preprocess_and_concat_images(paths, 512)
+        get_image_encoder().encode(combined, 95, '4:2:0')  # 버퍼 warm-up
+        print()
+        for name, encode in (
+            ("getvalue + b64encode", encode_with_copies),
+            ("ImageEncoder", lambda image: get_image_encoder().encode(image, 95, '4:2:0').data),
+        ):
+            tracemalloc.start()
+            encode(combined)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:>22}: peak alloc {peak / 1024:7.1f}KB, {median_ms(lambda: encode(combined)):.2f}ms")
+
+        # 뷰 배치별 이미지 토큰 / 뷰당 실효 해상도 (누락된 뷰가 있는 그룹 포함)
+        model_name = "gemini-2.0-flash-001"
+        print(f"\n{'views':>5} {'layout':>22} {'canvas':>10} {'tokens':>6} {'eff px':>6} {'payload':>8} {'padding':>7}")
+        for n_views in (3, 2, 1):
+            view_paths = paths[:n_views]
+            layouts = {
+                "strip 224": Layout.strip(n_views, 224),
+                "strip 512": Layout.strip(n_views, 512),
+                "auto 258": plan_layout(n_views, model_name, 258),
+                f"auto {DEFAULT_IMAGE_TOKEN_BUDGET}": plan_layout(n_views, model_name),
+            }
+            for name, layout in layouts.items():
+                combined = compose_views(view_paths, layout)
+                encoded = get_image_encoder().encode(combined, target_size=layout.tile_size)
+                padding = float(np.mean(np.all(np.asarray(combined) == PADDING_COLOR, axis=-1)))
+                print(
+                    f"{n_views:>5} {name + f' ({layout.rows}x{layout.cols}@{layout.tile_size})':>22} "
+                    f"{'x'.join(map(str, layout.canvas_size)):>10} {layout.tokens(model_name):>6} "
+                    f"{layout.effective_tile_size(model_name):6.0f} {encoded.payload_bytes / 1024:6.1f}KB {padding:7.0%}"
+                )
@@ -0,0 +1,359 @@
+"""
+VLM 구조화 출력(JSON) 파싱 / 복구 / 검증
+
+- PydanticOutputParser 는 앞뒤 설명 문장, trailing comma, 잘린 출력, enum 동의어("반팔") 하나에도 전체 응답을 버린다
+  TolerantOutputParser 는 흔한 결함을 복구한 뒤 검증하고, 그래도 틀린 부분은 sub-object 경로(예: structured_attributes.front)로 알려준다
+  → 호출하는 쪽은 전체 요청 대신 해당 sub-object 만 다시 요청한다 (batch_caption)
+- native 모드: 긴 format instructions 대신 provider 의 function calling(JSON schema) 으로 출력 형식을 강제 (bind_native_output)
+"""
+import copy
+import json
+import re
+import types
+import typing
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Optional, Union
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import ChatGeneration, Generation
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_core.utils.json import parse_partial_json
+from pydantic import BaseModel, ValidationError
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_CANONICAL_STRIP_RE = re.compile(r"[\s_\-·()/]")
+
+# format instructions 안내문 (langchain 내부 상수에 의존하지 않도록 복사, 문구가 바뀌면 캡션 캐시 key 도 바뀐다)
+FORMAT_INSTRUCTIONS = """The output should be formatted as a JSON instance that conforms to the JSON schema below.
+
+As an example, for the schema {{"properties": {{"foo": {{"title": "Foo", "description": "a list of strings", "type": "array", "items": {{"type": "string"}}}}}}, "required": ["foo"]}}
+the object {{"foo": ["bar", "baz"]}} is a well-formatted instance of the schema. The object {{"properties": {{"foo": ["bar", "baz"]}}}} is not well-formatted.
+
+Here is the output schema:
+```
+{schema}
+```"""
+
+
+def extract_json(text: str) -> tuple[Any, list[str]]:
+    """
+    응답 텍스트에서 첫 JSON 값을 꺼낸다 → (값, 적용한 복구 목록)
+    code fence, 앞뒤 설명 문장, trailing comma, 잘린 출력(열린 괄호 / 문자열 닫기)을 처리
+    앞 문장의 괄호("[참고] ...", "응답 [1/1]")처럼 JSON 이 아닌 위치는 건너뛰고 다음 "{" / "[" 부터 다시 시도
+    (object 를 찾으면 object 를, 없을 때만 처음 찾은 배열을 사용)
+
+    Raises:
+        OutputParserException: JSON 을 찾을 수 없는 경우 (디코딩 오류도 이 예외로 바꿔서 raise)
+    """
+    repairs = []
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+        repairs.append("code_fence")
+    starts = [i for i, char in enumerate(text) if char in "{["]
+    if not starts:
+        raise OutputParserException(f"JSON 을 찾을 수 없습니다: {text[:200]!r}", llm_output=text)
+
+    decoder = json.JSONDecoder()
+    fallback, decoded_until = None, 0
+    for start in starts:
+        if start < decoded_until:
+            continue  # 이미 꺼낸 배열 안쪽
+        body = text[start:]
+        leading = ["leading_text"] if text[:start].strip() else []
+        for repair, candidate in (("", body), ("trailing_comma", _TRAILING_COMMA_RE.sub(r"\1", body))):
+            try:
+                value, end = decoder.raw_decode(candidate)
+            except json.JSONDecodeError:
+                continue
+            found = leading + ([repair] if repair else []) + (["trailing_text"] if candidate[end:].strip() else [])
+            if isinstance(value, dict):
+                return value, repairs + found
+            fallback = fallback or (value, repairs + found)
+            decoded_until = start + end if not repair else len(text)
+            break
+        else:
+            # 출력이 중간에 잘린 경우: 열린 문자열 / 괄호를 닫아 남은 부분이라도 사용 (빠진 필드는 검증에서 걸림)
+            try:
+                value = parse_partial_json(_TRAILING_COMMA_RE.sub(r"\1", body))
+            except ValueError:
+                value = None
+            if isinstance(value, dict):
+                return value, repairs + leading + ["truncated"]
+    if fallback is not None:
+        return fallback
+    raise OutputParserException(f"JSON 을 복구할 수 없습니다: {text[starts[0]:][:200]!r}", llm_output=text)
+
+
+def _canonical(text: str) -> str:
+    return _CANONICAL_STRIP_RE.sub("", text).casefold()
+
+
+def _unwrap(annotation) -> tuple[Any, bool]:
+    """Optional[X] / List[X] → (X, list 여부)"""
+    origin = typing.get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return _unwrap(args[0])
+        return annotation, False
+    if origin is list:
+        inner, _ = _unwrap(typing.get_args(annotation)[0])
+        return inner, True
+    return annotation, False
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+class EnumNormalizer:
+    """
+    enum 값 정규화: 값 / 멤버 이름 / 괄호 앞부분("레귤러(골반선)" → "레귤러") / 동의어 사전을
+    공백·기호·대소문자 무시하고 비교
+    """
+
+    def __init__(self, synonyms: Optional[dict[type[Enum], dict[str, Enum]]] = None):
+        self.synonyms = synonyms or {}
+        self._tables: dict[type[Enum], dict[str, Enum]] = {}
+
+    def _table(self, enum_cls: type[Enum]) -> dict[str, Enum]:
+        table = self._tables.get(enum_cls)
+        if table is None:
+            table = {}
+            for member in enum_cls:
+                short = str(member.value).split("(")[0]
+                table.setdefault(_canonical(short), member)
+                table[_canonical(member.name)] = member
+            for member in enum_cls:
+                table[_canonical(str(member.value))] = member
+            for synonym, member in self.synonyms.get(enum_cls, {}).items():
+                table[_canonical(synonym)] = member
+            self._tables[enum_cls] = table
+        return table
+
+    def normalize(self, enum_cls: type[Enum], value: Any) -> Any:
+        """정규화된 enum 값 (찾지 못하면 원래 값 그대로 두어 검증에서 걸리게 한다)"""
+        if not isinstance(value, str):
+            return value
+        member = self._table(enum_cls).get(_canonical(value))
+        return value if member is None else member.value
+
+    def apply(self, data: Any, model_cls: type[BaseModel], repairs: list[str], path: str = "") -> None:
+        """model_cls 구조를 따라 data(dict) 안의 enum 필드를 제자리에서 정규화"""
+        if not isinstance(data, dict):
+            return
+        for name, model_field in model_cls.model_fields.items():
+            if name not in data:
+                continue
+            annotation, is_list = _unwrap(model_field.annotation)
+            values = data[name] if is_list and isinstance(data[name], list) else None
+            if isinstance(annotation, type) and issubclass(annotation, Enum):
+                if values is not None:
+                    data[name] = [self._normalize_logged(annotation, v, repairs, f"{path}{name}") for v in values]
+                else:
+                    data[name] = self._normalize_logged(annotation, data[name], repairs, f"{path}{name}")
+            elif _is_model(annotation):
+                for item in values if values is not None else [data[name]]:
+                    self.apply(item, annotation, repairs, f"{path}{name}.")
+
+    def _normalize_logged(self, enum_cls: type[Enum], value: Any, repairs: list[str], path: str) -> Any:
+        normalized = self.normalize(enum_cls, value)
+        if normalized != value:
+            repairs.append(f"enum:{path}:{value}→{normalized}")
+        return normalized
+
+
+# --- sub-object 경로 ---
+
+def get_path(data: Any, path: str) -> Any:
+    for key in filter(None, path.split(".")):
+        data = data.get(key) if isinstance(data, dict) else None
+    return data
+
+
+def set_path(data: dict, path: str, value: Any) -> dict:
+    """path 의 값을 value 로 바꾼 새 dict ("" 이면 value 자체)"""
+    if not path:
+        return value
+    data = copy.deepcopy(data) if isinstance(data, dict) else {}
+    node = data
+    *parents, last = path.split(".")
+    for key in parents:
+        if not isinstance(node.get(key), dict):
+            node[key] = {}
+        node = node[key]
+    node[last] = value
+    return data
+
+
+def sub_model(model_cls: type[BaseModel], path: str) -> type[BaseModel]:
+    for key in filter(None, path.split(".")):
+        model_cls, _ = _unwrap(model_cls.model_fields[key].annotation)
+    return model_cls
+
+
+def _invalid_path(loc: tuple, model_cls: type[BaseModel], depth: int) -> str:
+    """검증 오류 위치 → depth 단계까지 내려간 sub-object(BaseModel 필드) 경로"""
+    keys = []
+    for key in loc[:depth]:
+        model_field = model_cls.model_fields.get(key) if isinstance(key, str) else None
+        annotation, is_list = _unwrap(model_field.annotation) if model_field else (None, False)
+        if not _is_model(annotation) or is_list:
+            break
+        keys.append(key)
+        model_cls = annotation
+    return ".".join(keys)
+
+
+@dataclass
+class ParsedOutput:
+    data: Any                                   # 복구된 JSON
+    value: Optional[BaseModel] = None           # 검증 통과 시 pydantic 객체
+    invalid: dict[str, list[str]] = field(default_factory=dict)  # 다시 요청할 sub-object 경로 → 오류 메시지
+    repairs: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.value is not None
+
+
+# --- parser ---
+
+def _drop_titles(schema: Any) -> Any:
+    """JSON schema 의 title 키 제거 (필드 이름과 중복이라 프롬프트 토큰만 차지)"""
+    if isinstance(schema, dict):
+        return {k: _drop_titles(v) for k, v in schema.items() if not (k == "title" and isinstance(v, str))}
+    if isinstance(schema, list):
+        return [_drop_titles(v) for v in schema]
+    return schema
+
+
+class TolerantOutputParser(PydanticOutputParser):
+    """
+    PydanticOutputParser + 결함 복구 + sub-object 단위 오류 위치
+
+    - 입력: 텍스트 응답 또는 tool call(native 모드) 응답
+    - parse / invoke: 복구 후에도 검증에 실패하면 OutputParserException (chain 에서 기존과 같게 동작)
+    - repair: 예외 대신 ParsedOutput (invalid 의 sub-object 만 다시 요청할 때 사용)
+    """
+
+    enum_synonyms: dict = {}
+    # invalid 경로를 몇 단계 sub-object 까지 나눌지 (MasterCaption: 2 → structured_attributes.front)
+    retry_depth: int = 2
+    # format instructions 의 schema 에서 title 제거
+    compact_instructions: bool = True
+
+    def get_format_instructions(self) -> str:
+        if not self.compact_instructions:
+            return super().get_format_instructions()
+        schema = _drop_titles(self.pydantic_object.model_json_schema())
+        schema.pop("type", None)
+        return FORMAT_INSTRUCTIONS.format(schema=json.dumps(schema, ensure_ascii=False))
+
+    def for_path(self, path: str) -> "TolerantOutputParser":
+        """path 의 sub-object 용 parser (sub-object 재요청 응답 파싱)"""
+        return TolerantOutputParser(
+            pydantic_object=sub_model(self.pydantic_object, path),
+            enum_synonyms=self.enum_synonyms,
+            retry_depth=0,
+            compact_instructions=self.compact_instructions,
+        )
+
+    def repair(self, output: Union[str, dict, BaseMessage]) -> ParsedOutput:
+        repairs = []
+        if isinstance(output, BaseMessage):
+            output = self._message_payload(output, repairs)
+        if isinstance(output, str):
+            try:
+                data, extracted = extract_json(output)
+            except (OutputParserException, ValueError) as e:
+                return ParsedOutput(data=None, invalid={"": [str(e)]})
+            repairs.extend(extracted)
+        else:
+            data = copy.deepcopy(output)
+
+        EnumNormalizer(self.enum_synonyms).apply(data, self.pydantic_object, repairs)
+        try:
+            return ParsedOutput(data=data, value=self.pydantic_object.model_validate(data), repairs=repairs)
+        except ValidationError as e:
+            invalid: dict[str, list[str]] = {}
+            for error in e.errors():
+                path = _invalid_path(error["loc"], self.pydantic_object, self.retry_depth)
+                location = ".".join(map(str, error["loc"]))
+                invalid.setdefault(path, []).append(f"{location}: {error['msg']}")
+            return ParsedOutput(data=data, invalid=invalid, repairs=repairs)
+
+    @staticmethod
+    def _message_payload(message: BaseMessage, repairs: list[str]) -> Union[str, dict]:
+        """tool call 인자(native 모드) 가 있으면 그것을, 없으면 텍스트"""
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            return tool_calls[0]["args"]
+        invalid_tool_calls = getattr(message, "invalid_tool_calls", None)
+        if invalid_tool_calls:
+            repairs.append("invalid_tool_call")
+            return invalid_tool_calls[0].get("args") or ""
+        return message.text() if callable(getattr(message, "text", None)) else str(message.content)
+
+    def parse_result(self, result: list[Generation], *, partial: bool = False) -> Any:
+        generation = result[0]
+        output = generation.message if isinstance(generation, ChatGeneration) else generation.text
+        parsed = self.repair(output)
+        if parsed.ok:
+            return parsed.value
+        if partial:
+            return None
+        errors = "; ".join(msg for messages in parsed.invalid.values() for msg in messages)
+        raise OutputParserException(
+            f"Failed to parse {self.pydantic_object.__name__}: {errors}",
+            llm_output=generation.text,
+        )
+
+    def parse(self, text: str) -> Any:
+        return self.parse_result([Generation(text=text)])
+
+    @property
+    def _type(self) -> str:
+        return "tolerant_pydantic"
+
+
+# --- native 모드 (function calling 으로 schema 강제) ---
+
+def native_tool(pydantic_object: type[BaseModel], overrides: Optional[dict[str, dict]] = None) -> dict:
+    """
+    pydantic 모델의 tool(JSON schema) 정의
+    overrides: Gemini function declaration 이 표현하지 못하는 필드(anyOf, additionalProperties 등)의
+               schema 를 "a.b.c" 경로로 대체 (대체하지 않으면 STRING 으로 바뀐다)
+    """
+    tool = convert_to_openai_tool(pydantic_object)
+    parameters = tool["function"]["parameters"]
+    for path, schema in (overrides or {}).items():
+        node = parameters
+        *parents, last = path.split(".")
+        try:
+            for key in parents:
+                node = node["properties"][key]
+            node["properties"][last] = {**schema, "description": node["properties"][last].get("description", "")}
+        except KeyError:
+            continue
+    tool["function"]["parameters"] = _drop_titles(parameters)
+    return tool
+
+
+def sub_overrides(overrides: Optional[dict[str, dict]], path: str) -> dict[str, dict]:
+    """path 의 sub-object 기준으로 옮긴 overrides"""
+    prefix = f"{path}." if path else ""
+    return {key[len(prefix):]: schema for key, schema in (overrides or {}).items() if key.startswith(prefix)}
+
+
+def bind_native_output(model, pydantic_object: type[BaseModel], overrides: Optional[dict[str, dict]] = None):
+    """model 이 pydantic_object schema 의 tool 을 반드시 호출하도록 bind (응답은 TolerantOutputParser 로 파싱)"""
+    tool = native_tool(pydantic_object, overrides)
+    name = tool["function"]["name"]
+    tool_choice = name if getattr(model, "_supports_tool_choice", True) else None
+    return model.bind_tools([tool], tool_choice=tool_choice)
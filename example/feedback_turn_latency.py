@@ -0,0 +1,64 @@
+"""
+피드백 턴 latency 비교: 재정렬 피드백("rerank_cheaper") vs 쿼리 수정 피드백
+
+select_final_item_node(LLM) 직전까지의 시간만 측정한다.
+재정렬 피드백은 임베딩 / 벡터 검색 / 상세 조회를 건너뛰므로 LLM 호출을 제외한 시간이 거의 0 이어야 한다.
+
+    PYTHONPATH=. python example/feedback_turn_latency.py --catalog 50000 --k 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import numpy as np
+
+from app.langgraph.embedding_service import EmbeddingService, FakeEmbeddingBackend, set_embedding_service
+from app.langgraph.graph import graph
+from app.langgraph.utils import set_vector_index
+from app.langgraph.vector_index import VectorIndex
+
+INTERRUPTS = ["select_final_item_node", "wait_for_user_feedback_node"]
+
+
+async def run_until_llm(input_data, config) -> float:
+    start = time.perf_counter()
+    async for _ in graph.astream(input_data, config=config, stream_mode="updates", interrupt_before=INTERRUPTS):
+        pass
+    return (time.perf_counter() - start) * 1000
+
+
+async def feedback_turn(feedback: str, k: int) -> float:
+    config = {"configurable": {"thread_id": str(uuid.uuid4()), "k": k}}
+    await run_until_llm({"user_query": "여름 데이트룩 원피스"}, config)
+    # LLM 노드는 실행하지 않고 완료된 것으로 처리한 뒤 피드백 입력 → wait_for_user_feedback_node 부터 재개
+    await graph.aupdate_state(config, {"llm_output": "", "user_feedback": feedback}, as_node="select_final_item_node")
+    return await run_until_llm(None, config)
+
+
+async def main(catalog: int, dim: int, k: int, turns: int) -> None:
+    rng = np.random.default_rng(0)
+    index = VectorIndex(dim, initial_capacity=catalog)
+    ids = [f"sku_{i}" for i in range(catalog)]
+    metadata = [{"name": f"상품 {i}", "price": int(p)} for i, p in enumerate(rng.integers(10_000, 200_000, catalog))]
+    index.add(ids, rng.standard_normal((catalog, dim)).astype(np.float32), metadata)
+    set_vector_index(index)
+    # provider 호출 latency 20ms 를 흉내내는 fake backend (쿼리 수정 시 캐시 miss)
+    set_embedding_service(EmbeddingService(FakeEmbeddingBackend(dim=dim, latency=0.02)))
+
+    for name, feedback in (("rerank_cheaper", "rerank_cheaper"), ("query feedback", None)):
+        latencies = [
+            await feedback_turn(feedback or f"좀 더 밝은 색 {i}", k) for i in range(turns)
+        ]
+        print(f"{name:>15}: median {statistics.median(latencies):.2f}ms (LLM 제외)")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--catalog", type=int, default=50_000)
+    arg_parser.add_argument("--dim", type=int, default=512)
+    arg_parser.add_argument("--k", type=int, default=200)
+    arg_parser.add_argument("--turns", type=int, default=10)
+    args = arg_parser.parse_args()
+    asyncio.run(main(args.catalog, args.dim, args.k, args.turns))
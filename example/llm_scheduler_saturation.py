@@ -0,0 +1,111 @@
+"""
+LLM scheduler 포화 동작 확인: provider 한도를 넘는 배치 부하 + interactive 요청
+
+FakeProvider(sliding window RPM / TPM, 초과 시 429) 에 배치 worker 와 interactive client 를 동시에 붙여
+- naive: 각자 provider 를 바로 호출하고 429 면 jitter backoff 후 재시도 (기존 호출 지점들의 동작)
+- scheduler: 공유 LLMScheduler(provider 한도의 90%) 를 거쳐 호출, interactive 우선
+두 경우의 429 수, 배치 처리량, interactive 응답 latency 를 비교한다
+
+    PYTHONPATH=. python example/llm_scheduler_saturation.py --seconds 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.langgraph.llm_scheduler import (
+    FakeProvider, LLMScheduler, ModelLimits, Priority, backoff_delay, is_rate_limit_error,
+)
+
+MODEL = "gemini-2.0-flash-001"
+
+
+async def naive_call(provider: FakeProvider, tokens: int, max_retries: int = 5):
+    for attempt in range(max_retries + 1):
+        try:
+            return await provider.call(tokens)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_retries:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, base=0.25))
+
+
+async def simulate(args, use_scheduler: bool) -> dict:
+    provider = FakeProvider(rpm=args.rpm, tpm=args.tpm, latency=args.latency, window=args.window)
+    scheduler = LLMScheduler(
+        ModelLimits(int(args.rpm * args.headroom), int(args.tpm * args.headroom)), {},
+    )
+    deadline = time.monotonic() + args.seconds
+    batch_done, batch_failed, interactive_latency, interactive_failed = 0, 0, [], 0
+
+    async def call(tokens: int, priority: Priority):
+        if use_scheduler:
+            return await scheduler.run(MODEL, lambda: provider.call(tokens), tokens, priority, max_retries=5)
+        return await naive_call(provider, tokens)
+
+    async def batch_worker():
+        nonlocal batch_done, batch_failed
+        while time.monotonic() < deadline:
+            try:
+                await call(args.batch_tokens, Priority.BATCH)
+                # 대기열에 남아 있던 요청은 deadline 이후에 끝나므로 처리량에서 제외
+                batch_done += time.monotonic() < deadline
+            except Exception:
+                batch_failed += 1
+
+    async def interactive_request():
+        nonlocal interactive_failed
+        start = time.monotonic()
+        try:
+            await call(args.interactive_tokens, Priority.INTERACTIVE)
+            interactive_latency.append((time.monotonic() - start) * 1000)
+        except Exception:
+            interactive_failed += 1
+
+    async def interactive_clients():
+        requests = []
+        while time.monotonic() < deadline:
+            requests.append(asyncio.create_task(interactive_request()))
+            await asyncio.sleep(1 / args.interactive_rps)
+        await asyncio.gather(*requests)
+
+    await asyncio.gather(interactive_clients(), *(batch_worker() for _ in range(args.batch_concurrency)))
+    latency = sorted(interactive_latency) or [0.0]
+    return {
+        "429": provider.rejected,
+        "batch/min": batch_done / args.seconds * 60,
+        "batch failed": batch_failed,
+        "interactive p50": statistics.median(latency),
+        "interactive p95": latency[round(0.95 * (len(latency) - 1))],
+        "interactive failed": interactive_failed,
+    }
+
+
+async def main(args) -> None:
+    print(
+        f"provider 한도 {args.rpm} RPM / {args.tpm:,} TPM ({args.window:.0f}s window), "
+        f"배치 worker {args.batch_concurrency} x {args.batch_tokens} tokens, "
+        f"interactive {args.interactive_rps}/s x {args.interactive_tokens} tokens, {args.seconds:.0f}s"
+    )
+    print(f"{'':>10} {'429':>6} {'batch/min':>10} {'batch 실패':>9} {'int p50':>9} {'int p95':>9} {'int 실패':>8}")
+    for name, use_scheduler in (("naive", False), ("scheduler", True)):
+        result = await simulate(args, use_scheduler)
+        print(
+            f"{name:>10} {result['429']:>6} {result['batch/min']:>10.0f} {result['batch failed']:>9} "
+            f"{result['interactive p50']:>7.0f}ms {result['interactive p95']:>7.0f}ms {result['interactive failed']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=600_000)
+    parser.add_argument("--window", type=float, default=10.0, help="provider 한도 측정 구간 (초, 짧을수록 엄격)")
+    parser.add_argument("--headroom", type=float, default=0.9, help="scheduler 한도 = provider 한도 x headroom")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--batch-concurrency", type=int, default=64)
+    parser.add_argument("--batch-tokens", type=int, default=3000)
+    parser.add_argument("--interactive-rps", type=float, default=2.0)
+    parser.add_argument("--interactive-tokens", type=int, default=1500)
+    asyncio.run(main(parser.parse_args()))
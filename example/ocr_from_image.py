@@ -1,10 +1,12 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 from langchain_core.messages import SystemMessage
 import base64
 from dotenv import load_dotenv
 import os
 
+from app.langgraph.llm_registry import get_chat_model
+from app.langgraph.llm_router import routed
+
 load_dotenv()
 
 # 1. 이미지 파일 → base64 변환
@@ -14,11 +16,9 @@ def image_to_base64(path):
     return base64.b64encode(image_bytes).decode("utf-8")
 
 def extract_text_from_image(image_path):
-    # Gemini 2.0 Flash 모델 설정
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash-001",
-        temperature=0,  # 정확한 텍스트 추출을 위해 temperature를 0으로 설정
-    )
+    # ocr 조건(이미지 입력)에 맞는 가장 싼 모델 사용, 오류 / 429 면 다음 모델로 전환
+    # 정확한 텍스트 추출을 위해 temperature를 0으로 설정
+    llm = routed("ocr", lambda model: get_chat_model(model, temperature=0))
     
     # 이미지를 base64로 변환
     image_b64 = image_to_base64(image_path)
@@ -45,7 +45,7 @@ def extract_text_from_image(image_path):
         ])
     ]
     
-    # 실행
+    # 실행 (다른 LLM 호출 지점과 RPM / TPM 한도 공유)
     response = llm.invoke(prompt)
     return response.content.strip()
 
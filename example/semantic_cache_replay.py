@@ -0,0 +1,131 @@
+"""
+select_final_item_node semantic cache 확인: 거의 같은 질문이 반복될 때 LLM 호출 대신 저장된 응답을 재생
+
+websocket 과 같은 방식(stream_mode=["updates", "messages"])으로 graph 를 실행하여
+- miss(LLM 호출) / hit(재생) 턴의 첫 chunk / 전체 응답 latency
+- hit 턴에서 client 가 받는 chunk 가 LLM 응답과 같은 형태("messages" stream, 같은 node 이름)로 오는지
+- hit rate
+를 확인한다. LLM 은 첫 token latency 와 token 간 간격을 흉내 내는 fake chat model 로 대신한다
+
+    PYTHONPATH=. python example/semantic_cache_replay.py --turns 40
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+import uuid
+
+import numpy as np
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.langgraph.embedding_service import EmbeddingService, FakeEmbeddingBackend, set_embedding_service
+from app.langgraph.graph import graph
+from app.langgraph.llm_registry import register_chat_model
+from app.langgraph.semantic_cache import get_semantic_cache
+from app.langgraph.utils import set_vector_index
+from app.langgraph.vector_index import VectorIndex
+
+MODEL = "gemini-2.0-flash-001"
+PROMPT = "You are a helpful assistant that recommends clothing items based on the user's query. "
+# 같은 의도의 서로 다른 표현
+TOPICS = [
+    ["여름 데이트룩 추천", "여름 데이트룩 추천해줘", "여름 데이트룩 좀 추천해 주세요"],
+    ["출근용 셔츠 추천", "출근용 셔츠 추천해줘"],
+    ["겨울 패딩 추천", "겨울 패딩 추천해 주세요!"],
+    ["하객룩 원피스 추천", "하객룩 원피스 추천해줘?"],
+]
+
+
+class ParaphraseEmbeddingBackend(FakeEmbeddingBackend):
+    """어미 / 부호만 다른 표현은 가까운 벡터(cosine ~0.9998), 다른 의도는 거의 직교하는 벡터"""
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        intents = await super().aembed([re.sub(r"\s*(좀|추천해 ?주세요|추천해줘|추천)[?!]*", "", t) for t in texts])
+        noise = await super().aembed(texts)
+        embeddings = np.asarray(intents) + 0.02 * np.asarray(noise)
+        return (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).tolist()
+
+
+class SlowFakeChatModel(GenericFakeChatModel):
+    """첫 token 까지 first_token_latency, 이후 token 마다 token_interval 만큼 걸리는 fake LLM"""
+
+    first_token_latency: float = 0.8
+    token_interval: float = 0.02
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        for chunk in self._stream(messages, stop, None, **kwargs):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self.token_interval)
+
+
+def answers():
+    while True:
+        yield AIMessage(content="추천 상품은 sku_1 린넨 셔츠입니다. 가벼운 소재라 여름 데이트룩에 잘 어울립니다.")
+
+
+async def run_turn(query: str) -> dict:
+    config = {
+        "configurable": {
+            "thread_id": str(uuid.uuid4()),
+            "llm_model": {"model": MODEL, "prompt_template": PROMPT},
+            "k": 20,
+        },
+    }
+    start = time.perf_counter()
+    first_chunk, chunks = None, []
+    async for stream_type, chunk in graph.astream(
+        {"user_query": query}, config=config, stream_mode=["updates", "messages"],
+        interrupt_before=["wait_for_user_feedback_node"],
+    ):
+        if stream_type == "messages":
+            message, metadata = chunk
+            if message.content:
+                first_chunk = first_chunk or time.perf_counter()
+                chunks.append((metadata["langgraph_node"], type(message).__name__, message.content))
+    end = time.perf_counter()
+    return {"first_chunk_ms": ((first_chunk or end) - start) * 1000, "total_ms": (end - start) * 1000, "chunks": chunks}
+
+
+async def main(turns: int, catalog: int, dim: int) -> None:
+    rng = np.random.default_rng(0)
+    index = VectorIndex(dim, initial_capacity=catalog)
+    index.add([f"sku_{i}" for i in range(catalog)], rng.standard_normal((catalog, dim)).astype(np.float32))
+    set_vector_index(index)
+    set_embedding_service(EmbeddingService(ParaphraseEmbeddingBackend(dim=dim)))
+    register_chat_model(MODEL, SlowFakeChatModel(messages=answers()))
+
+    random.seed(0)
+    results = {"miss": [], "hit": []}
+    samples = {}
+    for _ in range(turns):
+        hits = get_semantic_cache().hits
+        result = await run_turn(random.choice(random.choice(TOPICS)))
+        kind = "hit" if get_semantic_cache().hits > hits else "miss"
+        results[kind].append(result)
+        samples.setdefault(kind, result["chunks"])
+
+    for kind, turn_results in results.items():
+        if turn_results:
+            first = statistics.median(r["first_chunk_ms"] for r in turn_results)
+            total = statistics.median(r["total_ms"] for r in turn_results)
+            print(f"{kind:>5}: {len(turn_results):>3}턴, 첫 chunk median {first:8.1f}ms, 응답 완료 median {total:8.1f}ms")
+    if "hit" in samples and "miss" in samples:
+        same_text = "".join(c for *_, c in samples["hit"]) == "".join(c for *_, c in samples["miss"])
+        same_shape = {c[:2] for c in samples["hit"]} == {c[:2] for c in samples["miss"]}
+        print(f"hit 응답: chunk {len(samples['hit'])}개, 내용 동일 {same_text}, (node, message type) 동일 {same_shape}")
+    print(get_semantic_cache().stats())
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--turns", type=int, default=40)
+    arg_parser.add_argument("--catalog", type=int, default=20_000)
+    arg_parser.add_argument("--dim", type=int, default=256)
+    args = arg_parser.parse_args()
+    asyncio.run(main(args.turns, args.catalog, args.dim))
@@ -0,0 +1,112 @@
+"""
+N개의 websocket 세션이 동시에 한 턴씩 실행될 때 턴당 latency 확인
+
+select_final_item_node(LLM) 직전까지 실행하여 embedding → 벡터 검색 → 상세 조회 → rerank 구간이
+event loop 를 막지 않는지 확인한다. 노드가 blocking 이면 세션 수에 비례해 latency 가 늘어난다.
+
+같은 세션들을 느린 세션 하나와 함께 다시 실행한다. 느린 세션은 상품 상세 조회(MongoDB 자리의 fake collection)가
+SLOW_MS 만큼 걸려 node thread pool worker 하나를 오래 잡는다. 이때 나머지 세션의 p95 가
+- 순차 실행 single turn 의 MAX_P95_RATIO 배 안에 드는지
+- 느린 세션이 없을 때의 p95 보다 MAX_SLOW_OVERHEAD 배 이상 늘지 않는지
+확인한다. 노드가 CPU 를 쓰므로 single turn 대비 배수는 코어 수 대비 세션 수에 따라 늘어난다 (1 core, 10 세션 ~3.7배)
+"""
+import asyncio
+import statistics
+import time
+import uuid
+from typing import Any
+
+import numpy as np
+import pytest
+
+from app.langgraph.embedding_service import EmbeddingService, FakeEmbeddingBackend, set_embedding_service
+from app.langgraph.graph import graph
+from app.langgraph.product_repository import ProductRepository, set_product_repository
+from app.langgraph.utils import get_bm25_index, set_bm25_index, set_facet_index, set_vector_index
+from app.langgraph.vector_index import VectorIndex
+
+SESSIONS = 10
+CATALOG = 20_000
+DIM = 512
+SLOW_MS = 1000.0
+MAX_P95_RATIO = 6.0
+MAX_SLOW_OVERHEAD = 1.5
+
+SLOW_QUERY = "느린 세션 쿼리"
+SLOW_PRODUCT_ID = "sku_slow"
+
+
+class SlowCollection:
+    """SLOW_PRODUCT_ID 가 포함된 조회만 slow 초 동안 막히는(blocking) fake MongoDB collection"""
+
+    def __init__(self, product_ids: list[str], slow: float):
+        self.product_ids = set(product_ids)
+        self.slow = slow
+
+    def find(self, query: dict[str, Any], projection: dict[str, int] | None = None) -> list[dict[str, Any]]:
+        product_ids = query["product_id"]["$in"]
+        if SLOW_PRODUCT_ID in product_ids:
+            time.sleep(self.slow)
+        return [{"product_id": pid, "name": pid} for pid in product_ids if pid in self.product_ids]
+
+
+def p95_of(latencies: list[float]) -> float:
+    return sorted(latencies)[int(len(latencies) * 0.95) - 1]
+
+
+async def run_turn(query: str) -> float:
+    config = {"configurable": {"thread_id": str(uuid.uuid4()), "k": 20}}
+    start = time.perf_counter()
+    async for _ in graph.astream(
+        {"user_query": query},
+        config=config,
+        stream_mode="updates",
+        interrupt_before=["select_final_item_node"],
+    ):
+        pass
+    return (time.perf_counter() - start) * 1000
+
+
+@pytest.fixture
+def catalog():
+    """fake 임베딩 backend + 랜덤 카탈로그 + 느린 상품 하나가 섞인 fake collection (끝나면 전역 상태 해제)"""
+    rng = np.random.default_rng(0)
+    backend = FakeEmbeddingBackend(dim=DIM, latency=0.02)  # provider 호출 latency 20ms 를 흉내내는 fake backend
+    # 느린 세션의 쿼리 임베딩과 같은 벡터의 상품 → 느린 세션의 후보에만 포함되어 상세 조회가 느려짐
+    slow_vector = np.asarray(asyncio.run(backend.aembed([SLOW_QUERY])), dtype=np.float32)
+    product_ids = [f"sku_{i}" for i in range(CATALOG)] + [SLOW_PRODUCT_ID]
+    index = VectorIndex(DIM, initial_capacity=CATALOG + 1)
+    index.add(product_ids, np.vstack([rng.standard_normal((CATALOG, DIM)).astype(np.float32), slow_vector]))
+    set_vector_index(index)
+    get_bm25_index(wait=True)
+    set_embedding_service(EmbeddingService(backend))
+    set_product_repository(ProductRepository(SlowCollection(product_ids, SLOW_MS / 1000)))
+    yield
+    set_product_repository(None)
+    set_embedding_service(None)
+    set_vector_index(None)
+    set_bm25_index(None)
+    set_facet_index(None)
+
+
+async def measure() -> dict[str, float]:
+    await run_turn("워밍업 쿼리")
+    single = statistics.median([await run_turn(f"겨울 출근룩 {i}") for i in range(5)])
+    baseline = p95_of(await asyncio.gather(*[run_turn(f"여름 데이트룩 {i}") for i in range(SESSIONS)]))
+    slow, *latencies = await asyncio.gather(
+        run_turn(SLOW_QUERY), *[run_turn(f"봄 나들이룩 {i}") for i in range(SESSIONS)]
+    )
+    return {"single": single, "baseline": baseline, "slow": slow, "p95": p95_of(latencies)}
+
+
+def test_slow_session_does_not_block_other_sessions(catalog):
+    result = asyncio.run(measure())
+    single, baseline, slow, p95 = result["single"], result["baseline"], result["slow"], result["p95"]
+
+    assert slow >= SLOW_MS, "느린 세션이 느린 상세 조회를 거치지 않았습니다."
+    assert p95 <= single * MAX_P95_RATIO, (
+        f"p95 latency {p95:.1f}ms 가 single turn {single:.1f}ms 의 {MAX_P95_RATIO}배를 초과했습니다."
+    )
+    assert p95 <= baseline * MAX_SLOW_OVERHEAD, (
+        f"느린 세션 때문에 p95 latency 가 {baseline:.1f}ms → {p95:.1f}ms 로 늘었습니다."
+    )
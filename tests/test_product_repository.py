@@ -0,0 +1,77 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.langgraph.product_repository import ProductRepository
+
+
+class CountingCollection:
+    """find 호출(= MongoDB round trip)을 기록하는 mongomock collection wrapper"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return self.collection.find(query, projection)
+
+
+@pytest.fixture
+def collection():
+    products = mongomock.MongoClient().db.products
+    products.insert_many([
+        {"product_id": f"p{i}", "name": f"상품 {i}", "price": 1000 * i, "crawled_html": "<html>"} for i in range(5)
+    ])
+    return CountingCollection(products)
+
+
+@pytest.fixture
+def repository(collection):
+    return ProductRepository(collection)
+
+
+def test_get_many_keeps_input_order_and_skips_missing_ids(repository):
+    products = repository.get_many(["p3", "missing", "p0", "p3"])
+
+    assert [product["product_id"] for product in products] == ["p3", "p0", "p3"]
+    assert products[1] == {"product_id": "p0", "name": "상품 0", "price": 0}
+
+
+def test_get_many_fetches_misses_in_one_in_query(repository, collection):
+    repository.get_many(["p1", "p2", "p1", "missing"])
+
+    assert collection.queries == [{"product_id": {"$in": ["p1", "p2", "missing"]}}]
+
+
+def test_get_many_cache_hits_issue_no_query(repository, collection):
+    repository.get_many(["p1", "p2"])
+    collection.queries.clear()
+
+    assert [product["product_id"] for product in repository.get_many(["p2", "p1"])] == ["p2", "p1"]
+    assert collection.queries == []
+
+    repository.get_many(["p1", "p4"])
+    assert collection.queries == [{"product_id": {"$in": ["p4"]}}]
+
+
+def test_get_many_returns_copies_of_cached_documents(repository):
+    repository.get_many(["p1"])[0]["price"] = -1
+
+    assert repository.get_many(["p1"])[0]["price"] == 1000
+
+
+def test_invalidate_refetches_updated_products(repository, collection):
+    repository.get_many(["p1", "p2"])
+    collection.collection.update_one({"product_id": "p1"}, {"$set": {"price": 99}})
+    assert repository.get_many(["p1"])[0]["price"] == 1000
+
+    repository.invalidate(["p1"])
+    collection.queries.clear()
+    assert repository.get_many(["p1", "p2"])[0]["price"] == 99
+    assert collection.queries == [{"product_id": {"$in": ["p1"]}}]
+
+    repository.invalidate()
+    collection.queries.clear()
+    repository.get_many(["p2"])
+    assert collection.queries == [{"product_id": {"$in": ["p2"]}}]